@@ -9,24 +9,38 @@
 #    nuitka-project: --windows-icon-from-ico={MAIN_DIRECTORY}/assets/icon.ico
 #    nuitka-project: --windows-console-mode=disable
 #
+# Unpack the onefile build once per version, instead of on every launch.
+# Bump the product version for every release so the cache is refreshed.
+# nuitka-project-if: {OS} in ("Windows", "Linux", "Darwin", "FreeBSD"):
+#    nuitka-project: --product-name=Genshiny
+#    nuitka-project: --product-version=1.0.0
+#    nuitka-project: --onefile-tempdir-spec={CACHE_DIR}/{PRODUCT}/{VERSION}
+#
 # nuitka-project: --enable-plugins=pyqt6
 # nuitka-project: --include-data-dir={MAIN_DIRECTORY}/assets=assets
 
 import sys
 
+# First, so that the time spent importing is profiled too
+from core.startup import STARTUP
+
 from PyQt6.QtWidgets import QApplication
 from PyQt6.QtGui import QFont
 import qdarktheme
 from ui.MainWindow import MainWindow
 from core.config import CONFIG
 
+STARTUP.mark("imports")
+
 
 def main():
     app = QApplication(sys.argv)
     app.setFont(QFont(CONFIG.FONT_FAMILY, CONFIG.FONT_SIZE, QFont.Weight.Medium))
     qdarktheme.setup_theme()
+    STARTUP.mark("theme setup")
     main_window = MainWindow()
     main_window.show()
+    STARTUP.mark("window build")
     sys.exit(app.exec())
 
 
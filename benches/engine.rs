@@ -0,0 +1,107 @@
+//! Micro-benchmarks of the simulation engine.
+//!
+//! Run with `cargo bench --bench engine`. Prints a JSON array with one
+//! object per measurement to stdout, so runs of different builds can be
+//! diffed or tracked over time. Pass `--quick` for a short smoke run.
+
+use std::thread;
+
+use gachamodel::bench;
+
+
+/// Pull counts per trajectory to measure, from a single banner to a whale account.
+const PULL_COUNTS: [i32; 5] = [10, 100, 1_000, 10_000, 100_000];
+
+/// Capturing Radiance model versions to measure.
+const VERSIONS: [i32; 4] = [0, 1, 2, 3];
+
+
+/// Number of trajectories of `pulls` pulls that amount to about `budget` pulls.
+fn trajectories(
+    budget: u64,
+    pulls: i32,
+) -> u64 {
+
+    (budget / pulls as u64).clamp(10, 1_000_000)
+
+}
+
+
+fn main() {
+
+    let quick = std::env::args().any(|arg| arg == "--quick");
+    let budget: u64 = if quick { 2_000_000 } else { 50_000_000 };
+    let max_workers = thread::available_parallelism().map_or(1, |n| n.get());
+
+    let mut records = Vec::new();
+
+    for version in VERSIONS {
+        let rate = bench::pull_rate(version, budget);
+        records.push(format!(
+            r#"{{"bench": "pull", "version": {version}, "pulls_per_sec": {rate:.1}}}"#
+        ));
+    }
+
+    for pulls in PULL_COUNTS {
+        for fast in [false, true] {
+            // Rolling every pull is far slower, so give it a smaller budget.
+            let n = trajectories(if fast { budget * 10 } else { budget }, pulls);
+            let rate = bench::trajectory_rate(2, pulls, n, fast);
+            records.push(format!(
+                r#"{{"bench": "batch_pull_count", "pulls": {pulls}, "fast": {fast}, "trajectories": {n}, "trajectories_per_sec": {rate:.1}}}"#
+            ));
+        }
+    }
+
+    let mut workers = vec![1, 2, 4, 8, max_workers];
+    workers.retain(|&w| w <= max_workers);
+    workers.dedup();
+
+    for pulls in PULL_COUNTS {
+        for &w in &workers {
+            for rao_blackwell in [false, true] {
+                let n = trajectories(budget * 10 * w as u64, pulls);
+                let rate = bench::simulation_rate(2, pulls, n, w, rao_blackwell);
+                records.push(format!(
+                    r#"{{"bench": "simulation", "pulls": {pulls}, "workers": {w}, "rao_blackwell": {rao_blackwell}, "trajectories": {n}, "trajectories_per_sec": {rate:.1}}}"#
+                ));
+            }
+        }
+    }
+
+    for version in VERSIONS {
+        let n = trajectories(budget * 10, 1_000);
+        let rate = bench::simulation_rate(version, 1_000, n, max_workers, false);
+        records.push(format!(
+            r#"{{"bench": "simulation", "pulls": 1000, "workers": {max_workers}, "version": {version}, "trajectories": {n}, "trajectories_per_sec": {rate:.1}}}"#
+        ));
+    }
+
+    // Larger pull counts spread the results over more bins.
+    for pulls in PULL_COUNTS {
+        for rao_blackwell in [false, true] {
+            let n = trajectories(budget, pulls).max(10_000);
+            let (latency, bins) = bench::snapshot_latency(pulls, n, rao_blackwell, 100);
+            records.push(format!(
+                r#"{{"bench": "snapshot", "pulls": {pulls}, "rao_blackwell": {rao_blackwell}, "joint_bins": {bins}, "latency_us": {:.2}}}"#,
+                latency.as_secs_f64() * 1e6,
+            ));
+        }
+    }
+
+    // The fast path must match rolling every pull. A z beyond ~3.1 means
+    // the distributions differ at the 0.1% level.
+    for version in VERSIONS {
+        for pulls in [10, 100, 1_000] {
+            let n = trajectories(budget / 2, pulls).min(200_000);
+            let (statistic, dof, z) = bench::equivalence(version, pulls, n);
+            records.push(format!(
+                r#"{{"bench": "equivalence", "version": {version}, "pulls": {pulls}, "trajectories": {n}, "chi2": {statistic:.3}, "dof": {dof}, "z": {z:.3}, "pass": {}}}"#,
+                z < 3.09,
+            ));
+        }
+    }
+
+    println!("[\n  {}\n]", records.join(",\n  "));
+
+}
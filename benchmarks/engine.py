@@ -0,0 +1,308 @@
+"""
+End-to-end benchmarks of the simulation backend, as the app uses it.
+
+Run from the repository root with `python -m benchmarks.engine`. Results
+are written as JSON, to stdout or to `--output`, so runs of different
+builds can be compared. Uses whichever backend `core.backend` picks.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from core import engine
+from core.backend import (
+    BACKEND,
+    CapturingRadianceModel,
+    GenshinImpactGachaModel,
+    SimulationResult,
+    SimulationThread,
+)
+
+
+# Pull counts per trajectory to measure, from a single banner to a whale account.
+PULL_COUNTS = [10, 100, 1_000, 10_000, 100_000]
+
+# Capturing Radiance model versions to measure.
+VERSIONS = [0, 1, 2, 3]
+
+# Largest z at which two samples count as the same distribution (p = 0.001).
+EQUIVALENCE_Z = 3.09
+
+# Attributes that must survive a round trip through `SimulationResult.to_bytes`.
+RESULT_FIELDS = [
+    "simulation_count", "rao_blackwell", "ftd_range", "std_range", "tot_range",
+    "featured_rolls", "standard_rolls", "total_rolls", "joint_rolls",
+    "featured_error", "standard_error", "total_error", "joint_error",
+]
+
+
+def make_model(
+        version: int = 2,
+        seed: int = 0,
+        ) -> GenshinImpactGachaModel:
+    """Fresh model at 0 pity, without a guarantee."""
+
+    return GenshinImpactGachaModel(0, False, CapturingRadianceModel(0, version), seed)
+
+
+def timed(
+        func,
+        min_time: float,
+        ) -> float:
+    """Average seconds per call of `func`, repeating it for at least `min_time`."""
+
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls
+
+
+def run_simulation(
+        pulls: int,
+        trajectories: int,
+        workers: int | None = None,
+        version: int = 2,
+        **kwargs,
+        ) -> tuple[SimulationThread, float]:
+    """Run a whole simulation and return it with its wall-clock time."""
+
+    sim = SimulationThread(make_model(version), pulls, trajectories, workers, **kwargs)
+    start = time.perf_counter()
+    sim.run()
+    while sim.is_running():
+        time.sleep(0.001)
+    return sim, time.perf_counter() - start
+
+
+def bench_pull(budget: float) -> list[dict]:
+
+    records = []
+    for version in VERSIONS:
+        model = make_model(version)
+        seconds = timed(model.pull, budget)
+        records.append({"bench": "pull", "version": version, "pulls_per_sec": 1 / seconds})
+    return records
+
+
+def bench_batch_pull_count(budget: float) -> list[dict]:
+
+    records = []
+    for pulls in PULL_COUNTS:
+        for fast in (False, True):
+            model = make_model()
+            call = model.batch_pull_count_fast if fast else model.batch_pull_count
+            seconds = timed(lambda: call(pulls), budget)
+            records.append({
+                "bench": "batch_pull_count",
+                "pulls": pulls,
+                "fast": fast,
+                "trajectories_per_sec": 1 / seconds,
+            })
+    return records
+
+
+def bench_simulation(budget: float) -> list[dict]:
+
+    cores = os.cpu_count() or 1
+    workers = sorted({w for w in (1, 2, 4, 8, cores) if w <= cores})
+
+    records = []
+    for pulls in PULL_COUNTS:
+        # Size runs so that each takes roughly `budget` seconds on one worker.
+        _, elapsed = run_simulation(pulls, 1_000, 1)
+        trajectories = max(1_000, int(1_000 * budget / max(elapsed, 1e-6)))
+
+        for w in workers:
+            for rao_blackwell in (False, True):
+                _, elapsed = run_simulation(pulls, trajectories * w, w, rao_blackwell=rao_blackwell)
+                records.append({
+                    "bench": "simulation",
+                    "pulls": pulls,
+                    "workers": w,
+                    "rao_blackwell": rao_blackwell,
+                    "trajectories": trajectories * w,
+                    "trajectories_per_sec": trajectories * w / elapsed,
+                })
+
+    for version in VERSIONS:
+        _, elapsed = run_simulation(1_000, 100_000, version=version)
+        records.append({
+            "bench": "simulation",
+            "pulls": 1_000,
+            "workers": cores,
+            "version": version,
+            "trajectories": 100_000,
+            "trajectories_per_sec": 100_000 / elapsed,
+        })
+
+    return records
+
+
+def bench_snapshot(budget: float) -> list[dict]:
+
+    records = []
+    for pulls in PULL_COUNTS:
+        for rao_blackwell in (False, True):
+            sim, _ = run_simulation(pulls, 10_000, rao_blackwell=rao_blackwell)
+            result = sim.get_current_results()
+
+            current = timed(sim.get_current_results, budget)
+            # A full snapshot, as a reader that is not up to date gets.
+            since = timed(lambda: sim.get_results_since(-1), budget)
+
+            records.append({
+                "bench": "snapshot",
+                "pulls": pulls,
+                "rao_blackwell": rao_blackwell,
+                "joint_bins": int(result.joint_rolls.size),
+                "get_current_results_us": current * 1e6,
+                "get_results_since_us": since * 1e6,
+            })
+    return records
+
+
+def chi_square(
+        a: np.ndarray,
+        b: np.ndarray,
+        ) -> tuple[float, int, float]:
+    """
+    Pearson's chi-square test of whether two equally sized samples of
+    non-negative integer pairs come from the same distribution. Returns
+    `(statistic, degrees of freedom, z)`, where `z` is the Wilson-Hilferty
+    normal approximation of the statistic.
+    """
+
+    outcomes, inverse = np.unique(np.concatenate([a, b]), axis=0, return_inverse=True)
+    counts = np.zeros((len(outcomes), 2))
+    np.add.at(counts, (inverse.ravel(), np.repeat([0, 1], len(a))), 1)
+
+    # Pool outcomes too rare for the test into one bin.
+    rare = counts.sum(axis=1) < 10
+    counts = np.vstack([counts[~rare], counts[rare].sum(axis=0, keepdims=True)])
+    counts = counts[counts.sum(axis=1) > 0]
+
+    expected = counts.sum(axis=1, keepdims=True) / 2
+    statistic = float(((counts - expected) ** 2 / expected).sum())
+    dof = max(len(counts) - 1, 1)
+
+    z = ((statistic / dof) ** (1 / 3) - (1 - 2 / (9 * dof))) / math.sqrt(2 / (9 * dof))
+    return statistic, dof, z
+
+
+def bench_equivalence(trajectories: int) -> list[dict]:
+    """Check the fast and per-pull paths against each other."""
+
+    records = []
+    for version in VERSIONS:
+        for pulls in (10, 100, 1_000):
+            reference = np.column_stack(make_model(version, seed=1).batch_simulate(pulls, trajectories, fast=False))
+            fast = np.column_stack(make_model(version, seed=2).batch_simulate(pulls, trajectories, fast=True))
+            statistic, dof, z = chi_square(reference, fast)
+            records.append({
+                "bench": "equivalence",
+                "version": version,
+                "pulls": pulls,
+                "trajectories": trajectories,
+                "chi2": statistic,
+                "dof": dof,
+                "z": z,
+                "pass": z < EQUIVALENCE_Z,
+            })
+    return records
+
+
+def same_result(a, b) -> bool:
+    """Whether two results, possibly from different engines, hold the same counts."""
+
+    for name in RESULT_FIELDS:
+        x, y = getattr(a, name), getattr(b, name)
+        if isinstance(x, np.ndarray) or isinstance(y, np.ndarray):
+            if not np.array_equal(np.asarray(x), np.asarray(y)):
+                return False
+        elif x != y:
+            return False
+    # `core.engine` keeps durations to the microsecond.
+    return abs(a.sim_duration - b.sim_duration).total_seconds() < 1e-6
+
+
+def bench_codec(budget: float) -> list[dict]:
+    """Time `to_bytes`/`from_bytes`, and check the engines read each other's bytes."""
+
+    records = []
+    for pulls in (100, 10_000):
+        for rao_blackwell in (False, True):
+            sim, _ = run_simulation(pulls, 10_000, rao_blackwell=rao_blackwell)
+            result = sim.get_current_results()
+            data = result.to_bytes()
+
+            # Compared after decoding, as Rao-Blackwellized totals are only
+            # stored rounded. Through the NumPy engine and back, which is the
+            # same engine twice when the extension is not built.
+            decoded = SimulationResult.from_bytes(data)
+            numpy_result = engine.SimulationResult.from_bytes(data)
+            back = SimulationResult.from_bytes(numpy_result.to_bytes())
+
+            records.append({
+                "bench": "codec",
+                "pulls": pulls,
+                "rao_blackwell": rao_blackwell,
+                "bytes": len(data),
+                "to_bytes_us": timed(result.to_bytes, budget) * 1e6,
+                "from_bytes_us": timed(lambda: SimulationResult.from_bytes(data), budget) * 1e6,
+                "pass": same_result(decoded, numpy_result) and same_result(decoded, back),
+            })
+    return records
+
+
+def main() -> int:
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="short smoke run")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    budget = 0.05 if args.quick else 0.5
+
+    results = [
+        *bench_pull(budget),
+        *bench_batch_pull_count(budget),
+        *bench_simulation(budget),
+        *bench_snapshot(budget),
+        *bench_codec(budget),
+        *bench_equivalence(20_000 if args.quick else 200_000),
+    ]
+
+    report = {
+        "backend": BACKEND,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+    # Fail the run if the fast path no longer matches the reference, or the
+    # engines no longer read each other's results.
+    return 0 if all(r["pass"] for r in results if r["bench"] in ("equivalence", "codec")) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,29 @@
+"""
+Simulation backend: the `gachamodel` Rust extension if it is built,
+otherwise the NumPy implementation in `core.engine`.
+"""
+try:
+    from gachamodel import (
+        GenshinImpactGachaModel,
+        CapturingRadianceModel,
+        SimulationThread,
+        SimulationResult,
+    )
+    BACKEND = "rust"
+except ImportError:
+    from core.engine import (
+        GenshinImpactGachaModel,
+        CapturingRadianceModel,
+        SimulationThread,
+        SimulationResult,
+    )
+    BACKEND = "numpy"
+
+
+__all__ = [
+    "BACKEND",
+    "GenshinImpactGachaModel",
+    "CapturingRadianceModel",
+    "SimulationThread",
+    "SimulationResult",
+]
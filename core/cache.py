@@ -0,0 +1,141 @@
+"""
+Content-addressed cache of simulation results.
+
+Results are keyed by a hash of everything that determines them, kept in
+memory with LRU eviction, and written to `CONFIG.CACHE_PATH` in the
+compact format of `SimulationResult.to_bytes` so they survive restarts.
+Both tiers are bounded; on disk the least recently used files go first.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+
+from core.backend import BACKEND, SimulationResult
+from core.config import CONFIG
+
+
+# Bump whenever the key or the file layout changes, to orphan old entries.
+CACHE_FORMAT = 2
+
+
+def cache_key(
+        model,
+        pulls: int,
+        ) -> str:
+    """Hash of the model configuration and pull count that a result depends on."""
+
+    config = {
+        "format": CACHE_FORMAT,
+        # The engines draw different random streams from the same seed.
+        "backend": BACKEND,
+        "pulls": pulls,
+        "seed": model.seed,
+        "g": model.g,
+        "counter5": model.counter5,
+        "counter4": model.counter4,
+        "cr": model.cr_model.cr,
+        "version": model.cr_model.version,
+        "rate5": model.rate5,
+        "rate4": model.rate4,
+        "rateup5": model.rateup5,
+        "rateup4": model.rateup4,
+        "softpt5": model.softpt5,
+        "softpt4": model.softpt4,
+    }
+
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of `SimulationResult`s. Only the largest result seen for
+    a key is kept, so a partial run can later be resumed and extended
+    through `SimulationThread(..., resume_from=...)`.
+    """
+
+    def __init__(
+            self,
+            directory: Path = CONFIG.CACHE_PATH,
+            capacity: int = CONFIG.CACHE_CAPACITY,
+            disk_capacity: int = CONFIG.CACHE_DISK_CAPACITY,
+            ):
+
+        self.directory = directory
+        self.capacity = capacity
+        self.disk_capacity = disk_capacity
+        self._memory: OrderedDict[str, SimulationResult] = OrderedDict()
+
+    def _path(self, key: str) -> Path:
+
+        return self.directory / f"{key}.result"
+
+    def _remember(self, key: str, result) -> None:
+
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> SimulationResult | None:
+
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+
+        path = self._path(key)
+        try:
+            result = SimulationResult.from_bytes(path.read_bytes())
+            # Mark the file as recently used, so eviction spares it.
+            os.utime(path)
+        except (OSError, ValueError):
+            # Missing or unreadable; either way there is nothing to reuse.
+            return None
+
+        self._remember(key, result)
+        return result
+
+    def put(self, key: str, result) -> None:
+
+        # The key does not tell the estimators apart, and a Rao-Blackwellized
+        # result cannot resume a sampled simulation.
+        if not result.simulation_count or result.rao_blackwell:
+            return
+
+        cached = self.get(key)
+        if cached is not None and cached.simulation_count >= result.simulation_count:
+            return
+
+        self._remember(key, result)
+
+        # Write to a uniquely named temporary file first, so a crash never
+        # leaves a truncated entry behind and concurrent writers of the same
+        # key do not clobber each other's half-written files.
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as temp:
+            try:
+                temp.write(result.to_bytes())
+            except BaseException:
+                temp.close()
+                os.unlink(temp.name)
+                raise
+        os.replace(temp.name, self._path(key))
+
+        self._evict()
+
+    def _evict(self) -> None:
+        """Delete the least recently used files beyond `disk_capacity`."""
+
+        entries = []
+        for path in self.directory.glob("*.result"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                # Removed by another process in the meantime
+                continue
+
+        entries.sort()
+        for _, path in entries[:max(len(entries) - self.disk_capacity, 0)]:
+            path.unlink(missing_ok=True)
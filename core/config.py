@@ -16,6 +16,9 @@ class CONFIG:
     OUTSIDE_PATH = Path(sys.argv[0]).parent
     SAVE_PATH = OUTSIDE_PATH / "genshiny_save"
     LAST_SAVE_FILE = SAVE_PATH / "genshiny_last_save.json"
+    CACHE_PATH = SAVE_PATH / "cache"
+    CACHE_CAPACITY = 32
+    CACHE_DISK_CAPACITY = 256
 
     FONT_FAMILY = "Segoe UI"
     FONT_SIZE = 12
@@ -27,3 +30,23 @@ class CONFIG:
     SIMULATION = Box(w=1080, h=900)
 
     CHART = Box(x=70, y=30, w=640, h=170)
+
+    # Marginal chart bars at either end below this percentage, which would
+    # show as 0.00, are not drawn
+    CHART_TRIM_BELOW = 0.01
+    # Seconds a marginal chart may spend on a frame before its animations
+    # are turned off
+    CHART_FRAME_BUDGET = 0.02
+
+    # Largest share of the GUI thread that live simulation updates may take,
+    # stretching the update interval beyond the one picked if needed
+    UI_CPU_BUDGET = 0.25
+
+    # Joint tables with more rows or columns than this are drawn as an
+    # image, as their cells get too small to read
+    HEATMAP_TABLE_LIMIT = 40
+
+    # Wilson half-widths for the "Target Precision" options in `TEXT`,
+    # applied to every bin with at least `PRECISION_FLOOR` probability.
+    TARGET_PRECISIONS = [None, 0.01, 0.005, 0.001]
+    PRECISION_FLOOR = 0.001
@@ -0,0 +1,526 @@
+"""
+Coordinator/worker execution of one simulation across processes.
+
+A `Coordinator` splits a run into shards of consecutive trajectory indices
+and hands them out to worker processes, started with `python -m genshiny
+worker` locally or with any command that runs one elsewhere, e.g. over ssh.
+With the Rust backend every trajectory draws from a random stream keyed by
+the seed and its index (see `SimulationThread`'s `first_trajectory`), so
+the shards add up to the same histograms as one run over all of them,
+whatever the number of workers or the shard size. The NumPy backend keys
+its streams per batch of `core.engine.BATCH_SIZE` trajectories instead, so
+there shards are rounded up to whole batches to keep the same guarantee.
+Either way, this holds only as long as every worker runs the same backend.
+
+Workers talk to the coordinator over their stdin and stdout, in frames of a
+4-byte little-endian header length, a JSON header, a 4-byte payload length
+and the payload. The coordinator sends
+
+- `{"type": "shard", "shard", "config", "first", "count"}` to simulate
+  `count` trajectories from index `first`, with the model and options in `config`
+- `{"type": "stop"}` to stop the current shard early
+
+and each worker answers with
+
+- `{"type": "hello", "protocol", "backend"}` once it has started
+- `{"type": "result", "shard", "full", "final"}` with a payload of the
+  counts of the shard so far (`full`) or added since its last result, in the
+  format of `SimulationResult.to_bytes`. `final` is set on the last one.
+- `{"type": "error", "message"}` if a shard cannot be simulated
+
+Closing a worker's stdin makes it exit.
+"""
+import json
+import math
+import os
+import queue
+import shlex
+import signal
+import struct
+import subprocess
+import sys
+import threading
+import time
+from datetime import timedelta
+from typing import BinaryIO
+
+from core.backend import BACKEND, SimulationResult
+from core.config import CONFIG
+from core.engine import BATCH_SIZE
+
+
+# Bump whenever the messages change, so mismatched workers are turned away.
+PROTOCOL = 1
+
+# Command that starts a worker on this machine.
+LOCAL_WORKER = [sys.executable, "-m", "genshiny", "worker"]
+
+# Seconds between the partial results a worker sends back.
+RESULT_INTERVAL = 0.25
+
+# Seconds between a worker's checks for the end of its shard.
+_POLL_INTERVAL = 0.01
+
+_LENGTH = struct.Struct("<I")
+
+
+def send(
+        stream: BinaryIO,
+        header: dict,
+        payload: bytes = b"",
+        ) -> None:
+    """Write one frame to `stream`."""
+
+    data = json.dumps(header).encode()
+    stream.write(_LENGTH.pack(len(data)) + data + _LENGTH.pack(len(payload)) + payload)
+    stream.flush()
+
+
+def receive(stream: BinaryIO) -> tuple[dict, bytes] | None:
+    """Read one frame from `stream`, or `None` if it was closed."""
+
+    def block() -> bytes | None:
+        length = stream.read(_LENGTH.size)
+        if len(length) < _LENGTH.size:
+            return None
+        size = _LENGTH.unpack(length)[0]
+        data = stream.read(size)
+        return data if len(data) == size else None
+
+    header = block()
+    payload = block() if header is not None else None
+    if payload is None:
+        return None
+    return json.loads(header), payload
+
+
+def serve(
+        stdin: BinaryIO | None = None,
+        stdout: BinaryIO | None = None,
+        interval: float = RESULT_INTERVAL,
+        ) -> None:
+    """Run as a worker until `stdin`, by default the process's, is closed."""
+
+    if stdout is None:
+        stdout = sys.stdout.buffer
+        # Anything else printed to stdout would corrupt the frames
+        sys.stdout = sys.stderr
+    if stdin is None:
+        stdin = sys.stdin.buffer
+        # Ctrl+C in a terminal reaches the whole process group. Leave it to
+        # the coordinator, which stops the shards and keeps their counts.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Read on a separate thread, so a stop can arrive while a shard runs
+    inbox: queue.Queue[tuple[dict, bytes] | None] = queue.Queue()
+
+    def read() -> None:
+        while (message := receive(stdin)) is not None:
+            inbox.put(message)
+        inbox.put(None)
+
+    threading.Thread(target=read, daemon=True).start()
+
+    send(stdout, {"type": "hello", "protocol": PROTOCOL, "backend": BACKEND})
+
+    while (message := inbox.get()) is not None:
+        header, _ = message
+        if header["type"] != "shard":
+            # A stop that arrived after its shard was done
+            continue
+        try:
+            closed = _run_shard(header, inbox, stdout, interval)
+        except Exception as e:
+            send(stdout, {"type": "error", "message": f"{type(e).__name__}: {e}"})
+            continue
+        if closed:
+            return
+
+
+def _run_shard(
+        shard: dict,
+        inbox: queue.Queue,
+        stdout: BinaryIO,
+        interval: float,
+        ) -> bool:
+    """Simulate `shard` and stream its results back. Returns whether stdin was closed meanwhile."""
+
+    from core.backend import (
+        CapturingRadianceModel,
+        GenshinImpactGachaModel,
+        SimulationThread,
+    )
+
+    config = shard["config"]
+    model = GenshinImpactGachaModel(
+        pt=config["pity"],
+        g=config["guaranteed"],
+        cr_model=CapturingRadianceModel(cr=config["cr"], version=config["version"]),
+        seed=config["seed"],
+    )
+    sim = SimulationThread(
+        model,
+        config["pulls"],
+        shard["count"],
+        workers=config["workers"],
+        first_trajectory=shard["first"],
+        rao_blackwell=config["rao_blackwell"],
+        antithetic=config["antithetic"],
+    )
+    sim.run()
+
+    generation = 0
+    closed = False
+    sent = time.perf_counter()
+    while True:
+        # Checked first, so that the results below are complete once it stops
+        final = not sim.is_running()
+        if not final and time.perf_counter() - sent < interval:
+            result = None
+        else:
+            result = sim.get_results_since(generation)
+            sent = time.perf_counter()
+
+        if result is not None or final:
+            header = {"type": "result", "shard": shard["shard"], "full": False, "final": final}
+            payload = b""
+            if result is not None:
+                generation = result.generation
+                header["full"] = result.base_generation == 0
+                payload = result.to_bytes()
+            send(stdout, header, payload)
+        if final:
+            return closed
+
+        try:
+            message = inbox.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            continue
+        if message is None or message[0]["type"] == "stop":
+            closed = closed or message is None
+            sim.stop()
+
+
+class CoordinatorMetrics:
+    """
+    Point-in-time progress of a `Coordinator`, with the attributes of
+    `SimulationMetrics` that apply to it.
+    """
+
+    def __init__(
+            self,
+            trajectories: int,
+            elapsed: timedelta,
+            pulls: int,
+            workers: int,
+            shards_done: int,
+            shards: int,
+            worker_progress: list[int],
+            ):
+
+        seconds = elapsed.total_seconds()
+        self.trajectories = trajectories
+        self.elapsed = elapsed
+        self.trajectories_per_sec = trajectories / seconds if seconds > 0 else 0.0
+        self.pulls_per_sec = self.trajectories_per_sec * pulls
+        self.workers = workers
+        self.shards_done = shards_done
+        self.shards = shards
+        self.worker_progress = worker_progress
+
+
+class _Worker:
+    """A worker process, and the shard it is working on."""
+
+    def __init__(self, command: list[str]):
+
+        self.command = command
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            # Where `genshiny` can be imported from, for local workers
+            cwd=CONFIG.INSIDE_PATH if command == LOCAL_WORKER else None,
+        )
+        self.shard: int | None = None
+        self.trajectories = 0
+        # Set once the worker exited or was turned away
+        self.gone = False
+
+    def send(self, header: dict) -> None:
+
+        try:
+            send(self.process.stdin, header)
+        except (OSError, ValueError):
+            # It exited, which the coordinator finds out at its next read
+            pass
+
+    def close(self) -> None:
+        """Close the worker's stdin, which makes it exit, and wait for it."""
+
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class Coordinator:
+    """
+    Runs `sim_length` trajectories like a `SimulationThread`, but split into
+    shards that are simulated by worker processes, which can be on other
+    machines. Partial results stream back while the shards run and are
+    merged into the live result of `get_current_results`.
+
+    A shard lost to a worker that exits is handed to another worker again,
+    without its partial counts. Only the model's initial state is sent, i.e.
+    its pity, guarantee, Capturing Radiance counter and version, and seed.
+    ### Args:
+    - `model`, `pulls`, `sim_length`, `rao_blackwell`, `antithetic` - As for `SimulationThread`
+    - `processes` - Number of local worker processes. Defaults to all available cores.
+    Ignored if `commands` is given.
+    - `commands` - Command that starts each worker, e.g.
+    `["ssh", "farm1", "python", "-m", "genshiny", "worker"]`
+    - `workers` - Threads of each worker. Defaults to sharing this machine's
+    cores between local processes, and to all their cores otherwise.
+    - `shard_size` - Trajectories per shard. Defaults to enough shards for
+    every worker to get 4, so faster workers can take on more of them.
+    Rounded up to whole batches on the NumPy backend.
+    """
+
+    def __init__(
+            self,
+            model,
+            pulls: int,
+            sim_length: int,
+            processes: int | None = None,
+            commands: list[list[str]] | None = None,
+            workers: int | None = None,
+            shard_size: int | None = None,
+            rao_blackwell: bool = False,
+            antithetic: bool = False,
+            ):
+
+        if commands is None:
+            processes = processes or os.cpu_count() or 1
+            commands = [LOCAL_WORKER] * processes
+            if workers is None:
+                workers = max((os.cpu_count() or 1) // processes, 1)
+        if not commands:
+            raise ValueError("at least one worker is needed")
+
+        shard_size = shard_size or max(math.ceil(sim_length / (4 * len(commands))), 1)
+        if BACKEND == "numpy":
+            # Its random streams are keyed per batch, so shards must start
+            # on a batch boundary to draw what one run would
+            shard_size = math.ceil(shard_size / BATCH_SIZE) * BATCH_SIZE
+        if antithetic:
+            # Antithetic pairs must not be split across shards
+            shard_size += shard_size % 2
+
+        self.pulls = pulls
+        self.sim_length = sim_length
+        self.commands = commands
+        self.config = {
+            "pulls": pulls,
+            "pity": model.counter5,
+            "guaranteed": model.g,
+            "cr": model.cr_model.cr,
+            "version": model.cr_model.version,
+            "seed": model.seed,
+            "workers": workers,
+            "rao_blackwell": rao_blackwell,
+            "antithetic": antithetic,
+        }
+        # `(first, count)` of every shard, indexed by shard number
+        self.shards = [
+            (first, min(shard_size, sim_length - first))
+            for first in range(0, sim_length, shard_size)
+        ]
+        # Set if the run failed, e.g. because no worker could be started
+        self.error: str | None = None
+
+        # Guards everything below. Notified whenever a shard finishes or
+        # is put back, which idle workers wait for.
+        self._lock = threading.Condition()
+        self._pending: list[int] = []
+        self._done = SimulationResult()
+        self._partial: dict[int, SimulationResult] = {}
+        # `_done` and every partial merged, kept up to date as results arrive
+        self._current = SimulationResult()
+        self._shards_done = 0
+        self._workers: list[_Worker] = []
+        self._active = 0
+        self._stop_requested = False
+        self._start_time: float | None = None
+        self._elapsed = 0.0
+
+    def run(self) -> None:
+
+        self._pending = list(reversed(range(len(self.shards))))
+        self._start_time = time.perf_counter()
+
+        for command in self.commands:
+            try:
+                worker = _Worker(command)
+            except OSError as e:
+                self.error = f"cannot start worker {shlex.join(command)}: {e}"
+                continue
+            self._workers.append(worker)
+
+        self._active = len(self._workers)
+        for worker in self._workers:
+            threading.Thread(target=self._serve, args=(worker,), daemon=True).start()
+
+    def stop(self) -> None:
+        """Ask the workers to stop. `is_running` stays true until they have sent their last results."""
+
+        with self._lock:
+            self._stop_requested = True
+            self._pending.clear()
+            self._lock.notify_all()
+            # Under the lock, so no shard frame can follow the stop
+            for worker in self._workers:
+                if worker.shard is not None:
+                    worker.send({"type": "stop"})
+
+    def is_running(self) -> bool:
+
+        return self._active > 0
+
+    def get_current_results(self) -> SimulationResult:
+
+        with self._lock:
+            return self._current
+
+    def get_metrics(self) -> CoordinatorMetrics:
+
+        with self._lock:
+            trajectories = self._current.simulation_count
+            elapsed = self._elapsed
+            if self._start_time is not None and self._active:
+                elapsed = time.perf_counter() - self._start_time
+            return CoordinatorMetrics(
+                trajectories=trajectories,
+                elapsed=timedelta(seconds=elapsed),
+                pulls=self.pulls,
+                workers=sum(not w.gone for w in self._workers),
+                shards_done=self._shards_done,
+                shards=len(self.shards),
+                worker_progress=[w.trajectories for w in self._workers],
+            )
+
+    def _next_shard(self, worker: _Worker) -> bool:
+        """
+        Hand the next pending shard to `worker`, waiting while other workers
+        still might put theirs back. Returns whether there was one.
+        """
+
+        with self._lock:
+            while not self._pending and not self._stop_requested and any(w.shard is not None for w in self._workers):
+                self._lock.wait()
+            if not self._pending:
+                return False
+            worker.shard = self._pending.pop()
+
+            # Sent under the lock, so that a `stop` seeing this shard
+            # reaches the worker after it, not before, where it is ignored
+            first, count = self.shards[worker.shard]
+            worker.send({"type": "shard", "shard": worker.shard, "config": self.config, "first": first, "count": count})
+            return True
+
+    def _serve(self, worker: _Worker) -> None:
+        """Talk to one worker until there are no more shards for it, or it exits."""
+
+        stdout = worker.process.stdout
+        try:
+            message = receive(stdout)
+            if message is None:
+                return
+            header, _ = message
+            if header.get("type") != "hello" or header.get("protocol") != PROTOCOL:
+                self._fail(f"worker {shlex.join(worker.command)} speaks protocol {header.get('protocol')}, expected {PROTOCOL}")
+                return
+
+            if not self._next_shard(worker):
+                return
+            while (message := receive(stdout)) is not None:
+                header, payload = message
+                match header["type"]:
+                    case "result":
+                        self._apply(worker, header, payload)
+                        if header["final"] and not self._next_shard(worker):
+                            return
+                    case "error":
+                        self._fail(f"worker {shlex.join(worker.command)}: {header['message']}")
+                        return
+        finally:
+            self._requeue(worker)
+            worker.close()
+            with self._lock:
+                self._active -= 1
+                if not self._active:
+                    self._elapsed = time.perf_counter() - self._start_time
+
+    def _apply(
+            self,
+            worker: _Worker,
+            header: dict,
+            payload: bytes,
+            ) -> None:
+
+        shard = header["shard"]
+        result = SimulationResult.from_bytes(payload) if payload else None
+
+        with self._lock:
+            if result is not None:
+                if shard not in self._partial:
+                    self._partial[shard] = result
+                    self._current = self._current + result
+                elif header["full"]:
+                    # Replaces counts already merged, which cannot be taken out again
+                    self._partial[shard] = result
+                    self._remerge()
+                else:
+                    self._partial[shard] = self._partial[shard] + result
+                    self._current = self._current + result
+            if header["final"]:
+                done = self._partial.pop(shard, None)
+                if done is not None:
+                    self._done = self._done + done
+                    worker.trajectories += done.simulation_count
+                self._shards_done += 1
+                worker.shard = None
+                self._lock.notify_all()
+
+    def _requeue(self, worker: _Worker) -> None:
+        """Put back the shard of a worker that is gone, dropping its partial counts."""
+
+        with self._lock:
+            worker.gone = True
+            if worker.shard is not None:
+                if self._partial.pop(worker.shard, None) is not None:
+                    self._remerge()
+                if not self._stop_requested:
+                    self._pending.append(worker.shard)
+                worker.shard = None
+            if self._pending and all(w.gone for w in self._workers):
+                self.error = self.error or "every worker exited before the run was done"
+            self._lock.notify_all()
+
+    def _remerge(self) -> None:
+        """Rebuild `_current` from scratch, after partial counts were dropped or replaced. Needs the lock."""
+
+        self._current = self._done
+        for partial in self._partial.values():
+            self._current = self._current + partial
+
+    def _fail(self, error: str) -> None:
+
+        with self._lock:
+            if self.error is None:
+                self.error = error
+        self.stop()
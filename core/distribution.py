@@ -0,0 +1,114 @@
+import numpy as np
+
+from core.text import TEXT
+
+
+def _accumulate(
+        p: np.ndarray,
+        op: str,
+        axis: int,
+        ) -> np.ndarray:
+    """
+    `P(X <op> x_i)` for every `i` along `axis` of `p`, whose values along
+    that axis are sorted ascending.
+    """
+
+    p = np.moveaxis(p, axis, 0)
+    zero = np.zeros_like(p[:1])
+
+    match op:
+        case TEXT.EQ:
+            out = p
+        case TEXT.LE:
+            out = np.cumsum(p, axis=0)
+        case TEXT.LT:
+            out = np.concatenate((zero, np.cumsum(p, axis=0)[:-1]))
+        case TEXT.GE:
+            # Summed from the top, so the tail is not lost to rounding
+            out = np.cumsum(p[::-1], axis=0)[::-1]
+        case TEXT.GT:
+            out = np.concatenate((np.cumsum(p[::-1], axis=0)[::-1][1:], zero))
+        case _:
+            raise ValueError(f"Invalid operator: {op}")
+
+    return np.moveaxis(out, 0, axis)
+
+
+class Distribution:
+    """
+    Distribution of one histogram of a result snapshot, as shown by the
+    marginal charts. Every view in `TEXT.CHART_VIEW_OPTIONS` is computed
+    up front with cumulative sums, so switching between them is a lookup.
+    """
+
+    def __init__(
+            self,
+            counts: np.ndarray,
+            value_range: tuple[int, int],
+            total: float,
+            ):
+
+        self.values = np.arange(value_range[0], value_range[0] + len(counts))
+
+        pmf = np.asarray(counts, dtype=float) / total if total else np.zeros(len(counts))
+        self._views = {mode: _accumulate(pmf, mode, 0) for mode in TEXT.CHART_VIEW_OPTIONS}
+        self._dicts: dict[tuple[str, int], dict[int, float]] = {}
+
+    def array(self, mode: str) -> np.ndarray:
+        """Probability of each value under the `mode` view."""
+
+        try:
+            return self._views[mode]
+        except KeyError:
+            raise ValueError(f"Unknown conversion mode: {mode}") from None
+
+    def view(
+            self,
+            mode: str,
+            precision: int = 2,
+            ) -> dict[int, float]:
+        """The `mode` view as percentages, rounded to `precision` decimals and keyed by value."""
+
+        key = (mode, precision)
+        if key not in self._dicts:
+            percent = np.round(self.array(mode) * 100, precision)
+            self._dicts[key] = dict(zip(self.values.tolist(), percent.tolist()))
+        return self._dicts[key]
+
+
+class JointDistribution:
+    """
+    Joint featured/standard distribution of a result snapshot, as shown by
+    the joint heatmap. Each of the 25 operator views is built from cumulative
+    sums along both axes when first asked for, and kept until the next snapshot.
+    """
+
+    def __init__(
+            self,
+            counts: np.ndarray,
+            total: float,
+            ):
+
+        counts = np.asarray(counts, dtype=float)
+        self.pmf = counts / total if total else np.zeros_like(counts)
+
+        # Shared by every view with the same operator on the featured axis
+        self._rows: dict[str, np.ndarray] = {}
+        self._views: dict[tuple[str, str], np.ndarray] = {}
+
+    def view(
+            self,
+            opx: str,
+            opy: str,
+            ) -> np.ndarray:
+        """
+        2D array of `P(X <opx> x_j, Y <opy> y_i)` for all `i, j`, where the
+        rows `Y` count featured and the columns `X` count standard 5 stars.
+        """
+
+        key = (opx, opy)
+        if key not in self._views:
+            if opy not in self._rows:
+                self._rows[opy] = _accumulate(self.pmf, opy, 0)
+            self._views[key] = _accumulate(self._rows[opy], opx, 1)
+        return self._views[key]
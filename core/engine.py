@@ -0,0 +1,1053 @@
+"""
+Pure NumPy implementation of the `gachamodel` extension.
+
+Follows the same model as `src/lib.rs`, but steps whole batches of
+trajectories at once as arrays of pity, guarantee and Capturing Radiance
+state. Used when the extension is not built, and as a reference to
+cross-check it against.
+"""
+import math
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from enum import Enum
+
+import numpy as np
+import zstandard
+
+from core.utils import max_error, normal_half_width, wilson_half_width
+
+
+# Combined chance of triggering CR or winning the 50/50 in the v2 model.
+# See `CapturingRadianceModel.branch`.
+CR_V2_WIN_RATE = 6 / 11
+
+# Number of trajectories simulated per batch by `SimulationThread`.
+BATCH_SIZE = 20_000
+
+# Counters are never tabulated past this, even if the hazard never reaches 1.
+MAX_COUNTER = 1000
+
+# Serialized `SimulationResult`s start with this magic and format version.
+# Both engines share the layout, see `src/codec.rs`.
+RESULT_MAGIC = b"GNSR"
+RESULT_FORMAT = 1
+# Flags, count, duration in seconds and nanoseconds, then the 3 ranges.
+_RESULT_HEADER = struct.Struct("<BQQI6Q")
+
+
+class PullResult(Enum):
+    Standard3Star = 0
+    Standard4Star = 1
+    Standard5Star = 2
+    Featured5Star = 3
+
+
+def _cr_state(cr):
+    """Map CR values onto the 4 states of the v2 and v3 models."""
+
+    return np.where((cr >= 0) & (cr <= 2), cr, 3)
+
+
+class CapturingRadianceModel:
+
+    def __init__(
+            self,
+            cr: int = 0,
+            version: int = 2,
+            ):
+
+        self.cr = cr
+        self.version = version
+
+    def branch(self, cr: int) -> tuple[float, int, int]:
+        """
+        Describe the next non-guaranteed 5-star from the given CR state as
+        `(featured_chance, cr_after_featured, cr_after_standard)`.
+        """
+
+        match self.version:
+            case 3:
+                return [(0.25, 0, 1), (0.50, 0, 2), (0.75, 1, 3), (1.0, 2, 2)][int(_cr_state(cr))]
+            case 2:
+                return [(0.5, 0, 1), (0.5, 0, 2), (CR_V2_WIN_RATE, 1, 3), (1.0, 1, 1)][int(_cr_state(cr))]
+            case 1:
+                return (0.5 + 0.5 * 0.1, cr, cr)
+            case _:
+                return (0.5, cr, cr)
+
+    def branch_table(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """`branch` for each of the 4 CR states, as arrays indexed by state."""
+
+        # v0 and v1 ignore the CR state, so keep every state where it is.
+        branches = [self.branch(cr) for cr in range(4)]
+        chance, win, lose = (np.array(column) for column in zip(*branches))
+        if self.version not in (2, 3):
+            win = lose = np.arange(4)
+        return chance, win, lose
+
+    def pull(self, rng: np.random.Generator | None = None) -> PullResult:
+
+        rng = rng or np.random.default_rng()
+        chance, win, lose = self.branch(self.cr)
+        if rng.random() < chance:
+            self.cr = win
+            return PullResult.Featured5Star
+        self.cr = lose
+        return PullResult.Standard5Star
+
+
+class GenshinImpactGachaModel:
+
+    def __init__(
+            self,
+            pt: int,
+            g: bool,
+            cr_model: CapturingRadianceModel,
+            seed: int,
+            ):
+
+        self.g = g
+        self.cr_model = cr_model
+        self.seed = seed
+        self.rate5 = 0.006
+        self.rate4 = 0.051
+        self.rateup5 = 10 * self.rate5
+        self.rateup4 = 10 * self.rate4
+        self.softpt5 = 73
+        self.softpt4 = 8
+        self.counter5 = pt
+        self.counter4 = 0
+        self.rng = np.random.default_rng(seed)
+        # Pair up trajectories with mirrored pity draws. See `SimulationThread`.
+        self.antithetic = False
+
+    def prob5_at(self, counter5):
+        """Chance that the next pull is a 5-star at the given 5-star pity counter."""
+
+        return np.where(
+            counter5 <= self.softpt5,
+            self.rate5,
+            self.rateup5 * (counter5 - self.softpt5) + self.rate5)
+
+    def prob4_at(self, counter4):
+        """Chance that the next pull is a 4-star at the given 4-star pity counter."""
+
+        return np.where(
+            counter4 <= self.softpt4,
+            self.rate4,
+            self.rateup4 * (counter4 - self.softpt4) + self.rate4)
+
+    def survival_table(self, start: int) -> np.ndarray:
+        """
+        `survival[i]` is the chance of reaching counter `start + i` from
+        counter `start` without a 5-star. Ends at the first counter that
+        guarantees a 5-star.
+        """
+
+        counters = np.arange(start, max(start, 0) + MAX_COUNTER)
+        hazard = np.clip(self.prob5_at(counters), 0.0, 1.0)
+        survival = np.concatenate(([1.0], np.cumprod(1.0 - hazard)))
+
+        zeros = np.flatnonzero(survival == 0.0)
+        return survival[:zeros[0] + 1] if len(zeros) else survival
+
+    def featured_split(self, k_max: int) -> np.ndarray:
+        """
+        `split[k, f]` is the chance that exactly `f` of the next `k` 5-stars
+        are featured, starting from the current guarantee and CR state.
+        """
+
+        chance, win, lose = self.cr_model.branch_table()
+
+        # dist[g, cr, f] over the guarantee and the 4 CR states.
+        dist = np.zeros((2, 4, k_max + 1))
+        dist[int(self.g), int(_cr_state(self.cr_model.cr)), 0] = 1.0
+        split = np.zeros((k_max + 1, k_max + 1))
+
+        for k in range(k_max + 1):
+            split[k] = dist.sum(axis=(0, 1))
+
+            after = np.zeros_like(dist)
+            # Guaranteed: always featured, CR state untouched.
+            after[0, :, 1:] += dist[1, :, :-1]
+            for cr in range(4):
+                after[0, win[cr], 1:] += chance[cr] * dist[0, cr, :-1]
+                after[1, lose[cr]] += (1 - chance[cr]) * dist[0, cr]
+            dist = after
+
+        return split
+
+    def pull(self) -> PullResult:
+
+        x = self.rng.random()
+        prob5 = float(self.prob5_at(self.counter5))
+        prob4 = float(self.prob4_at(self.counter4))
+
+        if x < prob5:
+            self.counter5 = 1
+            self.counter4 += 1
+            if self.g:
+                self.g = False
+                return PullResult.Featured5Star
+            result = self.cr_model.pull(self.rng)
+            self.g = result == PullResult.Standard5Star
+            return result
+        elif x < prob5 + prob4:
+            self.counter5 += 1
+            self.counter4 = 1
+            return PullResult.Standard4Star
+        else:
+            self.counter5 += 1
+            self.counter4 += 1
+            return PullResult.Standard3Star
+
+    def batch_pull_count(self, pulls: int) -> tuple[int, int]:
+        """Perform multiple pulls and count the featured and standard 5-stars."""
+
+        return self._advance(pulls, fast=False)
+
+    def batch_pull_count_fast(self, pulls: int) -> tuple[int, int]:
+        """Same as `batch_pull_count`, but `counter4` is not advanced."""
+
+        return self._advance(pulls, fast=True)
+
+    def batch_simulate(
+            self,
+            pulls: int,
+            trajectories: int,
+            fast: bool = True,
+            ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Run independent trajectories that all start from the current state,
+        without changing it, and return the featured and standard 5-star
+        counts of each trajectory.
+        """
+
+        state = self._initial_state(trajectories)
+        step = self._simulate_fast if fast else self._simulate_slow
+        featured, standard = step(state, pulls)
+        return featured.astype(np.int32), standard.astype(np.int32)
+
+    def _initial_state(self, n: int) -> dict[str, np.ndarray]:
+
+        return {
+            "counter5": np.full(n, self.counter5, dtype=np.int64),
+            "counter4": np.full(n, self.counter4, dtype=np.int64),
+            "g": np.full(n, self.g, dtype=bool),
+            "cr": np.full(n, _cr_state(self.cr_model.cr), dtype=np.int64),
+        }
+
+    def _advance(self, pulls: int, fast: bool) -> tuple[int, int]:
+        """Simulate a single trajectory and keep its final state."""
+
+        state = self._initial_state(1)
+        step = self._simulate_fast if fast else self._simulate_slow
+        featured, standard = step(state, pulls)
+
+        self.counter5 = int(state["counter5"][0])
+        self.counter4 = int(state["counter4"][0])
+        self.g = bool(state["g"][0])
+
+        # States outside 0..=3 behave like 3, so only write back a real change.
+        if self.cr_model.version in (2, 3) and state["cr"][0] != _cr_state(self.cr_model.cr):
+            self.cr_model.cr = int(state["cr"][0])
+
+        return int(featured[0]), int(standard[0])
+
+    def _pull_5_star(
+            self,
+            state: dict[str, np.ndarray],
+            hit: np.ndarray,
+            ) -> np.ndarray:
+        """
+        Decide which of the trajectories in `hit` get a featured 5-star,
+        updating their guarantee and CR state.
+        """
+
+        chance, win, lose = self.cr_model.branch_table()
+
+        g = state["g"][hit]
+        cr = state["cr"][hit]
+        won = self.rng.random(len(cr)) < chance[cr]
+
+        featured = g | won
+        rolled = ~g
+        state["cr"][hit] = np.where(rolled, np.where(won, win[cr], lose[cr]), cr)
+        state["g"][hit] = rolled & ~won
+        return featured
+
+    def _simulate_slow(
+            self,
+            state: dict[str, np.ndarray],
+            pulls: int,
+            ) -> tuple[np.ndarray, np.ndarray]:
+        """Roll every pull of every trajectory, one pull at a time."""
+
+        n = len(state["g"])
+        featured = np.zeros(n, dtype=np.int64)
+        standard = np.zeros(n, dtype=np.int64)
+        counter5, counter4 = state["counter5"], state["counter4"]
+
+        for _ in range(pulls):
+            x = self.rng.random(n)
+            prob5 = self.prob5_at(counter5)
+            prob4 = self.prob4_at(counter4)
+
+            five = x < prob5
+            four = ~five & (x < prob5 + prob4)
+
+            hit = np.flatnonzero(five)
+            if len(hit):
+                won = self._pull_5_star(state, hit)
+                featured[hit] += won
+                standard[hit] += ~won
+
+            counter5 += 1
+            counter5[five] = 1
+            counter4 += 1
+            counter4[four] = 1
+
+        return featured, standard
+
+    def batch_sweep(
+            self,
+            pulls: int,
+            trajectories: int,
+            checkpoints: list[int],
+            ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Same as `batch_simulate`, but returns the running counts after each
+        of the ascending `checkpoints` pulls as `checkpoint x trajectory` arrays.
+        """
+
+        state = self._initial_state(trajectories)
+        _, _, at_checkpoints = self._sweep_fast(state, pulls, np.asarray(checkpoints))
+        return at_checkpoints[0].astype(np.int32), at_checkpoints[1].astype(np.int32)
+
+    def _simulate_fast(
+            self,
+            state: dict[str, np.ndarray],
+            pulls: int,
+            ) -> tuple[np.ndarray, np.ndarray]:
+
+        featured, standard, _ = self._sweep_fast(state, pulls, np.zeros(0, dtype=np.int64))
+        return featured, standard
+
+    def _wait_draws(self, n: int, active: np.ndarray) -> np.ndarray:
+        """
+        Uniform draws for the next pity wait of the `active` trajectories.
+        With `antithetic`, odd trajectories mirror the draw of the one before.
+        """
+
+        if not self.antithetic:
+            return self.rng.random(len(active))
+
+        x = self.rng.random((n + 1) // 2)
+        return np.stack([x, 1.0 - x], axis=1).ravel()[active]
+
+    def _sweep_fast(
+            self,
+            state: dict[str, np.ndarray],
+            pulls: int,
+            checkpoints: np.ndarray,
+            split: bool = True,
+            ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Sample the number of pulls until each 5-star directly by inverting
+        the survival function of the pity counter, one 5-star at a time.
+        Also returns the running counts after each of the ascending
+        `checkpoints` as a `2 x checkpoint x trajectory` array.
+
+        Without `split`, 5-stars are counted as featured without deciding
+        which they are.
+        """
+
+        n = len(state["g"])
+        featured = np.zeros(n, dtype=np.int64)
+        standard = np.zeros(n, dtype=np.int64)
+        at_checkpoints = np.full((2, len(checkpoints), n), -1, dtype=np.int64)
+        remaining = np.full(n, pulls, dtype=np.int64)
+        counter5 = state["counter5"]
+
+        # The table starts at the lowest counter, so that negative pity
+        # is sampled the same way as everything else.
+        start = min(int(counter5.min(initial=1)), 1)
+        survival = self.survival_table(start)
+        ascending = -survival
+
+        active = np.arange(n)
+        while len(active):
+            index = counter5[active] - start
+            last = index + 1 >= len(survival)
+            threshold = (1.0 - self._wait_draws(n, active)) * survival[np.minimum(index, len(survival) - 1)]
+
+            # Number of counters past `index` that are still survived.
+            survived = np.searchsorted(ascending, -threshold, side="right") - index - 1
+            wait = np.where(last, 1, survived + 1)
+
+            done = wait > remaining[active]
+            finished = active[done]
+            counter5[finished] += remaining[finished]
+            remaining[finished] = 0
+
+            hit = active[~done]
+            remaining[hit] -= wait[~done]
+
+            # Checkpoints before the pull that lands the 5-star.
+            landed = pulls - remaining[hit]
+            for i, checkpoint in enumerate(checkpoints):
+                record = hit[(at_checkpoints[0, i, hit] < 0) & (checkpoint < landed)]
+                at_checkpoints[0, i, record] = featured[record]
+                at_checkpoints[1, i, record] = standard[record]
+
+            counter5[hit] = 1
+            if split:
+                won = self._pull_5_star(state, hit)
+                featured[hit] += won
+                standard[hit] += ~won
+            else:
+                featured[hit] += 1
+
+            active = hit
+
+        # Every checkpoint not reached by a 5-star has the final counts.
+        unset = at_checkpoints[0] < 0
+        at_checkpoints[0][unset] = np.broadcast_to(featured, unset.shape)[unset]
+        at_checkpoints[1][unset] = np.broadcast_to(standard, unset.shape)[unset]
+
+        return featured, standard, at_checkpoints
+
+
+class Histogram:
+    """
+    Dense tally of `(featured, standard)` outcomes, indexed from 0 and
+    grown whenever a larger count shows up.
+    """
+
+    def __init__(self):
+
+        self.count = 0
+        self.joint = np.zeros((0, 0), dtype=np.uint64)
+
+    def update(
+            self,
+            featured: np.ndarray,
+            standard: np.ndarray,
+            ) -> None:
+
+        if not len(featured):
+            return
+
+        rows = max(self.joint.shape[0], int(featured.max()) + 1)
+        cols = max(self.joint.shape[1], int(standard.max()) + 1)
+        if (rows, cols) != self.joint.shape:
+            grown = np.zeros((rows, cols), dtype=np.uint64)
+            grown[:self.joint.shape[0], :self.joint.shape[1]] = self.joint
+            self.joint = grown
+
+        counts = np.bincount(featured * cols + standard, minlength=rows * cols)
+        self.joint += counts.reshape(rows, cols).astype(np.uint64)
+        self.count += len(featured)
+
+    def add_joint(
+            self,
+            joint: np.ndarray,
+            offset: tuple[int, int] = (0, 0),
+            ) -> None:
+        """Add a block of joint counts whose first entry is at `offset`."""
+
+        rows, cols = offset[0] + joint.shape[0], offset[1] + joint.shape[1]
+        grown = np.zeros((max(rows, self.joint.shape[0]), max(cols, self.joint.shape[1])), dtype=np.uint64)
+        grown[:self.joint.shape[0], :self.joint.shape[1]] = self.joint
+        grown[offset[0]:rows, offset[1]:cols] += joint.astype(np.uint64)
+
+        self.joint = grown
+        self.count += int(joint.sum())
+
+    def clear(self) -> None:
+
+        self.count = 0
+        self.joint[:] = 0
+
+    @property
+    def memory(self) -> int:
+        """Bytes allocated for the counts."""
+
+        return self.joint.nbytes
+
+
+def _add_cropped(
+        target: np.ndarray,
+        target_start: tuple[int, ...],
+        values: np.ndarray,
+        start: tuple[int, ...],
+        ) -> None:
+    """Add `values`, whose first bin along each axis is at `start`, into `target`, whose first bins are at `target_start`."""
+
+    target[tuple(
+        slice(lo - target_lo, lo - target_lo + size)
+        for lo, target_lo, size in zip(start, target_start, values.shape)
+    )] += values
+
+
+def _nonzero_range(values: np.ndarray) -> tuple[int, int]:
+    """Smallest inclusive index range holding every nonzero entry, or `(0, 0)`."""
+
+    nonzero = np.flatnonzero(values)
+    if not len(nonzero):
+        return (0, 0)
+    return (int(nonzero[0]), int(nonzero[-1]))
+
+
+def _read_exactly(reader, size: int) -> bytes:
+    """Read `size` bytes from `reader`, or fewer if it ends first."""
+
+    chunks = []
+    while size > 0 and (chunk := reader.read(min(size, 1 << 20))):
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+class SimulationResult:
+    """
+    Snapshot of simulation counts. Same layout as `gachamodel.SimulationResult`.
+    If `model` is given, the histogram only tallies 5-star totals, as
+    `(total, 0)`, and the featured split is integrated from its state.
+    """
+
+    def __init__(
+            self,
+            histogram: Histogram | None = None,
+            sim_duration: timedelta = timedelta(0),
+            generation: int = 0,
+            base_generation: int = 0,
+            model: GenshinImpactGachaModel | None = None,
+            ):
+
+        joint = histogram.joint if histogram is not None else np.zeros((1, 1), dtype=np.uint64)
+        if not joint.size:
+            joint = np.zeros((1, 1), dtype=np.uint64)
+        joint = joint.astype(np.float64)
+
+        self.rao_blackwell = model is not None
+        squares = None
+        if self.rao_blackwell:
+            joint, squares = self._integrate_split(joint[:, 0], model)
+
+        featured = joint.sum(axis=1)
+        standard = joint.sum(axis=0)
+        total = np.zeros(joint.shape[0] + joint.shape[1] - 1)
+        for row in range(joint.shape[0]):
+            total[row:row + joint.shape[1]] += joint[row]
+
+        self.simulation_count = histogram.count if histogram is not None else 0
+        self.ftd_range = _nonzero_range(featured)
+        self.std_range = _nonzero_range(standard)
+        self.tot_range = _nonzero_range(total)
+        self.sim_duration = sim_duration
+        self.generation = generation
+        self.base_generation = base_generation
+
+        (f_lo, f_hi), (s_lo, s_hi), (t_lo, t_hi) = self.ftd_range, self.std_range, self.tot_range
+        self.featured_rolls = featured[f_lo:f_hi + 1]
+        self.standard_rolls = standard[s_lo:s_hi + 1]
+        self.total_rolls = total[t_lo:t_hi + 1]
+        self.joint_rolls = joint[f_lo:f_hi + 1, s_lo:s_hi + 1].copy()
+
+        # Sums of squared trajectory weights for the error estimates.
+        self._featured_squares = self._standard_squares = self._joint_squares = None
+        if squares is not None:
+            self._featured_squares = squares.sum(axis=1)[f_lo:f_hi + 1]
+            self._standard_squares = squares.sum(axis=0)[s_lo:s_hi + 1]
+            self._joint_squares = squares[f_lo:f_hi + 1, s_lo:s_hi + 1]
+
+    @staticmethod
+    def _integrate_split(
+            totals: np.ndarray,
+            model: GenshinImpactGachaModel,
+            ) -> tuple[np.ndarray, np.ndarray]:
+        """Spread each total over the joint bins by its featured split, with squared weights."""
+
+        size = len(totals)
+        split = model.featured_split(size - 1)
+        joint = np.zeros((size, size))
+        squares = np.zeros((size, size))
+
+        f = np.arange(size)
+        for k in np.flatnonzero(totals):
+            joint[f[:k + 1], k - f[:k + 1]] = totals[k] * split[k, :k + 1]
+            squares[f[:k + 1], k - f[:k + 1]] = totals[k] * split[k, :k + 1] ** 2
+
+        return joint, squares
+
+    @staticmethod
+    def from_joint(
+            joint_rolls: np.ndarray,
+            offset: tuple[int, int] = (0, 0),
+            sim_duration: timedelta = timedelta(0),
+            ) -> "SimulationResult":
+        """See `gachamodel.SimulationResult.from_joint`."""
+
+        histogram = Histogram()
+        histogram.add_joint(joint_rolls, offset)
+        return SimulationResult(histogram, sim_duration)
+
+    def merge(self, other: "SimulationResult") -> "SimulationResult":
+        """See `gachamodel.SimulationResult.merge`."""
+
+        if not other.simulation_count:
+            result = self._copy()
+        elif not self.simulation_count:
+            result = other._copy()
+        elif self.rao_blackwell != other.rao_blackwell:
+            raise ValueError("cannot merge a Rao-Blackwellized result with a sampled one")
+        else:
+            result = self._merged_counts(other)
+
+        result.sim_duration = self.sim_duration + other.sim_duration
+        result.generation = 0
+        result.base_generation = 0
+        return result
+
+    def __add__(self, other: "SimulationResult") -> "SimulationResult":
+
+        if not isinstance(other, SimulationResult):
+            return NotImplemented
+        return self.merge(other)
+
+    def _copy(self) -> "SimulationResult":
+        """Shallow copy, which shares the count arrays. Results are never modified in place."""
+
+        result = SimulationResult.__new__(SimulationResult)
+        result.__dict__.update(self.__dict__)
+        return result
+
+    def _merged_counts(self, other: "SimulationResult") -> "SimulationResult":
+        """Sum of the counts of two non-empty results with the same estimator, over the union of their ranges."""
+
+        def union(name: str) -> tuple[int, int]:
+            (a_lo, a_hi), (b_lo, b_hi) = getattr(self, name), getattr(other, name)
+            return min(a_lo, b_lo), max(a_hi, b_hi)
+
+        def merged(name: str, *range_names: str) -> np.ndarray:
+            ranges = [union(r) for r in range_names]
+            out = np.zeros(tuple(hi - lo + 1 for lo, hi in ranges))
+            for result in (self, other):
+                start = tuple(getattr(result, r)[0] for r in range_names)
+                _add_cropped(out, tuple(lo for lo, _ in ranges), getattr(result, name), start)
+            return out
+
+        result = self._copy()
+        result.simulation_count = self.simulation_count + other.simulation_count
+        result.ftd_range, result.std_range, result.tot_range = union("ftd_range"), union("std_range"), union("tot_range")
+        result.featured_rolls = merged("featured_rolls", "ftd_range")
+        result.standard_rolls = merged("standard_rolls", "std_range")
+        result.total_rolls = merged("total_rolls", "tot_range")
+        result.joint_rolls = merged("joint_rolls", "ftd_range", "std_range")
+        if self.rao_blackwell:
+            result._featured_squares = merged("_featured_squares", "ftd_range")
+            result._standard_squares = merged("_standard_squares", "std_range")
+            result._joint_squares = merged("_joint_squares", "ftd_range", "std_range")
+        return result
+
+    def to_bytes(self, level: int = 3) -> bytes:
+        """See `gachamodel.SimulationResult.to_bytes`."""
+
+        duration = self.sim_duration
+        header = _RESULT_HEADER.pack(
+            int(self.rao_blackwell),
+            self.simulation_count,
+            duration.days * 86400 + duration.seconds,
+            duration.microseconds * 1000,
+            *self.ftd_range, *self.std_range, *self.tot_range,
+        )
+
+        # Sampled counts are whole numbers, which compress better as integers.
+        counts = "<f8" if self.rao_blackwell else "<u8"
+        arrays = [
+            (self.featured_rolls, counts),
+            (self.standard_rolls, counts),
+            (self.total_rolls, "<u8"),
+            (self.joint_rolls, counts),
+        ]
+        if self.rao_blackwell:
+            arrays += [(self._featured_squares, "<f8"), (self._standard_squares, "<f8"), (self._joint_squares, "<f8")]
+
+        # Totals integrated from a Rao-Blackwellized split are only whole up to rounding.
+        body = header + b"".join(
+            (np.rint(a) if dtype == "<u8" else np.asarray(a)).astype(dtype).tobytes()
+            for a, dtype in arrays
+        )
+        return RESULT_MAGIC + bytes([RESULT_FORMAT]) + zstandard.ZstdCompressor(level=level).compress(body)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SimulationResult":
+        """See `gachamodel.SimulationResult.from_bytes`."""
+
+        data = bytes(data)
+        if len(data) <= len(RESULT_MAGIC) or not data.startswith(RESULT_MAGIC):
+            raise ValueError("not a serialized SimulationResult")
+        version = data[len(RESULT_MAGIC)]
+        if version != RESULT_FORMAT:
+            raise ValueError(f"unsupported SimulationResult format version {version}")
+
+        # Only the header is decompressed up front. The ranges in it give the
+        # exact size of the rest, so a corrupt or hostile frame can never make
+        # this decompress more than the result it claims to hold.
+        try:
+            with zstandard.ZstdDecompressor().stream_reader(data[len(RESULT_MAGIC) + 1:]) as reader:
+                header = _read_exactly(reader, _RESULT_HEADER.size)
+                if len(header) < _RESULT_HEADER.size:
+                    raise ValueError("truncated result")
+
+                flags, count, seconds, nanos, *bounds = _RESULT_HEADER.unpack(header)
+                ranges = [(bounds[i], bounds[i + 1]) for i in range(0, 6, 2)]
+                if nanos >= 1_000_000_000 or any(hi < lo for lo, hi in ranges):
+                    raise ValueError("invalid result header")
+
+                rao_blackwell = bool(flags & 1)
+                rows = ranges[0][1] - ranges[0][0] + 1
+                cols = ranges[1][1] - ranges[1][0] + 1
+                counts = "<f8" if rao_blackwell else "<u8"
+                fields = [
+                    ("featured_rolls", (rows,), counts),
+                    ("standard_rolls", (cols,), counts),
+                    ("total_rolls", (ranges[2][1] - ranges[2][0] + 1,), "<u8"),
+                    ("joint_rolls", (rows, cols), counts),
+                ]
+                if rao_blackwell:
+                    fields += [
+                        ("_featured_squares", (rows,), "<f8"),
+                        ("_standard_squares", (cols,), "<f8"),
+                        ("_joint_squares", (rows, cols), "<f8"),
+                    ]
+
+                # One byte more than expected, to tell trailing data from the end.
+                size = sum(math.prod(shape) * 8 for _, shape, _ in fields)
+                body = _read_exactly(reader, size + 1)
+        except zstandard.ZstdError as e:
+            raise ValueError(f"cannot decompress result: {e}") from None
+        if len(body) < size:
+            raise ValueError("truncated result")
+        if len(body) > size:
+            raise ValueError("trailing data after result")
+
+        result = cls()
+        result.rao_blackwell = rao_blackwell
+        result.simulation_count = count
+        result.sim_duration = timedelta(seconds=seconds, microseconds=nanos // 1000)
+        result.ftd_range, result.std_range, result.tot_range = ranges
+
+        offset = 0
+        for name, shape, dtype in fields:
+            values = np.frombuffer(body, dtype=dtype, count=math.prod(shape), offset=offset)
+            setattr(result, name, values.astype(np.float64).reshape(shape))
+            offset += values.nbytes
+
+        return result
+
+    def __reduce__(self):
+
+        return SimulationResult.from_bytes, (self.to_bytes(),)
+
+    def _half_width(self, counts: np.ndarray, squares: np.ndarray | None) -> np.ndarray:
+
+        if self.rao_blackwell:
+            return normal_half_width(counts, squares, self.simulation_count)
+        return wilson_half_width(counts, self.simulation_count)
+
+    @property
+    def featured_error(self) -> np.ndarray:
+        return self._half_width(self.featured_rolls, self._featured_squares)
+
+    @property
+    def standard_error(self) -> np.ndarray:
+        return self._half_width(self.standard_rolls, self._standard_squares)
+
+    @property
+    def total_error(self) -> np.ndarray:
+        # Totals are always sampled.
+        return wilson_half_width(self.total_rolls, self.simulation_count)
+
+    @property
+    def joint_error(self) -> np.ndarray:
+        return self._half_width(self.joint_rolls, self._joint_squares)
+
+    def max_error(self, floor: float = 0.0) -> float:
+        """Largest confidence half-width over every bin with an estimated chance of at least `floor`."""
+
+        bins = [self.featured_rolls, self.standard_rolls, self.total_rolls, self.joint_rolls]
+        errors = [self.featured_error, self.standard_error, self.total_error, self.joint_error]
+        return max_error(self.simulation_count, bins, floor, errors)
+
+
+class SimulationMetrics:
+    """Point-in-time copy of the counters of a `SimulationThread`. See `gachamodel.SimulationMetrics`."""
+
+    def __init__(
+            self,
+            trajectories: int,
+            elapsed: timedelta,
+            pulls: int,
+            lock_wait: timedelta,
+            publish_retries: int,
+            snapshots: int,
+            snapshot_time: timedelta,
+            worker_progress: list[int],
+            peak_memory: int,
+            ):
+
+        seconds = elapsed.total_seconds()
+        self.trajectories = trajectories
+        self.elapsed = elapsed
+        self.trajectories_per_sec = trajectories / seconds if seconds > 0 else 0.0
+        self.pulls_per_sec = self.trajectories_per_sec * pulls
+        self.lock_wait = lock_wait
+        self.publish_retries = publish_retries
+        self.snapshots = snapshots
+        self.snapshot_time = snapshot_time
+        self.worker_progress = worker_progress
+        self.peak_memory = peak_memory
+
+    @property
+    def avg_snapshot_time(self) -> timedelta:
+        return self.snapshot_time / self.snapshots if self.snapshots else timedelta(0)
+
+
+class SimulationThread:
+    """
+    Same interface as `gachamodel.SimulationThread`. Trajectories are
+    simulated in batches on a single background thread; NumPy releases
+    the GIL inside most array operations, so the UI stays responsive.
+    `workers` is accepted for compatibility and ignored.
+    """
+
+    def __init__(
+            self,
+            model: GenshinImpactGachaModel,
+            pulls: int,
+            sim_length: int,
+            workers: int | None = None,
+            checkpoints: list[int] | None = None,
+            tolerance: float | None = None,
+            floor: float = 0.001,
+            resume_from: SimulationResult | None = None,
+            first_trajectory: int = 0,
+            rao_blackwell: bool = False,
+            antithetic: bool = False,
+            ):
+
+        if tolerance is not None and not tolerance > 0:
+            raise ValueError("tolerance must be positive")
+
+        checkpoints = sorted(set(checkpoints or []))
+        for checkpoint in checkpoints:
+            if not 0 <= checkpoint <= pulls:
+                raise ValueError(f"checkpoint {checkpoint} is outside of 0..={pulls} pulls")
+
+        if resume_from is not None and resume_from.rao_blackwell != rao_blackwell:
+            raise ValueError("resume_from must come from a simulation with the same rao_blackwell setting")
+
+        self.model = model
+        self.pulls = pulls
+        self.sim_length = sim_length
+        self.checkpoints = checkpoints
+        self.tolerance = tolerance
+        self.floor = floor
+        self.first_trajectory = first_trajectory
+        self.rao_blackwell = rao_blackwell
+        self.antithetic = antithetic
+        self._running = threading.Event()
+        self._stop_requested = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        # Exception that ended the run early, if any
+        self.error: Exception | None = None
+
+        self._histogram = Histogram()
+        self._checkpoints = [Histogram() for _ in checkpoints]
+        self._delta = Histogram()
+        self._delta_base = 0
+        self._generation = 0
+        self._sim_duration = timedelta(0)
+        self._resumed_count = 0
+        self._resumed_duration = timedelta(0)
+
+        # Counters for `get_metrics`.
+        self._start_time = None
+        self._elapsed = 0.0
+        self._done = 0
+        self._lock_wait = 0.0
+        self._snapshots = 0
+        self._snapshot_time = 0.0
+        self._peak_memory = 0
+
+        # Start from the earlier counts. They also go into the delta, so
+        # that a reader's first delta is complete, as `base_generation` 0 says.
+        if resume_from is not None and resume_from.simulation_count:
+            # Only the totals of a Rao-Blackwellized result were sampled.
+            if rao_blackwell:
+                counts, offset = resume_from.total_rolls[:, None], (resume_from.tot_range[0], 0)
+            else:
+                counts, offset = resume_from.joint_rolls, (resume_from.ftd_range[0], resume_from.std_range[0])
+            self._histogram.add_joint(counts, offset)
+            self._delta.add_joint(counts, offset)
+            self._generation = 1
+            self._sim_duration = self._resumed_duration = resume_from.sim_duration
+            self._resumed_count = resume_from.simulation_count
+
+    def run(self) -> None:
+
+        self._running.set()
+        self._stop_requested.clear()
+        self.error = None
+        self._thread = threading.Thread(target=self._simulate, daemon=True)
+        self._thread.start()
+
+    def _simulate(self) -> None:
+
+        try:
+            self._simulate_batches()
+        except Exception as e:
+            # Kept for the caller, as nothing would see it on this thread
+            self.error = e
+        finally:
+            self._running.clear()
+
+    def _simulate_batches(self) -> None:
+
+        start_time = self._start_time = time.perf_counter()
+        model = GenshinImpactGachaModel(
+            pt=self.model.counter5,
+            g=self.model.g,
+            cr_model=CapturingRadianceModel(self.model.cr_model.cr, self.model.cr_model.version),
+            seed=self.model.seed,
+        )
+        model.counter4 = self.model.counter4
+        model.antithetic = self.antithetic
+
+        done = 0
+        while done < self.sim_length and not self._stop_requested.is_set():
+            batch = min(BATCH_SIZE, self.sim_length - done)
+
+            # Each batch draws from a stream keyed by its first trajectory,
+            # so shards starting on a batch boundary can be recomputed on
+            # their own. A resumed run must not replay what it resumed from.
+            model.rng = np.random.default_rng([self.model.seed, self._resumed_count, self.first_trajectory + done])
+            state = model._initial_state(batch)
+            featured, standard, at_checkpoints = model._sweep_fast(
+                state, self.pulls, np.asarray(self.checkpoints), split=not self.rao_blackwell)
+            done += batch
+            self._done = done
+
+            waiting = time.perf_counter()
+            with self._lock:
+                self._lock_wait += time.perf_counter() - waiting
+                self._histogram.update(featured, standard)
+                for histogram, ftd, std in zip(self._checkpoints, *at_checkpoints):
+                    histogram.update(ftd, std)
+                self._delta.update(featured, standard)
+                self._generation += 1
+                self._sim_duration = self._resumed_duration + timedelta(seconds=time.perf_counter() - start_time)
+                self._elapsed = time.perf_counter() - start_time
+                memory = sum(h.memory for h in (self._histogram, self._delta, *self._checkpoints))
+                self._peak_memory = max(self._peak_memory, memory)
+
+                if self.tolerance is not None:
+                    result = self._result(self._histogram, 0)
+                    if result.max_error(self.floor) <= self.tolerance:
+                        break
+
+    def stop(self) -> None:
+
+        self._stop_requested.set()
+
+    def is_running(self) -> bool:
+
+        return self._running.is_set()
+
+    def _result(self, histogram: Histogram, base_generation: int) -> SimulationResult:
+
+        model = self.model if self.rao_blackwell else None
+        return SimulationResult(histogram, self._sim_duration, self._generation, base_generation, model)
+
+    @contextmanager
+    def _reading(self):
+        """Hold the lock for a reader, counting the wait and the time held as one snapshot."""
+
+        waiting = time.perf_counter()
+        with self._lock:
+            building = time.perf_counter()
+            try:
+                yield
+            finally:
+                self._lock_wait += building - waiting
+                self._snapshot_time += time.perf_counter() - building
+                self._snapshots += 1
+
+    def get_current_results(self) -> SimulationResult:
+
+        with self._reading():
+            return self._result(self._histogram, 0)
+
+    def get_results_since(self, generation: int) -> SimulationResult | None:
+        """See `gachamodel.SimulationThread.get_results_since`."""
+
+        with self._reading():
+            if generation == self._generation:
+                return None
+
+            if generation == self._delta_base:
+                result = self._result(self._delta, self._delta_base)
+            else:
+                result = self._result(self._histogram, 0)
+
+            self._delta.clear()
+            self._delta_base = self._generation
+            return result
+
+    def get_sweep_results(self) -> list[SimulationResult]:
+        """Current results at each checkpoint, in ascending order of pulls."""
+
+        with self._reading():
+            return [self._result(histogram, 0) for histogram in self._checkpoints]
+
+    def get_sweep_tensor(self) -> np.ndarray:
+        """
+        Current joint counts at every checkpoint as one
+        `checkpoint x featured x standard` array, indexed from 0 on every axis.
+        """
+
+        results = self.get_sweep_results()
+        rows = max((r.ftd_range[1] + 1 for r in results), default=0)
+        cols = max((r.std_range[1] + 1 for r in results), default=0)
+        tensor = np.zeros((len(results), rows, cols))
+        for i, result in enumerate(results):
+            (f_lo, f_hi), (s_lo, s_hi) = result.ftd_range, result.std_range
+            tensor[i, f_lo:f_hi + 1, s_lo:s_hi + 1] = result.joint_rolls
+        return tensor
+
+    def get_metrics(self) -> SimulationMetrics:
+        """See `gachamodel.SimulationThread.get_metrics`."""
+
+        # Once the run is done, stop the clock at its last publish.
+        if self._start_time is not None and self.is_running():
+            elapsed = time.perf_counter() - self._start_time
+        else:
+            elapsed = self._elapsed
+
+        return SimulationMetrics(
+            trajectories=self._done,
+            elapsed=timedelta(seconds=elapsed),
+            pulls=self.pulls,
+            lock_wait=timedelta(seconds=self._lock_wait),
+            publish_retries=0,
+            snapshots=self._snapshots,
+            snapshot_time=timedelta(seconds=self._snapshot_time),
+            worker_progress=[self._done],
+            peak_memory=self._peak_memory,
+        )
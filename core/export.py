@@ -0,0 +1,90 @@
+"""
+Writers for simulation results, in formats other tools can read:
+JSON and CSV for spreadsheets and scripts, NPZ for NumPy.
+"""
+import csv
+import io
+import json
+
+import numpy as np
+
+
+def result_to_dict(result) -> dict:
+    """
+    Plain-Python view of a result. Each histogram is stored with the
+    value of its first bin, like the ranges of `SimulationResult`.
+    """
+
+    rao_blackwell = bool(getattr(result, "rao_blackwell", False))
+
+    def listed(counts):
+        # Whole numbers unless the result is Rao-Blackwellized
+        counts = np.asarray(counts)
+        return (counts if rao_blackwell else counts.astype(np.int64)).tolist()
+
+    def hist(counts, value_range):
+        return {"start": int(value_range[0]), "counts": listed(counts)}
+
+    return {
+        "simulation_count": int(result.simulation_count),
+        "sim_duration": result.sim_duration.total_seconds(),
+        "rao_blackwell": rao_blackwell,
+        "featured": hist(result.featured_rolls, result.ftd_range),
+        "standard": hist(result.standard_rolls, result.std_range),
+        "total": hist(result.total_rolls, result.tot_range),
+        "joint": {
+            "featured_start": int(result.ftd_range[0]),
+            "standard_start": int(result.std_range[0]),
+            "counts": listed(result.joint_rolls),
+        },
+    }
+
+
+def to_json(
+        result,
+        **extra,
+        ) -> str:
+    """Serialize a result, along with any `extra` top-level fields, as JSON."""
+
+    return json.dumps({**extra, **result_to_dict(result)}, indent=2)
+
+
+def to_csv(result) -> str:
+    """One row per nonzero joint bin: featured, standard, count and probability."""
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(["featured", "standard", "count", "probability"])
+
+    joint = np.asarray(result.joint_rolls)
+    n = result.simulation_count or 1
+    for i, j in zip(*np.nonzero(joint)):
+        count = joint[i, j]
+        writer.writerow([
+            result.ftd_range[0] + int(i),
+            result.std_range[0] + int(j),
+            # Whole numbers unless the result is Rao-Blackwellized
+            int(count) if float(count).is_integer() else float(count),
+            float(count) / n,
+        ])
+
+    return buffer.getvalue()
+
+
+def to_npz(result) -> bytes:
+    """The histograms and their ranges as an uncompressed NumPy archive."""
+
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        featured_rolls=result.featured_rolls,
+        standard_rolls=result.standard_rolls,
+        total_rolls=result.total_rolls,
+        joint_rolls=result.joint_rolls,
+        ftd_range=np.array(result.ftd_range),
+        std_range=np.array(result.std_range),
+        tot_range=np.array(result.tot_range),
+        simulation_count=np.array(result.simulation_count),
+        sim_duration=np.array(result.sim_duration.total_seconds()),
+    )
+    return buffer.getvalue()
@@ -0,0 +1,165 @@
+from datetime import timedelta
+
+import numpy as np
+
+from core.utils import max_error, wilson_half_width
+
+
+def _grow(
+        array: np.ndarray,
+        shape: tuple[int, ...],
+        ) -> np.ndarray:
+    """Zero-pad `array` so that it is at least `shape`."""
+
+    if all(have >= want for have, want in zip(array.shape, shape)):
+        return array
+
+    # Grow geometrically so a slowly widening support reallocates rarely.
+    new_shape = tuple(
+        max(have, want, 2 * have) if want > have else have
+        for have, want in zip(array.shape, shape)
+    )
+    grown = np.zeros(new_shape, dtype=array.dtype)
+    grown[tuple(slice(0, n) for n in array.shape)] = array
+    return grown
+
+
+def _union(
+        a: tuple[int, int] | None,
+        b: tuple[int, int],
+        ) -> tuple[int, int]:
+
+    if a is None:
+        return b
+    return (min(a[0], b[0]), max(a[1], b[1]))
+
+
+class ResultAccumulator:
+    """
+    Python-side copy of a running simulation, kept up to date from the
+    deltas returned by `SimulationThread.get_results_since`.
+
+    Exposes the same attributes as `SimulationResult`, so it can be used
+    wherever a result snapshot is expected. Rao-Blackwellized results can be
+    accumulated too, but their errors are then Wilson half-widths, which
+    overstate them.
+    """
+
+    def __init__(self):
+
+        self.reset()
+
+    def reset(self) -> None:
+
+        self.generation = 0
+        self.simulation_count = 0
+        self.sim_duration = timedelta(0)
+
+        self._featured = np.zeros(0, dtype=np.float64)
+        self._standard = np.zeros(0, dtype=np.float64)
+        self._total = np.zeros(0, dtype=np.float64)
+        self._joint = np.zeros((0, 0), dtype=np.float64)
+
+        self._ftd_range = None
+        self._std_range = None
+        self._tot_range = None
+
+    def poll(self, sim_thread) -> bool:
+        """Fetch and apply changes from `sim_thread`. Returns whether anything changed."""
+
+        result = sim_thread.get_results_since(self.generation)
+        if result is None:
+            return False
+
+        self.apply(result)
+        return True
+
+    def apply(self, result) -> None:
+        """Apply a full or delta result from `get_results_since`."""
+
+        if result.base_generation == 0:
+            self.reset()
+        elif result.base_generation != self.generation:
+            raise ValueError(
+                f"Result is relative to generation {result.base_generation}, "
+                f"but the accumulator is at generation {self.generation}.")
+
+        self.generation = result.generation
+        self.sim_duration = result.sim_duration
+
+        if not result.simulation_count:
+            return
+
+        self.simulation_count += result.simulation_count
+
+        ftd_min, ftd_max = result.ftd_range
+        std_min, std_max = result.std_range
+        tot_min, tot_max = result.tot_range
+
+        self._featured = _grow(self._featured, (ftd_max + 1,))
+        self._standard = _grow(self._standard, (std_max + 1,))
+        self._total = _grow(self._total, (tot_max + 1,))
+        self._joint = _grow(self._joint, (ftd_max + 1, std_max + 1))
+
+        self._featured[ftd_min:ftd_max + 1] += result.featured_rolls
+        self._standard[std_min:std_max + 1] += result.standard_rolls
+        self._total[tot_min:tot_max + 1] += result.total_rolls
+        self._joint[ftd_min:ftd_max + 1, std_min:std_max + 1] += result.joint_rolls
+
+        self._ftd_range = _union(self._ftd_range, result.ftd_range)
+        self._std_range = _union(self._std_range, result.std_range)
+        self._tot_range = _union(self._tot_range, result.tot_range)
+
+    @property
+    def ftd_range(self) -> tuple[int, int]:
+        return self._ftd_range or (0, 0)
+
+    @property
+    def std_range(self) -> tuple[int, int]:
+        return self._std_range or (0, 0)
+
+    @property
+    def tot_range(self) -> tuple[int, int]:
+        return self._tot_range or (0, 0)
+
+    @property
+    def featured_rolls(self) -> np.ndarray:
+        lo, hi = self.ftd_range
+        return _grow(self._featured, (hi + 1,))[lo:hi + 1]
+
+    @property
+    def standard_rolls(self) -> np.ndarray:
+        lo, hi = self.std_range
+        return _grow(self._standard, (hi + 1,))[lo:hi + 1]
+
+    @property
+    def total_rolls(self) -> np.ndarray:
+        lo, hi = self.tot_range
+        return _grow(self._total, (hi + 1,))[lo:hi + 1]
+
+    @property
+    def joint_rolls(self) -> np.ndarray:
+        (f_lo, f_hi), (s_lo, s_hi) = self.ftd_range, self.std_range
+        return _grow(self._joint, (f_hi + 1, s_hi + 1))[f_lo:f_hi + 1, s_lo:s_hi + 1]
+
+    @property
+    def featured_error(self) -> np.ndarray:
+        return wilson_half_width(self.featured_rolls, self.simulation_count)
+
+    @property
+    def standard_error(self) -> np.ndarray:
+        return wilson_half_width(self.standard_rolls, self.simulation_count)
+
+    @property
+    def total_error(self) -> np.ndarray:
+        return wilson_half_width(self.total_rolls, self.simulation_count)
+
+    @property
+    def joint_error(self) -> np.ndarray:
+        return wilson_half_width(self.joint_rolls, self.simulation_count)
+
+    def max_error(self, floor: float = 0.0) -> float:
+        """Largest Wilson half-width over every bin with an estimated chance of at least `floor`."""
+
+        bins = [self.featured_rolls, self.standard_rolls, self.total_rolls, self.joint_rolls]
+        return max_error(self.simulation_count, bins, floor)
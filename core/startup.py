@@ -0,0 +1,51 @@
+"""
+Startup profiling, enabled with `python Genshiny.py --profile-startup`.
+
+Records how long each phase of starting the app takes, from the moment
+this module is first imported, and reports them once the main window is
+ready.
+"""
+import sys
+import time
+
+
+class StartupProfile:
+
+    FLAG = "--profile-startup"
+
+    def __init__(self):
+
+        self.enabled = self.FLAG in sys.argv
+        if self.enabled:
+            # Keep Qt from seeing an argument it does not know
+            sys.argv.remove(self.FLAG)
+        self.start = self.last = time.perf_counter()
+        self.phases: list[tuple[str, float]] = []
+
+    def mark(self, phase: str) -> None:
+        """End `phase`, which started at the previous mark."""
+
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self) -> None:
+        """Print the time of every phase so far, if profiling is enabled."""
+
+        if not self.enabled:
+            return
+
+        lines = [f"{phase:<16}{seconds * 1000:8.1f} ms" for phase, seconds in self.phases]
+        lines.append(f"{'total':<16}{(self.last - self.start) * 1000:8.1f} ms")
+        text = "\n".join(lines)
+
+        # Windowed builds have no console to print to
+        if sys.stderr is not None:
+            print(text, file=sys.stderr)
+        else:
+            from core.config import CONFIG
+            CONFIG.SAVE_PATH.mkdir(parents=True, exist_ok=True)
+            (CONFIG.SAVE_PATH / "startup_profile.txt").write_text(text + "\n")
+
+
+STARTUP = StartupProfile()
@@ -51,6 +51,14 @@ class TEXT:
     ANIMATION_SUFFIX = "ms"
     ANIMATION_INTERVAL = "Animation Interval"
 
+    TARGET_PRECISION = "Target Precision"
+    TARGET_PRECISION_OPTIONS = [
+        "Off",
+        "± 1%",
+        "± 0.5%",
+        "± 0.1%",
+    ]
+
     PROGRESS_BAR_FORMAT = "%v / %m  (%p%)"
 
     RUN = "Run"
@@ -91,9 +99,18 @@ class TEXT:
 
     SIMULATION_RUNNING = "Simulation running . . ."
     SIMULATION_COMPLETED = "Simulation completed in {}"
+    SIMULATION_STOPPING = "Stopping simulation . . ."
+    SIMULATION_FAILED = "Simulation failed: {}"
+    SIMULATION_METRICS = (
+        "{trajectories_per_sec:,.0f} sims/s  ·  {pulls_per_sec:,.0f} pulls/s\n"
+        "Lock wait {lock_wait_ms:.1f} ms  ·  {snapshots} snapshots, {snapshot_us:.0f} µs each  ·  {memory_kib:,.0f} KiB"
+    )
 
     JOINT_VIEW_STANDARD = "View Mode: Standard 5 Stars:"
     JOINT_VIEW_FEATURED = "View Mode: Featured 5 Stars:"
 
     JOINT_VIEW_STANDARD_OPTIONS = [EQ, GT, GE, LT, LE]
     JOINT_VIEW_FEATURED_OPTIONS = [EQ, GT, GE, LT, LE]
+
+    HEATMAP_CELL_TOOLTIP = "Featured 5 Stars: {featured}\nStandard 5 Stars: {standard}\nProbability: {probability:.4f}%"
+    HEATMAP_BLOCK_TOOLTIP = "Featured 5 Stars: {featured}\nStandard 5 Stars: {standard}\nHighest Probability: {probability:.4f}%"
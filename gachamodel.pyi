@@ -3,6 +3,8 @@
 from enum import Enum
 from datetime import timedelta
 
+import numpy as np
+
 
 class PullResult(Enum):
     """
@@ -62,7 +64,7 @@ class GenshinImpactGachaModel:
     ### Args:
     - `g` - Whether the next 5-star is guaranteed to be featured
     - `cr_model` - Capturing Radiance model to use
-    - `seed` - Seed for the random number generator
+    - `seed` - Seed for the random number generator. Setting it restarts the stream.
     - `rate5` - Base rate for 5-star before the soft pity threshold for 5-stars
     - `rate4` - Base rate for 4-star before the soft pity threshold for 4-stars
     - `rateup5` - Rate increase after the soft pity threshold for 5-stars
@@ -109,6 +111,7 @@ class GenshinImpactGachaModel:
             ) -> tuple[int, int]:
         """
         Perform multiple pulls and count the results.
+        Releases the GIL while pulling.
         
         ### Args:
         - `pulls` - Number of pulls to perform
@@ -119,39 +122,218 @@ class GenshinImpactGachaModel:
         """
         ...
 
+    def batch_pull_count_fast(
+            self,
+            pulls: int
+            ) -> tuple[int, int]:
+        """
+        Same as `batch_pull_count`, but samples the number of pulls until
+        each 5-star directly, using one random draw per 5-star instead of
+        one per pull. `counter4` is not advanced.
+
+        ### Args:
+        - `pulls` - Number of pulls to perform
+
+        ### Returns:
+        - A tuple of two integers containing the number
+        of featured and standard 5-stars obtained, respectively.
+        """
+        ...
+
+    def batch_simulate(
+            self,
+            pulls: int,
+            trajectories: int,
+            fast: bool = True,
+            ) -> tuple[np.ndarray[tuple[int], np.dtype[np.int32]], np.ndarray[tuple[int], np.dtype[np.int32]]]:
+        """
+        Run independent trajectories that all start from the current state.
+        Only the random stream advances. Releases the GIL for the whole batch, so
+        calls from several Python threads run in parallel.
+
+        ### Args:
+        - `pulls` - Number of pulls per trajectory
+        - `trajectories` - Number of trajectories to run
+        - `fast` - Use `batch_pull_count_fast` instead of `batch_pull_count`
+
+        ### Returns:
+        - Two arrays of length `trajectories` holding the number of
+        featured and standard 5-stars of each trajectory, respectively.
+        """
+        ...
+
 
 class SimulationResult:
+    """
+    Snapshot of simulation counts. Histograms are dense read-only views
+    over the range of values that occurred, e.g. `featured_rolls[i]` is the
+    number of trajectories with `ftd_range[0] + i` featured 5-stars.
+    Counts are whole numbers unless the result is Rao-Blackwellized.
+    Results can be merged with `merge` or `+`, serialized with `to_bytes`,
+    and pickled.
+    ### Attributes:
+    - `featured_rolls` - Counts over `ftd_range`
+    - `standard_rolls` - Counts over `std_range`
+    - `total_rolls` - Counts over `tot_range`
+    - `joint_rolls` - Featured x standard counts over `ftd_range` x `std_range`
+    - `generation` - Number of times the workers had published when this was taken
+    - `base_generation` - Generation these counts are relative to. 0 for a full
+    snapshot, otherwise the counts are only what was added since then.
+    - `featured_error`, `standard_error`, `total_error`, `joint_error` - Half-width
+    of the 95% confidence interval of each bin's probability, same shape as the
+    counts. Wilson intervals for sampled bins, normal intervals for integrated ones.
+    - `rao_blackwell` - Whether only the 5-star totals were sampled, and every
+    trajectory was spread over the featured/standard bins by their exact chance
+    """
 
-    featured_rolls: dict[int, int]
-    standard_rolls: dict[int, int]
-    total_rolls: dict[int, int]
-    joint_rolls: dict[tuple[int, int], int]
+    featured_rolls: np.ndarray[tuple[int], np.dtype[np.float64]]
+    standard_rolls: np.ndarray[tuple[int], np.dtype[np.float64]]
+    total_rolls: np.ndarray[tuple[int], np.dtype[np.float64]]
+    joint_rolls: np.ndarray[tuple[int, int], np.dtype[np.float64]]
     simulation_count: int
     ftd_range: tuple[int, int]
     std_range: tuple[int, int]
+    tot_range: tuple[int, int]
     sim_duration: timedelta
+    generation: int
+    base_generation: int
+    featured_error: np.ndarray[tuple[int], np.dtype[np.float64]]
+    standard_error: np.ndarray[tuple[int], np.dtype[np.float64]]
+    total_error: np.ndarray[tuple[int], np.dtype[np.float64]]
+    joint_error: np.ndarray[tuple[int, int], np.dtype[np.float64]]
+    rao_blackwell: bool
 
-    def __init__(
-            self,
-            featured_rolls: dict[int, int],
-            standard_rolls: dict[int, int],
-            total_rolls: dict[int, int],
-            joint_rolls: dict[tuple[int, int], int],
-            simulation_count: int,
-            ftd_range: tuple[int, int],
-            std_range: tuple[int, int],
-            sim_duration: timedelta,
-            ) -> None:
+    def __init__(self) -> None:
+        ...
+
+    @staticmethod
+    def from_joint(
+            joint_rolls: np.ndarray[tuple[int, int], np.dtype[np.uint64]],
+            offset: tuple[int, int] = (0, 0),
+            sim_duration: timedelta = ...,
+            ) -> SimulationResult:
+        """
+        Rebuild a result from its joint counts. The marginals are derived from them.
+        ### Args:
+        - `joint_rolls` - `joint_rolls[i, j]` counts trajectories with `offset[0] + i`
+        featured and `offset[1] + j` standard 5-stars
+        - `offset` - Featured and standard counts of the first row and column
+        - `sim_duration` - Time it took to simulate them
+        """
+        ...
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> SimulationResult:
+        """
+        Inverse of `to_bytes`. Raises `ValueError` if `data` is not a serialized
+        result, or was written in an unsupported format version.
+        """
+        ...
+
+    def to_bytes(self, level: int = 3) -> bytes:
+        """
+        Serialize the result to a compact, versioned format: a magic and format
+        version, then one zstd frame, compressed at `level`, with the dense
+        histograms, ranges, trajectory count and duration. Both engines read
+        and write the same bytes.
+        """
         ...
 
+    def merge(self, other: SimulationResult) -> SimulationResult:
+        """
+        Counts of both results together, as if all their trajectories had been
+        simulated in one run, e.g. to combine runs of the same configuration with
+        different seeds. Durations add up and the generations are reset to 0.
+        Merging is associative, and an empty result is its identity.
+        Raises `ValueError` if only one of them is Rao-Blackwellized.
+        """
+        ...
+
+    def __add__(self, other: SimulationResult) -> SimulationResult:
+        """Same as `merge`."""
+        ...
+
+    def max_error(self, floor: float = 0.0) -> float:
+        """
+        Largest confidence half-width over every marginal and joint bin with an
+        estimated probability of at least `floor`. Infinite if there are no samples.
+        """
+        ...
+
+
+class SimulationMetrics:
+    """
+    Point-in-time copy of the throughput and contention counters of a `SimulationThread`.
+    ### Attributes:
+    - `trajectories` - Trajectories finished so far by this run, not counting resumed ones
+    - `elapsed` - Time since `run`, stopped at the last publish once the run is done
+    - `trajectories_per_sec`, `pulls_per_sec` - Average rates over `elapsed`
+    - `lock_wait` - Total time workers and readers waited for the shared results
+    - `publish_retries` - Publishes workers put off because a reader held the results
+    - `snapshots`, `snapshot_time`, `avg_snapshot_time` - Results built for readers,
+    and the time spent building them
+    - `worker_progress` - Trajectories finished by each worker
+    - `peak_memory` - Largest number of bytes the shared histograms have held
+    """
+
+    trajectories: int
+    elapsed: timedelta
+    trajectories_per_sec: float
+    pulls_per_sec: float
+    lock_wait: timedelta
+    publish_retries: int
+    snapshots: int
+    snapshot_time: timedelta
+    avg_snapshot_time: timedelta
+    worker_progress: list[int]
+    peak_memory: int
+
 
 class SimulationThread:
+    """
+    Runs `sim_length` independent trajectories of `pulls` pulls each
+    in the background, spread across multiple worker threads.
+    ### Args:
+    - `model` - Model whose state every trajectory starts from
+    - `pulls` - Number of pulls per trajectory
+    - `sim_length` - Number of trajectories to simulate
+    - `workers` - Number of worker threads. Defaults to all available cores.
+    - `checkpoints` - Pull counts, each at most `pulls`, to also record
+    results at. Every trajectory is simulated once, so sweeping several
+    budgets costs the same as simulating the largest one.
+    - `tolerance` - Stop early once every bin with an estimated probability of
+    at least `floor` is within this 95% Wilson half-width. `None` runs all
+    `sim_length` trajectories.
+    - `floor` - Probability below which bins are ignored by `tolerance`
+    - `resume_from` - Earlier result of the same configuration to add `sim_length`
+    new trajectories to. They are drawn from different random streams, so
+    nothing is simulated twice. Checkpoints only cover the new trajectories.
+    - `first_trajectory` - Index of the first trajectory. Every trajectory draws
+    from its own random stream keyed by the seed and its index, so results do
+    not depend on `workers`, and a run can be split into shards of consecutive
+    indices whose histograms add up to the full run.
+    - `rao_blackwell` - Only sample the number of 5-stars of each trajectory,
+    and weight every featured/standard split of it by its exact chance instead
+    of drawing it. Same result layout, with far less variance in the
+    featured, standard and joint counts for the same number of trajectories.
+    - `antithetic` - Pair up trajectories, the second drawing its pity waits
+    from `1 - x` where the first drew `x`. Lowers the variance of cumulative
+    counts, e.g. the chance of at most `n` 5-stars, but not of single bins.
+    """
 
     def __init__(
             self,
             model: GenshinImpactGachaModel,
             pulls: int,
             sim_length: int,
+            workers: int | None = None,
+            checkpoints: list[int] | None = None,
+            tolerance: float | None = None,
+            floor: float = 0.001,
+            resume_from: SimulationResult | None = None,
+            first_trajectory: int = 0,
+            rao_blackwell: bool = False,
+            antithetic: bool = False,
             ) -> None:
         ...
 
@@ -159,6 +341,7 @@ class SimulationThread:
         ...
 
     def stop(self) -> None:
+        """Ask the workers to stop. `is_running` stays true until they have published their last results."""
         ...
 
     def is_running(self) -> bool:
@@ -166,3 +349,72 @@ class SimulationThread:
 
     def get_current_results(self) -> SimulationResult:
         ...
+
+    def get_results_since(self, generation: int) -> SimulationResult | None:
+        """
+        Return what changed since the result with the given `generation`.
+        Returns `None` if nothing was published since then, a delta
+        (`base_generation == generation`) if it was the last generation
+        handed out by this method, and a full snapshot otherwise.
+        ### Args:
+        - `generation` - Generation of the last result the caller has, or 0
+        """
+        ...
+
+    def get_sweep_results(self) -> list[SimulationResult]:
+        """Current results at each checkpoint, in ascending order of pulls."""
+        ...
+
+    def get_metrics(self) -> SimulationMetrics:
+        """Current throughput and contention counters. Never waits for the workers."""
+        ...
+
+    def get_sweep_tensor(self) -> np.ndarray[tuple[int, int, int], np.dtype[np.float64]]:
+        """
+        Current joint counts at every checkpoint as one
+        `checkpoint x featured x standard` array, indexed from 0 on every
+        axis. Checkpoints are in ascending order of pulls.
+        """
+        ...
+
+
+class ExactResult:
+    """
+    Exact distribution computed by `ExactSolver`.
+    Has the same layout as `SimulationResult`, but the histograms hold
+    probabilities instead of counts and `simulation_count` is always 1.
+    """
+
+    featured_rolls: np.ndarray[tuple[int], np.dtype[np.float64]]
+    standard_rolls: np.ndarray[tuple[int], np.dtype[np.float64]]
+    total_rolls: np.ndarray[tuple[int], np.dtype[np.float64]]
+    joint_rolls: np.ndarray[tuple[int, int], np.dtype[np.float64]]
+    simulation_count: int
+    ftd_range: tuple[int, int]
+    std_range: tuple[int, int]
+    tot_range: tuple[int, int]
+    sim_duration: timedelta
+
+
+class ExactSolver:
+    """
+    Computes the exact featured/standard 5-star distribution for a number
+    of pulls by dynamic programming over the pity, guarantee and
+    Capturing Radiance states, instead of sampling trajectories.
+    ### Args:
+    - `model` - Model whose state the pulls start from
+    - `pulls` - Number of pulls
+    - `tol` - Stop once the chance of any further 5-star drops below this
+    """
+
+    def __init__(
+            self,
+            model: GenshinImpactGachaModel,
+            pulls: int,
+            tol: float = 1e-15,
+            ) -> None:
+        ...
+
+    def solve(self) -> ExactResult:
+        """Compute the distribution. Releases the GIL while solving."""
+        ...
@@ -0,0 +1,246 @@
+"""
+Headless command line interface, for batch jobs and scripts.
+
+    python -m genshiny simulate --pulls 600 --pity 20 --guaranteed --cr 1 --sims 1e7
+
+Runs saved with `--format result` can be combined later, e.g. runs of the
+same configuration with different seeds:
+
+    python -m genshiny merge monday.result tuesday.result -o both.json
+
+Large runs can be split across worker processes, here or on other machines
+(see `core/distributed.py`):
+
+    python -m genshiny simulate --pulls 600 --sims 1e9 --processes 8
+    python -m genshiny simulate --pulls 600 --sims 1e9 \
+        --worker-command "ssh farm1 python -m genshiny worker" \
+        --worker-command "ssh farm2 python -m genshiny worker"
+
+Never imports Qt. The simulation backend, and with it NumPy, is only
+imported once a command runs, so that starting up and parsing the
+arguments stays fast.
+"""
+import argparse
+import shlex
+import sys
+import time
+from pathlib import Path
+
+
+FORMATS = ("json", "csv", "npz", "result")
+# Formats that are bytes, which are never written to the terminal.
+BINARY_FORMATS = ("npz", "result")
+
+
+def count(text: str) -> int:
+    """A positive whole number, also accepted in scientific notation (`1e7`)."""
+
+    try:
+        value = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid count: {text!r}")
+    if not value.is_integer() or value < 1:
+        raise argparse.ArgumentTypeError(f"count must be a positive whole number: {text!r}")
+    return int(value)
+
+
+def output_format(args: argparse.Namespace) -> str | None:
+    """Format to write the result in, or `None` after reporting why there is none."""
+
+    fmt = args.format or (args.output.suffix.lstrip(".").lower() if args.output else "json")
+    if fmt not in FORMATS:
+        print(f"error: cannot infer the output format from {args.output}, pass --format", file=sys.stderr)
+        return None
+    if fmt in BINARY_FORMATS and args.output is None:
+        print(f"error: {fmt} output needs --output", file=sys.stderr)
+        return None
+    return fmt
+
+
+def write(
+        result,
+        fmt: str,
+        output: Path | None,
+        **extra,
+        ) -> None:
+    """Write `result` to `output`, or stdout, with `extra` fields added to JSON."""
+
+    from core import export
+
+    if fmt == "json":
+        data = export.to_json(result, **extra) + "\n"
+    elif fmt == "csv":
+        data = export.to_csv(result)
+    elif fmt == "npz":
+        data = export.to_npz(result)
+    else:
+        data = result.to_bytes()
+
+    if output is None:
+        sys.stdout.write(data)
+    elif isinstance(data, bytes):
+        output.write_bytes(data)
+    else:
+        output.write_text(data)
+
+
+def simulate(args: argparse.Namespace) -> int:
+
+    from core.backend import (
+        BACKEND,
+        CapturingRadianceModel,
+        GenshinImpactGachaModel,
+        SimulationThread,
+    )
+    from core.config import CONFIG
+
+    fmt = output_format(args)
+    if fmt is None:
+        return 2
+    distributed = args.processes is not None or args.worker_command is not None
+    if distributed and args.tolerance is not None:
+        print("error: --tolerance cannot be used with worker processes", file=sys.stderr)
+        return 2
+
+    model = GenshinImpactGachaModel(
+        pt=args.pity,
+        g=args.guaranteed,
+        cr_model=CapturingRadianceModel(cr=args.cr, version=args.version),
+        seed=args.seed,
+    )
+    if distributed:
+        from core.distributed import Coordinator
+        sim = Coordinator(
+            model,
+            args.pulls,
+            args.sims,
+            processes=args.processes,
+            commands=[shlex.split(c) for c in args.worker_command] if args.worker_command else None,
+            workers=args.workers,
+            shard_size=args.shard_size,
+            rao_blackwell=args.rao_blackwell,
+            antithetic=args.antithetic,
+        )
+    else:
+        sim = SimulationThread(
+            model,
+            args.pulls,
+            args.sims,
+            workers=args.workers,
+            tolerance=args.tolerance,
+            floor=CONFIG.PRECISION_FLOOR,
+            rao_blackwell=args.rao_blackwell,
+            antithetic=args.antithetic,
+        )
+
+    sim.run()
+    try:
+        while sim.is_running():
+            time.sleep(0.05)
+            if args.progress:
+                done = sim.get_metrics().trajectories
+                print(f"\r{done:,} / {args.sims:,}", end="", file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        # Keep whatever was simulated so far
+        sim.stop()
+        while sim.is_running():
+            time.sleep(0.05)
+    if args.progress:
+        print(file=sys.stderr)
+    if getattr(sim, "error", None):
+        print(f"error: {sim.error}", file=sys.stderr)
+        return 1
+
+    result = sim.get_current_results()
+
+    config = {
+        "pulls": args.pulls,
+        "pity": args.pity,
+        "guaranteed": args.guaranteed,
+        "cr": args.cr,
+        "version": args.version,
+        "seed": args.seed,
+    }
+    write(result, fmt, args.output, backend=BACKEND, config=config)
+
+    return 0
+
+
+def worker(args: argparse.Namespace) -> int:
+
+    from core.distributed import serve
+
+    serve()
+    return 0
+
+
+def merge(args: argparse.Namespace) -> int:
+
+    from core.backend import BACKEND, SimulationResult
+
+    fmt = output_format(args)
+    if fmt is None:
+        return 2
+
+    result = SimulationResult()
+    for path in args.inputs:
+        try:
+            result = result + SimulationResult.from_bytes(path.read_bytes())
+        except (OSError, ValueError) as e:
+            print(f"error: {path}: {e}", file=sys.stderr)
+            return 1
+
+    write(result, fmt, args.output, backend=BACKEND)
+
+    return 0
+
+
+def parser() -> argparse.ArgumentParser:
+
+    parser = argparse.ArgumentParser(
+        prog="genshiny",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sim = commands.add_parser("simulate", help="simulate pulls and write the outcome distribution")
+    sim.set_defaults(func=simulate)
+    sim.add_argument("--pulls", type=count, required=True, help="pulls per trajectory")
+    sim.add_argument("--pity", type=int, default=0, help="current 5-star pity (default: 0)")
+    sim.add_argument("--guaranteed", action="store_true", help="the next 5-star is guaranteed featured")
+    sim.add_argument("--cr", type=int, default=0, help="Capturing Radiance counter (default: 0)")
+    sim.add_argument("--version", type=int, default=2, choices=range(4), help="Capturing Radiance model version (default: 2)")
+    sim.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    sim.add_argument("--sims", type=count, default=1_000_000, help="number of trajectories, e.g. 1e7 (default: 1e6)")
+    sim.add_argument("--workers", type=int, help="worker threads (default: all cores)")
+    sim.add_argument("--tolerance", type=float, help="stop early once every bin is this precise")
+    sim.add_argument("--rao-blackwell", action="store_true", help="integrate out the featured/standard split")
+    sim.add_argument("--antithetic", action="store_true", help="simulate trajectories in antithetic pairs")
+    sim.add_argument("--format", choices=FORMATS, help="output format (default: from --output, else json)")
+    sim.add_argument("--output", "-o", type=Path, help="output file (default: stdout)")
+    sim.add_argument("--progress", action="store_true", help="report progress on stderr")
+    sim.add_argument("--processes", type=int, help="split the run across this many local worker processes")
+    sim.add_argument("--worker-command", action="append", help="command that starts a worker, once per worker, e.g. over ssh")
+    sim.add_argument("--shard-size", type=count, help="trajectories per shard handed to a worker (default: 4 shards per worker)")
+
+    combine = commands.add_parser("merge", help="combine results saved with --format result")
+    combine.set_defaults(func=merge)
+    combine.add_argument("inputs", type=Path, nargs="+", help="result files, from runs of the same configuration")
+    combine.add_argument("--format", choices=FORMATS, help="output format (default: from --output, else json)")
+    combine.add_argument("--output", "-o", type=Path, help="output file (default: stdout)")
+
+    serve = commands.add_parser("worker", help="simulate shards for a coordinator over stdin/stdout")
+    serve.set_defaults(func=worker)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+
+    args = parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+//! Timing and equivalence helpers for `benches/engine.rs`.
+//!
+//! They live inside the crate because the model types are not public.
+//! Every rate is measured on the calling thread unless stated otherwise.
+
+use std::collections::BTreeMap;
+use std::hint::black_box;
+use std::thread;
+use std::time::{Duration, Instant};
+
+use crate::histogram::Histogram;
+use crate::{CapturingRadianceModel, GenshinImpactGachaModel, SimulationThread};
+
+
+/// Fresh model at 0 pity, without a guarantee, using the given CR version.
+fn model(
+    version: i32,
+    seed: u64,
+) -> GenshinImpactGachaModel {
+
+    GenshinImpactGachaModel::new(0, false, CapturingRadianceModel::new(0, version), seed)
+
+}
+
+
+/// Single pulls per second through `GenshinImpactGachaModel::pull`.
+pub fn pull_rate(
+    version: i32,
+    pulls: u64,
+) -> f64 {
+
+    let mut model = model(version, 0);
+    let start = Instant::now();
+    for _ in 0..pulls {
+        black_box(model.pull());
+    }
+
+    pulls as f64 / start.elapsed().as_secs_f64()
+
+}
+
+
+/// Trajectories of `pulls` pulls per second through `count_pulls`,
+/// or `count_pulls_fast` if `fast`, each starting from the same state.
+pub fn trajectory_rate(
+    version: i32,
+    pulls: i32,
+    trajectories: u64,
+    fast: bool,
+) -> f64 {
+
+    let initial = model(version, 0);
+    let mut model = initial.clone();
+    let start = Instant::now();
+    for _ in 0..trajectories {
+        model.restore_state(&initial);
+        black_box(if fast { model.count_pulls_fast(pulls) } else { model.count_pulls(pulls) });
+    }
+
+    trajectories as f64 / start.elapsed().as_secs_f64()
+
+}
+
+
+/// Run a full `SimulationThread` and return it with its wall-clock time.
+fn run_simulation(
+    version: i32,
+    pulls: i32,
+    trajectories: u64,
+    workers: usize,
+    rao_blackwell: bool,
+) -> (SimulationThread, Duration) {
+
+    let mut sim = SimulationThread::new(
+        model(version, 0), pulls, trajectories, Some(workers),
+        None, None, 0.0, None, 0, rao_blackwell, false,
+    ).expect("valid benchmark configuration");
+
+    let start = Instant::now();
+    sim.run();
+    while sim.is_running() {
+        thread::sleep(Duration::from_micros(100));
+    }
+
+    (sim, start.elapsed())
+
+}
+
+
+/// Trajectories per second of a whole `SimulationThread` run on `workers` threads.
+pub fn simulation_rate(
+    version: i32,
+    pulls: i32,
+    trajectories: u64,
+    workers: usize,
+    rao_blackwell: bool,
+) -> f64 {
+
+    let (_, elapsed) = run_simulation(version, pulls, trajectories, workers, rao_blackwell);
+
+    trajectories as f64 / elapsed.as_secs_f64()
+
+}
+
+
+/// Average time to build a snapshot of a finished simulation, as
+/// `get_current_results` does, and the number of joint bins it holds.
+pub fn snapshot_latency(
+    pulls: i32,
+    trajectories: u64,
+    rao_blackwell: bool,
+    repeats: u32,
+) -> (Duration, usize) {
+
+    let (sim, _) = run_simulation(2, pulls, trajectories, 1, rao_blackwell);
+    let shared = sim.simulation_result.lock().unwrap();
+
+    let start = Instant::now();
+    for _ in 0..repeats {
+        black_box(shared.snapshot());
+    }
+    let latency = start.elapsed() / repeats;
+
+    (latency, shared.snapshot().joint_rolls.len())
+
+}
+
+
+/// Pearson's chi-square test of whether `count_pulls` and `count_pulls_fast`
+/// give the same joint featured/standard distribution, from independent
+/// samples of `trajectories` each. Returns `(statistic, degrees of freedom, z)`,
+/// where `z` is the Wilson-Hilferty normal approximation of the statistic.
+pub fn equivalence(
+    version: i32,
+    pulls: i32,
+    trajectories: u64,
+) -> (f64, usize, f64) {
+
+    let sample = |fast: bool, seed: u64| {
+        let initial = model(version, seed);
+        let mut model = initial.clone();
+        let mut hist = Histogram::default();
+        for _ in 0..trajectories {
+            model.restore_state(&initial);
+            let (f, s) = if fast { model.count_pulls_fast(pulls) } else { model.count_pulls(pulls) };
+            hist.update(f as usize, s as usize);
+        }
+        hist
+    };
+
+    // Pair up the counts of every outcome seen in either sample.
+    let mut outcomes = BTreeMap::new();
+    for (i, hist) in [sample(false, 1), sample(true, 2)].iter().enumerate() {
+        for (bin, &count) in hist.joint.iter().enumerate() {
+            if count > 0 {
+                let key = (bin / hist.cols, bin % hist.cols);
+                outcomes.entry(key).or_insert([0u64; 2])[i] += count;
+            }
+        }
+    }
+
+    // Pool outcomes too rare for the test into one bin.
+    let mut bins = Vec::new();
+    let mut pooled = [0, 0];
+    for [a, b] in outcomes.into_values() {
+        if a + b >= 10 {
+            bins.push([a, b]);
+        } else {
+            pooled = [pooled[0] + a, pooled[1] + b];
+        }
+    }
+    if pooled[0] + pooled[1] > 0 {
+        bins.push(pooled);
+    }
+
+    // Both samples have the same size, so each expects half of every bin.
+    let statistic: f64 = bins
+        .iter()
+        .map(|&[a, b]| {
+            let expected = (a + b) as f64 / 2.0;
+            ((a as f64 - expected).powi(2) + (b as f64 - expected).powi(2)) / expected
+        })
+        .sum();
+    let dof = bins.len().saturating_sub(1).max(1);
+
+    let k = dof as f64;
+    let z = ((statistic / k).cbrt() - (1.0 - 2.0 / (9.0 * k))) / (2.0 / (9.0 * k)).sqrt();
+
+    (statistic, dof, z)
+
+}
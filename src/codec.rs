@@ -0,0 +1,274 @@
+//! Compact binary format of a `SimulationResult`, for saving results and
+//! moving them between processes.
+//!
+//! A 4-byte magic and a format version byte, followed by one zstd frame
+//! holding, little-endian:
+//!
+//! - flags: u8, bit 0 set if Rao-Blackwellized
+//! - simulation_count: u64
+//! - sim_duration: u64 seconds and u32 nanoseconds
+//! - ftd_range, std_range, tot_range: 2 x u64 each, inclusive
+//! - featured, standard, total and joint counts, dense over their ranges and
+//!   the joint row-major. u64 when sampled, f64 when Rao-Blackwellized,
+//!   except for the totals, which are always sampled.
+//! - Rao-Blackwellized only: featured, standard and joint squares as f64.
+//!
+//! `core/engine.py` reads and writes the same format.
+
+use std::io::Read;
+use std::time::Duration;
+
+
+pub const MAGIC: &[u8; 4] = b"GNSR";
+pub const VERSION: u8 = 1;
+
+const FLAG_RAO_BLACKWELL: u8 = 1;
+
+/// Bytes before the counts: flags, count, duration and the three ranges.
+const HEADER_LEN: usize = 1 + 8 + 8 + 4 + 6 * 8;
+
+
+/// Fields of a result, in the order they are stored.
+pub struct Record {
+    pub rao_blackwell: bool,
+    pub simulation_count: u64,
+    pub sim_duration: Duration,
+    pub ftd_range: (usize, usize),
+    pub std_range: (usize, usize),
+    pub tot_range: (usize, usize),
+    pub featured: Vec<f64>,
+    pub standard: Vec<f64>,
+    pub total: Vec<f64>,
+    pub joint: Vec<f64>,
+    pub featured_squares: Vec<f64>,
+    pub standard_squares: Vec<f64>,
+    pub joint_squares: Vec<f64>,
+}
+
+
+pub fn encode(
+    record: &Record,
+    level: i32,
+) -> Result<Vec<u8>, String> {
+
+    let mut body = Vec::new();
+    body.push(if record.rao_blackwell { FLAG_RAO_BLACKWELL } else { 0 });
+    body.extend_from_slice(&record.simulation_count.to_le_bytes());
+    body.extend_from_slice(&record.sim_duration.as_secs().to_le_bytes());
+    body.extend_from_slice(&record.sim_duration.subsec_nanos().to_le_bytes());
+    for range in [record.ftd_range, record.std_range, record.tot_range] {
+        body.extend_from_slice(&(range.0 as u64).to_le_bytes());
+        body.extend_from_slice(&(range.1 as u64).to_le_bytes());
+    }
+
+    // Sampled counts are whole numbers, which compress better as integers.
+    let sampled = !record.rao_blackwell;
+    write_values(&mut body, &record.featured, sampled);
+    write_values(&mut body, &record.standard, sampled);
+    write_values(&mut body, &record.total, true);
+    write_values(&mut body, &record.joint, sampled);
+    if record.rao_blackwell {
+        write_values(&mut body, &record.featured_squares, false);
+        write_values(&mut body, &record.standard_squares, false);
+        write_values(&mut body, &record.joint_squares, false);
+    }
+
+    let compressed = zstd::bulk::compress(&body, level)
+        .map_err(|e| format!("cannot compress result: {e}"))?;
+
+    let mut out = Vec::with_capacity(MAGIC.len() + 1 + compressed.len());
+    out.extend_from_slice(MAGIC);
+    out.push(VERSION);
+    out.extend_from_slice(&compressed);
+
+    Ok(out)
+
+}
+
+
+pub fn decode(
+    data: &[u8],
+) -> Result<Record, String> {
+
+    if data.len() < MAGIC.len() + 1 || &data[..MAGIC.len()] != MAGIC {
+        return Err("not a serialized SimulationResult".to_string());
+    }
+    let version = data[MAGIC.len()];
+    if version != VERSION {
+        return Err(format!("unsupported SimulationResult format version {version}"));
+    }
+
+    // Only the header is decompressed up front. The ranges in it give the
+    // exact size of the rest, so a corrupt or hostile frame can never make
+    // this decompress more than the result it claims to hold.
+    let mut decoder = zstd::stream::read::Decoder::new(&data[MAGIC.len() + 1..])
+        .map_err(|e| format!("cannot decompress result: {e}"))?;
+    let mut header = [0; HEADER_LEN];
+    decoder.read_exact(&mut header).map_err(|e| match e.kind() {
+        std::io::ErrorKind::UnexpectedEof => "truncated result".to_string(),
+        _ => format!("cannot decompress result: {e}"),
+    })?;
+    let mut reader = Reader { data: &header };
+
+    let flags = reader.take::<1>()?[0];
+    let rao_blackwell = flags & FLAG_RAO_BLACKWELL != 0;
+    let simulation_count = reader.u64()?;
+    let secs = reader.u64()?;
+    let nanos = u32::from_le_bytes(reader.take()?);
+    if nanos >= 1_000_000_000 {
+        return Err("invalid duration".to_string());
+    }
+    let ftd_range = reader.range()?;
+    let std_range = reader.range()?;
+    let tot_range = reader.range()?;
+
+    let rows = range_len(ftd_range)?;
+    let cols = range_len(std_range)?;
+    let totals = range_len(tot_range)?;
+    let joint_len = rows.checked_mul(cols).ok_or("invalid ranges")?;
+    let sampled = !rao_blackwell;
+
+    let mut values = [rows, cols, totals, joint_len]
+        .into_iter()
+        .try_fold(0usize, usize::checked_add);
+    if rao_blackwell {
+        values = values.and_then(|n| n.checked_add(rows)?.checked_add(cols)?.checked_add(joint_len));
+    }
+    let body_len = values.and_then(|n| n.checked_mul(8)).ok_or("invalid ranges")?;
+
+    // One byte more than expected, to tell trailing data from the end.
+    let mut body = Vec::new();
+    decoder.take(body_len as u64 + 1).read_to_end(&mut body)
+        .map_err(|e| format!("cannot decompress result: {e}"))?;
+    if body.len() < body_len {
+        return Err("truncated result".to_string());
+    }
+    let mut reader = Reader { data: &body[..body_len] };
+
+    let featured = reader.values(rows, sampled)?;
+    let standard = reader.values(cols, sampled)?;
+    let total = reader.values(totals, true)?;
+    let joint = reader.values(joint_len, sampled)?;
+    let (featured_squares, standard_squares, joint_squares) = if rao_blackwell {
+        (reader.values(rows, false)?, reader.values(cols, false)?, reader.values(joint_len, false)?)
+    } else {
+        (Vec::new(), Vec::new(), Vec::new())
+    };
+
+    if body.len() > body_len {
+        return Err("trailing data after result".to_string());
+    }
+
+    Ok(Record {
+        rao_blackwell,
+        simulation_count,
+        sim_duration: Duration::new(secs, nanos),
+        ftd_range,
+        std_range,
+        tot_range,
+        featured,
+        standard,
+        total,
+        joint,
+        featured_squares,
+        standard_squares,
+        joint_squares,
+    })
+
+}
+
+
+/// Number of bins of an inclusive range.
+fn range_len(
+    range: (usize, usize),
+) -> Result<usize, String> {
+
+    (range.1 - range.0).checked_add(1).ok_or_else(|| "invalid range".to_string())
+
+}
+
+
+fn write_values(
+    out: &mut Vec<u8>,
+    values: &[f64],
+    integers: bool,
+) {
+
+    out.reserve(values.len() * 8);
+    for &v in values {
+        if integers {
+            out.extend_from_slice(&(v.round() as u64).to_le_bytes());
+        } else {
+            out.extend_from_slice(&v.to_le_bytes());
+        }
+    }
+
+}
+
+
+struct Reader<'a> {
+    data: &'a [u8],
+}
+
+
+impl<'a> Reader<'a> {
+
+    fn take<const N: usize>(
+        &mut self,
+    ) -> Result<[u8; N], String> {
+
+        if self.data.len() < N {
+            return Err("truncated result".to_string());
+        }
+        let (head, rest) = self.data.split_at(N);
+        self.data = rest;
+
+        Ok(head.try_into().expect("split at N bytes"))
+
+    }
+
+    fn u64(
+        &mut self,
+    ) -> Result<u64, String> {
+
+        Ok(u64::from_le_bytes(self.take()?))
+
+    }
+
+    fn range(
+        &mut self,
+    ) -> Result<(usize, usize), String> {
+
+        let lo = usize::try_from(self.u64()?).map_err(|_| "invalid range")?;
+        let hi = usize::try_from(self.u64()?).map_err(|_| "invalid range")?;
+        if hi < lo {
+            return Err("invalid range".to_string());
+        }
+
+        Ok((lo, hi))
+
+    }
+
+    fn values(
+        &mut self,
+        len: usize,
+        integers: bool,
+    ) -> Result<Vec<f64>, String> {
+
+        let bytes = len.checked_mul(8).ok_or("invalid ranges")?;
+        if self.data.len() < bytes {
+            return Err("truncated result".to_string());
+        }
+        let (head, rest) = self.data.split_at(bytes);
+        self.data = rest;
+
+        Ok(head.chunks_exact(8)
+            .map(|chunk| {
+                let raw: [u8; 8] = chunk.try_into().expect("chunks of 8 bytes");
+                if integers { u64::from_le_bytes(raw) as f64 } else { f64::from_le_bytes(raw) }
+            })
+            .collect())
+
+    }
+
+}
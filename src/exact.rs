@@ -0,0 +1,333 @@
+use numpy::{PyArray1, PyArray2};
+use pyo3::prelude::*;
+use std::time::{Instant, Duration};
+
+use crate::GenshinImpactGachaModel;
+use crate::histogram;
+
+
+/// Map a CR value onto one of the 4 states used by `pull_v2` and `pull_v3`.
+/// Anything outside `0..=2` falls through to their last match arm.
+fn cr_state(
+    cr: i32,
+) -> usize {
+
+    match cr {
+        0..=2 => cr as usize,
+        _ => 3,
+    }
+
+}
+
+
+/// Chance of the next 5-star landing on each of the next `max_pulls` pulls,
+/// starting from the given pity counter. Index `t` is pull `t + 1`.
+fn wait_distribution(
+    model: &GenshinImpactGachaModel,
+    counter5: i32,
+    max_pulls: usize,
+) -> Vec<f64> {
+
+    let mut dist = Vec::new();
+    let mut survival = 1.0;
+    let mut counter = counter5;
+
+    while dist.len() < max_pulls && survival > 0.0 {
+        let hazard = model.prob5_at(counter).clamp(0.0, 1.0);
+        dist.push(survival * hazard);
+        survival *= 1.0 - hazard;
+        counter += 1;
+    }
+
+    dist
+
+}
+
+
+/// Chance of not getting a 5-star in each of `0..=max_pulls` pulls,
+/// starting from the given pity counter.
+fn survival_distribution(
+    model: &GenshinImpactGachaModel,
+    counter5: i32,
+    max_pulls: usize,
+) -> Vec<f64> {
+
+    let mut survival = Vec::with_capacity(max_pulls + 1);
+    let mut remaining = 1.0;
+    survival.push(remaining);
+
+    for t in 0..max_pulls {
+        let hazard = model.prob5_at(counter5 + t as i32).clamp(0.0, 1.0);
+        remaining *= 1.0 - hazard;
+        survival.push(remaining);
+    }
+
+    survival
+
+}
+
+
+/// Distribution of the number of 5-stars obtained in `pulls` pulls.
+///
+/// Only the pity counter affects when a 5-star lands, so the arrival time of
+/// the k-th 5-star is the first wait convolved with k - 1 renewal waits.
+/// Stops once the chance of getting any more 5-stars drops below `tol`.
+fn five_star_distribution(
+    model: &GenshinImpactGachaModel,
+    pulls: usize,
+    tol: f64,
+) -> Vec<f64> {
+
+    let first = wait_distribution(model, model.counter5, pulls);
+    let renewal = wait_distribution(model, 1, pulls);
+    let survival = survival_distribution(model, 1, pulls);
+    let first_survival = survival_distribution(model, model.counter5, pulls);
+
+    let mut counts = vec![first_survival[pulls]];
+
+    // arrival[t] is the chance of the k-th 5-star landing on pull t + 1.
+    let mut arrival = vec![0.0; pulls];
+    arrival[..first.len()].copy_from_slice(&first);
+    let mut next = vec![0.0; pulls];
+
+    // The k-th 5-star cannot land before pull k.
+    let mut lo = 0;
+
+    while lo < pulls {
+
+        let at_least: f64 = arrival[lo..].iter().sum();
+        if at_least <= tol || at_least == 0.0 {
+            break;
+        }
+
+        // Exactly k: the k-th 5-star lands on pull t + 1, then nothing
+        // else lands in the remaining pulls.
+        let exactly: f64 = (lo..pulls)
+            .map(|t| arrival[t] * survival[pulls - t - 1])
+            .sum();
+        counts.push(exactly);
+
+        next[lo..].fill(0.0);
+        for t in lo..pulls {
+            let a = arrival[t];
+            if a == 0.0 {
+                continue;
+            }
+            for (d, &r) in renewal.iter().enumerate().take(pulls - t - 1) {
+                next[t + 1 + d] += a * r;
+            }
+        }
+        std::mem::swap(&mut arrival, &mut next);
+
+        lo += 1;
+    }
+
+    counts
+
+}
+
+
+/// `split[k][f]` is the chance that exactly `f` of the next `k` 5-stars are
+/// featured, starting from the model's guarantee and Capturing Radiance state.
+pub(crate) fn featured_split(
+    model: &GenshinImpactGachaModel,
+    k_max: usize,
+) -> Vec<Vec<f64>> {
+
+    // State index is `g * 4 + cr`.
+    let mut dist = vec![vec![0.0; k_max + 1]; 8];
+    dist[model.g as usize * 4 + cr_state(model.cr_model.cr)][0] = 1.0;
+
+    let mut split = Vec::with_capacity(k_max + 1);
+
+    for k in 0..=k_max {
+
+        split.push(
+            (0..=k)
+                .map(|f| dist.iter().map(|d| d[f]).sum())
+                .collect::<Vec<f64>>()
+        );
+
+        if k == k_max {
+            break;
+        }
+
+        let mut next = vec![vec![0.0; k_max + 1]; 8];
+        for cr in 0..4 {
+
+            // Guaranteed: always featured, CR state untouched.
+            for f in 0..=k {
+                next[cr][f + 1] += dist[4 + cr][f];
+            }
+
+            let (p, cr_win, cr_lose) = model.cr_model.branch(cr as i32);
+            let win = cr_state(cr_win);
+            let lose = 4 + cr_state(cr_lose);
+            for f in 0..=k {
+                let mass = dist[cr][f];
+                next[win][f + 1] += mass * p;
+                next[lose][f] += mass * (1.0 - p);
+            }
+        }
+        dist = next;
+    }
+
+    split
+
+}
+
+
+/// Exact counterpart of `SimulationResult`, holding probabilities
+/// instead of counts over the same dense layout.
+#[pyclass]
+#[derive(Clone)]
+pub struct ExactResult {
+    featured_rolls: Vec<f64>,
+    standard_rolls: Vec<f64>,
+    total_rolls: Vec<f64>,
+    joint_rolls: Vec<f64>,
+    #[pyo3(get)]
+    simulation_count: u64,
+    #[pyo3(get)]
+    ftd_range: (usize, usize),
+    #[pyo3(get)]
+    std_range: (usize, usize),
+    #[pyo3(get)]
+    tot_range: (usize, usize),
+    #[pyo3(get)]
+    sim_duration: Duration,
+}
+
+
+#[pymethods]
+impl ExactResult {
+
+    #[getter]
+    fn featured_rolls<'py>(
+        slf: &Bound<'py, Self>,
+    ) -> PyResult<Bound<'py, PyArray1<f64>>> {
+
+        histogram::view_1d(slf.as_any(), &slf.borrow().featured_rolls)
+
+    }
+
+    #[getter]
+    fn standard_rolls<'py>(
+        slf: &Bound<'py, Self>,
+    ) -> PyResult<Bound<'py, PyArray1<f64>>> {
+
+        histogram::view_1d(slf.as_any(), &slf.borrow().standard_rolls)
+
+    }
+
+    #[getter]
+    fn total_rolls<'py>(
+        slf: &Bound<'py, Self>,
+    ) -> PyResult<Bound<'py, PyArray1<f64>>> {
+
+        histogram::view_1d(slf.as_any(), &slf.borrow().total_rolls)
+
+    }
+
+    #[getter]
+    fn joint_rolls<'py>(
+        slf: &Bound<'py, Self>,
+    ) -> PyResult<Bound<'py, PyArray2<f64>>> {
+
+        let this = slf.borrow();
+        let shape = (this.featured_rolls.len(), this.standard_rolls.len());
+        histogram::view_2d(slf.as_any(), &this.joint_rolls, shape)
+
+    }
+
+}
+
+
+#[pyclass]
+#[derive(Clone)]
+pub struct ExactSolver {
+    model: GenshinImpactGachaModel,
+    pulls: i32,
+    tol: f64,
+}
+
+
+#[pymethods]
+impl ExactSolver {
+
+    #[new]
+    #[pyo3(signature = (model, pulls, tol=1e-15))]
+    fn new(
+        model: GenshinImpactGachaModel,
+        pulls: i32,
+        tol: f64,
+    ) -> Self {
+
+        Self {
+            model,
+            pulls,
+            tol,
+        }
+
+    }
+
+    /// Releases the GIL while solving.
+    fn solve(
+        &self,
+        py: Python<'_>,
+    ) -> ExactResult {
+
+        py.detach(|| self.solve_exact())
+
+    }
+
+}
+
+
+impl ExactSolver {
+
+    fn solve_exact(
+        &self
+    ) -> ExactResult {
+
+        let start_time = Instant::now();
+
+        let counts = five_star_distribution(&self.model, self.pulls.max(0) as usize, self.tol);
+        let split = featured_split(&self.model, counts.len() - 1);
+
+        let size = counts.len();
+        let mut featured = vec![0.0; size];
+        let mut standard = vec![0.0; size];
+        let mut joint = vec![0.0; size * size];
+
+        for (total, (&p_total, p_split)) in counts.iter().zip(&split).enumerate() {
+            for (ftd, &p_ftd) in p_split.iter().enumerate() {
+                let p = p_total * p_ftd;
+                let std = total - ftd;
+                featured[ftd] += p;
+                standard[std] += p;
+                joint[ftd * size + std] = p;
+            }
+        }
+
+        let ftd_range = histogram::nonzero_range(&featured);
+        let std_range = histogram::nonzero_range(&standard);
+        let tot_range = histogram::nonzero_range(&counts);
+
+        ExactResult {
+            featured_rolls: histogram::crop(&featured, ftd_range),
+            standard_rolls: histogram::crop(&standard, std_range),
+            total_rolls: histogram::crop(&counts, tot_range),
+            joint_rolls: histogram::crop_2d(&joint, size, ftd_range, std_range),
+            // Probabilities already sum to 1, so callers that normalise by
+            // the simulation count can treat this like a simulation result.
+            simulation_count: 1,
+            ftd_range,
+            std_range,
+            tot_range,
+            sim_duration: start_time.elapsed(),
+        }
+
+    }
+
+}
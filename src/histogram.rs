@@ -0,0 +1,389 @@
+use numpy::ndarray::{ArrayView1, ArrayView2};
+use numpy::{Element, PyArray1, PyArray2};
+use pyo3::prelude::*;
+
+
+/// z-score of the 95% confidence level used for Wilson score intervals.
+pub const WILSON_Z: f64 = 1.959963984540054;
+
+
+/// Dense tally of `(featured, standard)` outcomes, indexed from 0 and
+/// grown whenever a larger count shows up.
+#[derive(Clone, Default)]
+pub struct Histogram {
+    pub count: u64,
+    pub featured: Vec<u64>,
+    pub standard: Vec<u64>,
+    pub total: Vec<u64>,
+    /// Row-major `featured x standard` matrix with `cols` columns.
+    pub joint: Vec<u64>,
+    pub cols: usize,
+}
+
+
+impl Histogram {
+
+    pub fn rows(
+        &self,
+    ) -> usize {
+
+        self.featured.len()
+
+    }
+
+    /// Make room for at least `rows` featured and `cols` standard counts.
+    fn reserve(
+        &mut self,
+        rows: usize,
+        cols: usize,
+    ) {
+
+        if rows <= self.rows() && cols <= self.cols {
+            return;
+        }
+
+        // Grow geometrically so a slowly widening support reallocates rarely.
+        let new_rows = if rows > self.rows() { rows.max(2 * self.rows()) } else { self.rows() };
+        let new_cols = if cols > self.cols { cols.max(2 * self.cols) } else { self.cols };
+
+        let mut joint = vec![0; new_rows * new_cols];
+        for (row, values) in self.joint.chunks_exact(self.cols.max(1)).enumerate() {
+            joint[row * new_cols..row * new_cols + self.cols].copy_from_slice(values);
+        }
+
+        self.joint = joint;
+        self.cols = new_cols;
+        self.featured.resize(new_rows, 0);
+        self.standard.resize(new_cols, 0);
+        self.total.resize(new_rows + new_cols - 1, 0);
+
+    }
+
+    pub fn update(
+        &mut self,
+        featured: usize,
+        standard: usize,
+    ) {
+
+        self.add(featured, standard, 1);
+
+    }
+
+    /// Record `count` outcomes of `featured` and `standard` 5-stars at once.
+    pub fn add(
+        &mut self,
+        featured: usize,
+        standard: usize,
+        count: u64,
+    ) {
+
+        self.reserve(featured + 1, standard + 1);
+
+        self.count += count;
+        self.featured[featured] += count;
+        self.standard[standard] += count;
+        self.total[featured + standard] += count;
+        self.joint[featured * self.cols + standard] += count;
+
+    }
+
+    pub fn merge(
+        &mut self,
+        other: &Histogram,
+    ) {
+
+        self.reserve(other.rows(), other.cols);
+
+        self.count += other.count;
+        add_assign(&mut self.featured, &other.featured);
+        add_assign(&mut self.standard, &other.standard);
+        add_assign(&mut self.total, &other.total);
+        for (row, values) in other.joint.chunks_exact(other.cols.max(1)).enumerate() {
+            add_assign(&mut self.joint[row * self.cols..], values);
+        }
+
+    }
+
+    /// Bytes allocated for the counts.
+    pub fn memory(
+        &self,
+    ) -> usize {
+
+        let values = self.featured.capacity() + self.standard.capacity()
+            + self.total.capacity() + self.joint.capacity();
+        values * std::mem::size_of::<u64>()
+
+    }
+
+    /// Reset all counts, keeping the allocated support.
+    pub fn clear(
+        &mut self,
+    ) {
+
+        self.count = 0;
+        self.featured.fill(0);
+        self.standard.fill(0);
+        self.total.fill(0);
+        self.joint.fill(0);
+
+    }
+
+}
+
+
+fn add_assign(
+    target: &mut [u64],
+    values: &[u64],
+) {
+
+    for (t, v) in target.iter_mut().zip(values) {
+        *t += v;
+    }
+
+}
+
+
+/// Half-width of the 95% Wilson score interval for the chance of a bin
+/// that was hit `count` times out of `n` samples.
+pub fn wilson_half_width(
+    count: f64,
+    n: u64,
+) -> f64 {
+
+    if n == 0 {
+        return f64::INFINITY;
+    }
+
+    let n = n as f64;
+    let p = count / n;
+    let z2 = WILSON_Z * WILSON_Z;
+
+    WILSON_Z / (1.0 + z2 / n) * (p * (1.0 - p) / n + z2 / (4.0 * n * n)).sqrt()
+
+}
+
+
+/// `wilson_half_width` of every bin in `values`.
+pub fn wilson_half_widths(
+    values: &[f64],
+    n: u64,
+) -> Vec<f64> {
+
+    values.iter().map(|&count| wilson_half_width(count, n)).collect()
+
+}
+
+
+/// Half-width of the 95% normal confidence interval for the mean of a bin
+/// whose `n` per-sample weights sum to `sum` and their squares to `squares`.
+/// Used for weighted estimates, where a bin is not simply hit or missed.
+pub fn normal_half_width(
+    sum: f64,
+    squares: f64,
+    n: u64,
+) -> f64 {
+
+    if n < 2 {
+        return f64::INFINITY;
+    }
+
+    let n = n as f64;
+    let variance = ((squares - sum * sum / n) / (n - 1.0)).max(0.0);
+
+    WILSON_Z * (variance / n).sqrt()
+
+}
+
+
+/// `normal_half_width` of every bin in `sums`.
+pub fn normal_half_widths(
+    sums: &[f64],
+    squares: &[f64],
+    n: u64,
+) -> Vec<f64> {
+
+    sums.iter()
+        .zip(squares)
+        .map(|(&sum, &squares)| normal_half_width(sum, squares, n))
+        .collect()
+
+}
+
+
+/// Largest of `errors` over the bins of `counts` whose estimated chance is
+/// at least `floor`, or infinity if there are no samples yet.
+pub fn max_error(
+    n: u64,
+    counts: &[f64],
+    errors: &[f64],
+    floor: f64,
+) -> f64 {
+
+    if n == 0 {
+        return f64::INFINITY;
+    }
+
+    counts.iter()
+        .zip(errors)
+        .filter(|&(&count, _)| count >= floor * n as f64)
+        .map(|(_, &error)| error)
+        .fold(0.0, f64::max)
+
+}
+
+
+/// `max_error` of the Wilson half-widths of the bins of `counts` in `range`,
+/// straight from the integer counts, without collecting the half-widths.
+pub fn max_wilson_error(
+    n: u64,
+    counts: &[u64],
+    range: (usize, usize),
+    floor: f64,
+) -> f64 {
+
+    if n == 0 {
+        return f64::INFINITY;
+    }
+
+    counts.get(range.0..=range.1)
+        .unwrap_or_default()
+        .iter()
+        .filter(|&&count| count as f64 >= floor * n as f64)
+        .map(|&count| wilson_half_width(count as f64, n))
+        .fold(0.0, f64::max)
+
+}
+
+
+/// Smallest inclusive index range holding every nonzero entry,
+/// or `(0, 0)` if there is none.
+pub fn nonzero_range<T: Copy + Default + PartialEq>(
+    values: &[T],
+) -> (usize, usize) {
+
+    let zero = T::default();
+    let min = values.iter().position(|&v| v != zero).unwrap_or(0);
+    let max = values.iter().rposition(|&v| v != zero).unwrap_or(0);
+
+    (min, max)
+
+}
+
+
+/// Copy the inclusive `range` out of `values`, padding with zeros past the end.
+pub fn crop<T: Copy + Default>(
+    values: &[T],
+    range: (usize, usize),
+) -> Vec<T> {
+
+    (range.0..=range.1)
+        .map(|i| values.get(i).copied().unwrap_or_default())
+        .collect()
+
+}
+
+
+/// Copy the inclusive `rows x cols` block out of a row-major matrix
+/// with `stride` columns, padding with zeros past the end.
+pub fn crop_2d<T: Copy + Default>(
+    values: &[T],
+    stride: usize,
+    rows: (usize, usize),
+    cols: (usize, usize),
+) -> Vec<T> {
+
+    let mut out = Vec::with_capacity((rows.1 - rows.0 + 1) * (cols.1 - cols.0 + 1));
+    for row in rows.0..=rows.1 {
+        for col in cols.0..=cols.1 {
+            let value = if col < stride {
+                values.get(row * stride + col).copied().unwrap_or_default()
+            } else {
+                T::default()
+            };
+            out.push(value);
+        }
+    }
+    out
+
+}
+
+
+/// Add `values`, dense over the inclusive `range`, into `target`, dense
+/// over the inclusive `target_range`, which must contain `range`.
+pub fn add_cropped(
+    target: &mut [f64],
+    target_range: (usize, usize),
+    values: &[f64],
+    range: (usize, usize),
+) {
+
+    let start = range.0 - target_range.0;
+    for (t, v) in target[start..start + values.len()].iter_mut().zip(values) {
+        *t += v;
+    }
+
+}
+
+
+/// 2D counterpart of `add_cropped`, for row-major matrices over inclusive
+/// `rows x cols` blocks.
+pub fn add_cropped_2d(
+    target: &mut [f64],
+    target_rows: (usize, usize),
+    target_cols: (usize, usize),
+    values: &[f64],
+    rows: (usize, usize),
+    cols: (usize, usize),
+) {
+
+    let stride = target_cols.1 - target_cols.0 + 1;
+    let width = cols.1 - cols.0 + 1;
+    for (row, chunk) in values.chunks_exact(width).enumerate() {
+        let start = (rows.0 - target_rows.0 + row) * stride + cols.0 - target_cols.0;
+        for (t, v) in target[start..start + width].iter_mut().zip(chunk) {
+            *t += v;
+        }
+    }
+
+}
+
+
+/// Expose `values`, owned by the Python object `owner`, as a read-only
+/// NumPy array without copying.
+pub fn view_1d<'py, T: Element>(
+    owner: &Bound<'py, PyAny>,
+    values: &[T],
+) -> PyResult<Bound<'py, PyArray1<T>>> {
+
+    // SAFETY: the array keeps `owner` alive, and results are never
+    // modified after construction, so `values` outlives the view.
+    let array = unsafe {
+        PyArray1::borrow_from_array(&ArrayView1::from(values), owner.clone())
+    };
+    array.call_method1("setflags", (false,))?;
+
+    Ok(array)
+
+}
+
+
+/// Expose the row-major matrix `values`, owned by the Python object
+/// `owner`, as a read-only 2D NumPy array without copying.
+pub fn view_2d<'py, T: Element>(
+    owner: &Bound<'py, PyAny>,
+    values: &[T],
+    shape: (usize, usize),
+) -> PyResult<Bound<'py, PyArray2<T>>> {
+
+    let view = ArrayView2::from_shape(shape, values)
+        .expect("histogram shape matches its storage");
+
+    // SAFETY: see `view_1d`.
+    let array = unsafe {
+        PyArray2::borrow_from_array(&view, owner.clone())
+    };
+    array.call_method1("setflags", (false,))?;
+
+    Ok(array)
+
+}
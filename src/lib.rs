@@ -1,10 +1,63 @@
-use indexmap::IndexMap;
+use numpy::ndarray::{Array2, Array3};
+use numpy::{IntoPyArray, PyArray1, PyArray2, PyArray3, PyReadonlyArray2};
+use pyo3::exceptions::PyValueError;
 use pyo3::prelude::*;
+use pyo3::types::{PyBytes, PyType};
 use fastrand;
 use std::sync::{Arc, Mutex};
+use std::sync::atomic::{AtomicBool, AtomicU64, AtomicUsize, Ordering};
 use std::thread;
 use std::time::{Instant, Duration};
 
+mod codec;
+mod exact;
+mod histogram;
+#[cfg(feature = "bench")]
+#[doc(hidden)]
+pub mod bench;
+
+use histogram::Histogram;
+
+
+/// Combined chance of triggering CR or winning the 50/50 in the v2 model.
+/// See `CapturingRadianceModel::pull_v2`.
+const CR_V2_WIN_RATE: f64 = 0.5454545454545454;
+
+
+/// How often a worker tries to publish its local histograms to the shared result.
+const PUBLISH_INTERVAL: Duration = Duration::from_millis(10);
+
+
+/// Number of trajectories between checks of the publish clock.
+const CLOCK_CHECK_INTERVAL: u64 = 16;
+
+
+/// Derive an independent RNG seed for the given stream from the base seed.
+///
+/// Uses the SplitMix64 finalizer so that neighbouring stream indices map to
+/// unrelated generator states instead of overlapping sequences.
+fn stream_seed(
+    seed: u64,
+    stream: u64,
+) -> u64 {
+
+    let mut z = seed ^ stream.wrapping_add(1).wrapping_mul(0x9e3779b97f4a7c15);
+    z = (z ^ (z >> 30)).wrapping_mul(0xbf58476d1ce4e5b9);
+    z = (z ^ (z >> 27)).wrapping_mul(0x94d049bb133111eb);
+    z ^ (z >> 31)
+
+}
+
+
+/// Number of worker threads to use when none is requested.
+fn default_workers() -> usize {
+
+    thread::available_parallelism()
+        .map(|n| n.get())
+        .unwrap_or(1)
+
+}
+
 
 #[pyclass(eq, eq_int)]
 #[derive(PartialEq, Eq)]
@@ -23,6 +76,8 @@ pub struct CapturingRadianceModel {
     cr: i32,
     #[pyo3(get, set)]
     version: i32,
+    /// Reseeded per trajectory by the model that owns this CR model.
+    rng: fastrand::Rng,
 }
 
 #[pymethods]
@@ -37,7 +92,8 @@ impl CapturingRadianceModel {
 
         Self {
             cr,
-            version
+            version,
+            rng: fastrand::Rng::new(),
         }
 
     }
@@ -61,7 +117,7 @@ impl CapturingRadianceModel {
         &mut self,
     ) -> PullResult {
 
-        if fastrand::f64() < 0.5 {
+        if self.rng.f64() < 0.5 {
             PullResult::Featured5Star
         } else {
             PullResult::Standard5Star
@@ -75,9 +131,9 @@ impl CapturingRadianceModel {
         &mut self,
     ) -> PullResult {
 
-        if fastrand::f64() < 0.5 {
+        if self.rng.f64() < 0.5 {
             PullResult::Featured5Star
-        } else if fastrand::f64() < 0.1 {
+        } else if self.rng.f64() < 0.1 {
             PullResult::Featured5Star
         } else {
             PullResult::Standard5Star
@@ -109,10 +165,10 @@ impl CapturingRadianceModel {
         // this value is said to be between 52% and 60%.
         // Empirical analysis suggests this value to be 6/11 or ~54.55%.
 
-        let p = 0.5454545454545454;
+        let p = CR_V2_WIN_RATE;
         match self.cr {
             0 => {
-                if fastrand::f64() < 0.5 {
+                if self.rng.f64() < 0.5 {
                     self.cr = 0;
                     PullResult::Featured5Star
                 } else {
@@ -121,7 +177,7 @@ impl CapturingRadianceModel {
                 }
             }
             1 => {
-                if fastrand::f64() < 0.5 {
+                if self.rng.f64() < 0.5 {
                     self.cr = 0;
                     PullResult::Featured5Star
                 } else {
@@ -130,7 +186,7 @@ impl CapturingRadianceModel {
                 }
             }
             2 => {
-                if fastrand::f64() < p {
+                if self.rng.f64() < p {
                     self.cr = 1;
                     PullResult::Featured5Star
                 } else {
@@ -154,7 +210,7 @@ impl CapturingRadianceModel {
 
         match self.cr {
             0 => {
-                if fastrand::f64() < 0.25 {
+                if self.rng.f64() < 0.25 {
                     self.cr = 0;
                     PullResult::Featured5Star
                 } else {
@@ -163,7 +219,7 @@ impl CapturingRadianceModel {
                 }
             }
             1 => {
-                if fastrand::f64() < 0.50 {
+                if self.rng.f64() < 0.50 {
                     self.cr = 0;
                     PullResult::Featured5Star
                 } else {
@@ -172,7 +228,7 @@ impl CapturingRadianceModel {
                 }
             }
             2 => {
-                if fastrand::f64() < 0.75 {
+                if self.rng.f64() < 0.75 {
                     self.cr = 1;
                     PullResult::Featured5Star
                 } else {
@@ -191,14 +247,105 @@ impl CapturingRadianceModel {
 }
 
 
+impl CapturingRadianceModel {
+
+    /// Describe the next non-guaranteed 5-star from the given CR state as
+    /// `(featured_chance, cr_after_featured, cr_after_standard)`.
+    /// Mirrors the branches of `pull_v0` to `pull_v3` without drawing.
+    fn branch(
+        &self,
+        cr: i32,
+    ) -> (f64, i32, i32) {
+
+        match self.version {
+            3 => match cr {
+                0 => (0.25, 0, 1),
+                1 => (0.50, 0, 2),
+                2 => (0.75, 1, 3),
+                _ => (1.0, 2, 2),
+            },
+            2 => match cr {
+                0 => (0.5, 0, 1),
+                1 => (0.5, 0, 2),
+                2 => (CR_V2_WIN_RATE, 1, 3),
+                _ => (1.0, 1, 1),
+            },
+            1 => (0.5 + 0.5 * 0.1, cr, cr),
+            _ => (0.5, cr, cr),
+        }
+
+    }
+
+}
+
+
+/// Survival function of the 5-star pity counter, precomputed once per model
+/// so the number of pulls until the next 5-star can be sampled in one draw.
+#[derive(Clone, Default)]
+struct PityTable {
+    /// `survival[c]` is the chance of reaching counter `c` from counter 0
+    /// without a 5-star. Ends at the first counter that guarantees a 5-star.
+    survival: Vec<f64>,
+}
+
+
+impl PityTable {
+
+    /// Counters are never tabulated past this, even if the hazard never reaches 1.
+    const MAX_COUNTER: usize = 1000;
+
+    fn new(
+        model: &GenshinImpactGachaModel,
+    ) -> Self {
+
+        let mut survival = vec![1.0];
+        let mut remaining = 1.0;
+        let mut counter = 0;
+
+        while remaining > 0.0 && counter < Self::MAX_COUNTER {
+            let hazard = model.prob5_at(counter as i32).clamp(0.0, 1.0);
+            remaining *= 1.0 - hazard;
+            survival.push(remaining);
+            counter += 1;
+        }
+
+        Self {
+            survival,
+        }
+
+    }
+
+    /// Number of pulls until the next 5-star from the non-negative counter
+    /// `counter5`, by inverting the conditional survival function at `x`
+    /// drawn uniformly from `[0, 1)`.
+    fn sample_wait(
+        &self,
+        counter5: i32,
+        x: f64,
+    ) -> i32 {
+
+        let start = counter5 as usize;
+        if start + 1 >= self.survival.len() {
+            return 1;
+        }
+
+        let threshold = (1.0 - x) * self.survival[start];
+        let survived = self.survival[start + 1..].partition_point(|&s| s >= threshold);
+        survived as i32 + 1
+
+    }
+
+}
+
+
 #[pyclass]
 #[derive(Clone)]
 struct GenshinImpactGachaModel {
     #[pyo3(get, set)]
     g: bool,
-    #[pyo3(get, set)]
+    #[pyo3(get)]
     cr_model: CapturingRadianceModel,
-    #[pyo3(get, set)]
+    #[pyo3(get)]
     seed: u64,
     #[pyo3(get)]
     rate5: f64,
@@ -216,6 +363,11 @@ struct GenshinImpactGachaModel {
     counter5: i32,
     #[pyo3(get, set)]
     counter4: i32,
+    pity_table: Arc<PityTable>,
+    rng: fastrand::Rng,
+    /// Sample pity waits from `1 - x` instead of `x`, so that this trajectory
+    /// mirrors the one drawn from the same stream. See `SimulationThread`.
+    antithetic: bool,
 }
 
 
@@ -234,7 +386,7 @@ impl GenshinImpactGachaModel {
         let rate5 = 0.006;
         let rate4 = 0.051;
 
-        Self {
+        let mut model = Self {
             g,
             cr_model,
             seed,
@@ -246,7 +398,38 @@ impl GenshinImpactGachaModel {
             softpt4: 8,
             counter5: pt,
             counter4: 0,
-        }
+            pity_table: Arc::default(),
+            rng: fastrand::Rng::new(),
+            antithetic: false,
+        };
+        model.pity_table = Arc::new(PityTable::new(&model));
+        model.reseed(seed);
+
+        model
+
+    }
+
+    /// Setting the seed restarts the random stream from it.
+    #[setter]
+    fn set_seed(
+        &mut self,
+        seed: u64,
+    ) {
+
+        self.seed = seed;
+        self.reseed(seed);
+
+    }
+
+    #[setter]
+    fn set_cr_model(
+        &mut self,
+        cr_model: CapturingRadianceModel,
+    ) {
+
+        // Keep drawing CR outcomes from this model's stream.
+        self.cr_model = cr_model;
+        self.cr_model.rng.seed(self.rng.u64(..));
 
     }
 
@@ -254,13 +437,9 @@ impl GenshinImpactGachaModel {
         &mut self
     ) -> PullResult {
 
-        let x = fastrand::f64();
+        let x = self.rng.f64();
 
-        let prob5 = if self.counter5 <= self.softpt5 {
-            self.rate5
-        } else {
-            self.rateup5 * (self.counter5 - self.softpt5) as f64 + self.rate5
-        };
+        let prob5 = self.prob5_at(self.counter5);
 
         let prob4 = if self.counter4 <= self.softpt4 {
             self.rate4
@@ -271,14 +450,7 @@ impl GenshinImpactGachaModel {
         if x < prob5 {
             self.counter5 = 1;
             self.counter4 += 1;
-            if self.g {
-                self.g = false;
-                PullResult::Featured5Star
-            } else {
-                let pull = self.cr_model.pull();
-                self.g = pull == PullResult::Standard5Star;
-                pull
-            }
+            self.pull_5_star()
         } else if x < prob5 + prob4 {
             self.counter5 += 1;
             self.counter4 = 1;
@@ -291,10 +463,80 @@ impl GenshinImpactGachaModel {
 
     }
 
+    /// Count the featured and standard 5-stars in the next `pulls` pulls.
+    /// Releases the GIL while pulling.
     #[pyo3(signature = (pulls))]
     fn batch_pull_count(
         &mut self,
-        pulls: i32
+        py: Python<'_>,
+        pulls: i32,
+    ) -> (i32, i32) {
+
+        py.detach(|| self.count_pulls(pulls))
+
+    }
+
+    /// Same as `batch_pull_count`, but samples the number of pulls until
+    /// each 5-star directly instead of rolling every pull.
+    /// Only the 5-star state is advanced; `counter4` is left untouched.
+    #[pyo3(signature = (pulls))]
+    fn batch_pull_count_fast(
+        &mut self,
+        py: Python<'_>,
+        pulls: i32,
+    ) -> (i32, i32) {
+
+        py.detach(|| self.count_pulls_fast(pulls))
+
+    }
+
+    /// Run `trajectories` independent trajectories of `pulls` pulls, each
+    /// starting from the current state, and return the featured and
+    /// standard 5-star counts of every trajectory as NumPy arrays.
+    /// Only the model's random stream advances. Releases the GIL while pulling.
+    #[pyo3(signature = (pulls, trajectories, fast=true))]
+    fn batch_simulate<'py>(
+        &mut self,
+        py: Python<'py>,
+        pulls: i32,
+        trajectories: usize,
+        fast: bool,
+    ) -> (Bound<'py, PyArray1<i32>>, Bound<'py, PyArray1<i32>>) {
+
+        let base_seed = self.rng.u64(..);
+        let (featured, standard) = py.detach(|| {
+            let mut featured = Vec::with_capacity(trajectories);
+            let mut standard = Vec::with_capacity(trajectories);
+            let mut model = self.clone();
+
+            for trajectory in 0..trajectories {
+                model.restore_state(self);
+                model.reseed(stream_seed(base_seed, trajectory as u64));
+                let (f, s) = if fast {
+                    model.count_pulls_fast(pulls)
+                } else {
+                    model.count_pulls(pulls)
+                };
+                featured.push(f);
+                standard.push(s);
+            }
+
+            (featured, standard)
+        });
+
+        (PyArray1::from_vec(py, featured), PyArray1::from_vec(py, standard))
+
+    }
+
+}
+
+
+impl GenshinImpactGachaModel {
+
+    /// See `batch_pull_count`.
+    fn count_pulls(
+        &mut self,
+        pulls: i32,
     ) -> (i32, i32) {
 
         let mut featured_rolls = 0;
@@ -312,29 +554,185 @@ impl GenshinImpactGachaModel {
 
     }
 
+    /// See `batch_pull_count_fast`.
+    fn count_pulls_fast(
+        &mut self,
+        pulls: i32,
+    ) -> (i32, i32) {
+
+        self.count_pulls_fast_with_checkpoints(pulls, &[], &mut [], true)
+
+    }
+
+    /// Same as `count_pulls_fast`, but also stores the running counts after
+    /// each of the ascending `checkpoints` pulls in the matching slot of `counts`.
+    /// Checkpoints past `pulls` get the final counts.
+    ///
+    /// Without `split`, 5-stars are counted as featured without deciding
+    /// which they are, so no Capturing Radiance draws are spent on them.
+    fn count_pulls_fast_with_checkpoints(
+        &mut self,
+        pulls: i32,
+        checkpoints: &[i32],
+        counts: &mut [(i32, i32)],
+        split: bool,
+    ) -> (i32, i32) {
+
+        let mut featured_rolls = 0;
+        let mut standard_rolls = 0;
+        let mut done = 0;
+        let mut next_checkpoint = 0;
+
+        // Record every checkpoint reached after `done` pulls.
+        let mut record = |done: i32, next: &mut usize, rolls: (i32, i32)| {
+            while *next < checkpoints.len() && checkpoints[*next] <= done {
+                counts[*next] = rolls;
+                *next += 1;
+            }
+        };
+
+        // The table starts at counter 0, so roll any negative pity away first.
+        while self.counter5 < 0 && done < pulls {
+            record(done, &mut next_checkpoint, (featured_rolls, standard_rolls));
+            match self.pull() {
+                PullResult::Featured5Star => featured_rolls += 1,
+                PullResult::Standard5Star if split => standard_rolls += 1,
+                PullResult::Standard5Star => featured_rolls += 1,
+                _ => {}
+            }
+            done += 1;
+        }
+
+        while done < pulls {
+            let x = self.rng.f64();
+            let x = if self.antithetic { 1.0 - x } else { x };
+            let wait = self.pity_table.sample_wait(self.counter5, x);
+            if wait > pulls - done {
+                self.counter5 += pulls - done;
+                break;
+            }
+
+            // Checkpoints before the pull that lands the 5-star.
+            record(done + wait - 1, &mut next_checkpoint, (featured_rolls, standard_rolls));
+            done += wait;
+            self.counter5 = 1;
+
+            if !split {
+                featured_rolls += 1;
+                continue;
+            }
+
+            match self.pull_5_star() {
+                PullResult::Featured5Star => featured_rolls += 1,
+                _ => standard_rolls += 1,
+            }
+        }
+
+        record(i32::MAX, &mut next_checkpoint, (featured_rolls, standard_rolls));
+
+        (featured_rolls, standard_rolls)
+
+    }
+
+    /// Decide whether a 5-star is featured, updating the guarantee
+    /// and Capturing Radiance state.
+    fn pull_5_star(
+        &mut self
+    ) -> PullResult {
+
+        if self.g {
+            self.g = false;
+            PullResult::Featured5Star
+        } else {
+            let pull = self.cr_model.pull();
+            self.g = pull == PullResult::Standard5Star;
+            pull
+        }
+
+    }
+
+    /// Restart the random streams of this model and its CR model from `seed`.
+    fn reseed(
+        &mut self,
+        seed: u64,
+    ) {
+
+        self.rng.seed(seed);
+        self.cr_model.rng.seed(stream_seed(seed, 0));
+
+    }
+
+    /// Restore the pity, guarantee and Capturing Radiance state of another model.
+    fn restore_state(
+        &mut self,
+        other: &GenshinImpactGachaModel,
+    ) {
+
+        self.g = other.g;
+        self.counter5 = other.counter5;
+        self.counter4 = other.counter4;
+        self.cr_model.cr = other.cr_model.cr;
+
+    }
+
+    /// Chance that the next pull is a 5-star at the given 5-star pity counter.
+    fn prob5_at(
+        &self,
+        counter5: i32,
+    ) -> f64 {
+
+        if counter5 <= self.softpt5 {
+            self.rate5
+        } else {
+            self.rateup5 * (counter5 - self.softpt5) as f64 + self.rate5
+        }
+
+    }
+
 }
 
 
-#[pyclass]
+/// Snapshot of simulation counts. Histograms are stored densely over their
+/// nonzero range and handed to Python as read-only NumPy views.
+///
+/// Counts are stored as floats, since a Rao-Blackwellized result spreads
+/// every trajectory over several bins by their chance. Otherwise they are
+/// whole numbers.
+///
+/// Results of the same configuration can be merged, and serialized to
+/// bytes or pickled to move them between processes.
+#[pyclass(module = "gachamodel")]
 #[derive(Clone)]
 struct SimulationResult {
+    featured_rolls: Vec<f64>,
+    standard_rolls: Vec<f64>,
+    total_rolls: Vec<f64>,
+    joint_rolls: Vec<f64>,
+    /// Per-bin sums of squared trajectory weights, which the error estimates
+    /// of a Rao-Blackwellized result need. Empty otherwise, where every
+    /// weight is 0 or 1 and the squares equal the counts.
+    featured_squares: Vec<f64>,
+    standard_squares: Vec<f64>,
+    joint_squares: Vec<f64>,
     #[pyo3(get)]
-    featured_rolls: IndexMap<i32, i32>,
+    simulation_count: u64,
     #[pyo3(get)]
-    standard_rolls: IndexMap<i32, i32>,
+    ftd_range: (usize, usize),
     #[pyo3(get)]
-    total_rolls: IndexMap<i32, i32>,
+    std_range: (usize, usize),
     #[pyo3(get)]
-    joint_rolls: IndexMap<(i32, i32), i32>,
+    tot_range: (usize, usize),
     #[pyo3(get)]
-    simulation_count: i32,
+    sim_duration: Duration,
+    /// Generation of the simulation state this result brings a reader up to.
     #[pyo3(get)]
-    ftd_range: (i32, i32),
+    generation: u64,
+    /// Generation the counts are relative to. 0 means they are complete.
     #[pyo3(get)]
-    std_range: (i32, i32),
+    base_generation: u64,
+    /// Whether the featured/standard split was integrated out instead of sampled.
     #[pyo3(get)]
-    sim_duration: Duration,
-
+    rao_blackwell: bool,
 }
 
 #[pymethods]
@@ -343,180 +741,1187 @@ impl SimulationResult {
     #[new]
     fn new() -> Self {
 
-        Self {
-            featured_rolls: IndexMap::new(),
-            standard_rolls: IndexMap::new(),
-            total_rolls: IndexMap::new(),
-            joint_rolls: IndexMap::new(),
-            simulation_count: 0,
-            ftd_range: (0, 0),
-            std_range: (0, 0),
-            sim_duration: Duration::new(0, 0),
-        }
+        Self::from_histogram(&Histogram::default(), Duration::new(0, 0), 0, 0)
 
     }
 
-}
+    /// Rebuild a result from its joint counts, where `joint_rolls[i, j]`
+    /// counts trajectories with `offset[0] + i` featured and `offset[1] + j`
+    /// standard 5-stars. The marginals are derived from it.
+    #[staticmethod]
+    #[pyo3(signature = (joint_rolls, offset=(0, 0), sim_duration=Duration::ZERO))]
+    fn from_joint(
+        joint_rolls: PyReadonlyArray2<'_, u64>,
+        offset: (usize, usize),
+        sim_duration: Duration,
+    ) -> Self {
 
+        let joint = joint_rolls.as_array();
+        let cols = joint.shape()[1];
 
-impl SimulationResult {
+        let mut hist = Histogram::default();
+        for (i, &count) in joint.iter().enumerate() {
+            if count > 0 {
+                hist.add(offset.0 + i / cols, offset.1 + i % cols, count);
+            }
+        }
 
-    fn update(
-        &mut self,
-        featured: i32,
-        standard: i32,
-    ) {
+        Self::from_histogram(&hist, sim_duration, 0, 0)
+
+    }
+
+    /// Inverse of `to_bytes`. A classmethod, so that pickles can refer to it
+    /// through the class.
+    /// Releases the GIL while decoding.
+    #[classmethod]
+    fn from_bytes(
+        _cls: &Bound<'_, PyType>,
+        py: Python<'_>,
+        data: &[u8],
+    ) -> PyResult<Self> {
 
-        self.simulation_count += 1;
-        *self.featured_rolls.entry(featured).or_insert(0) += 1;
-        *self.standard_rolls.entry(standard).or_insert(0) += 1;
-        *self.total_rolls.entry(featured + standard).or_insert(0) += 1;
-        *self.joint_rolls.entry((featured, standard)).or_insert(0) += 1;
+        py.detach(|| codec::decode(data).map(Self::from_record))
+            .map_err(PyValueError::new_err)
 
     }
 
-    fn fill_range(
+    /// Serialize the result to compact, versioned, zstd-compressed bytes.
+    /// See `codec` for the layout. Releases the GIL while compressing.
+    #[pyo3(signature = (level=3))]
+    fn to_bytes<'py>(
         &self,
-    ) -> SimulationResult {
+        py: Python<'py>,
+        level: i32,
+    ) -> PyResult<Bound<'py, PyBytes>> {
 
-        let ftd_min = *self.featured_rolls.keys().min().unwrap_or(&0);
-        let ftd_max = *self.featured_rolls.keys().max().unwrap_or(&0);
-        let std_min = *self.standard_rolls.keys().min().unwrap_or(&0);
-        let std_max = *self.standard_rolls.keys().max().unwrap_or(&0);
-        let tot_min = *self.total_rolls.keys().min().unwrap_or(&0);
-        let tot_max = *self.total_rolls.keys().max().unwrap_or(&0);
-
-        let featured_rolls: IndexMap<i32, i32> = (ftd_min..=ftd_max)
-            .map(|ftd| {
-                let count = *self.featured_rolls.get(&ftd).unwrap_or(&0);
-                (ftd, count)
-            })
-            .collect();
+        let data = py.detach(|| codec::encode(&self.to_record(), level))
+            .map_err(PyValueError::new_err)?;
 
-        let standard_rolls: IndexMap<i32, i32> = (std_min..=std_max)
-            .map(|std| {
-                let count = *self.standard_rolls.get(&std).unwrap_or(&0);
-                (std, count)
-            })
-            .collect();
+        Ok(PyBytes::new(py, &data))
 
-        let total_rolls: IndexMap<i32, i32> = (tot_min..=tot_max)
-            .map(|total| {
-                let count = *self.total_rolls.get(&total).unwrap_or(&0);
-                (total, count)
-            })
-            .collect();
+    }
 
-        let joint_rolls = self.joint_rolls.clone();
+    /// Pickle as a call to `from_bytes`, which builds a new result. Results
+    /// are never modified in place, since the arrays they hand out borrow
+    /// their storage.
+    fn __reduce__<'py>(
+        slf: &Bound<'py, Self>,
+    ) -> PyResult<(Bound<'py, PyAny>, (Bound<'py, PyBytes>,))> {
+
+        let from_bytes = slf.get_type().getattr("from_bytes")?;
+        let data = slf.borrow().to_bytes(slf.py(), 3)?;
+
+        Ok((from_bytes, (data,)))
 
-        SimulationResult {
-            featured_rolls,
-            standard_rolls,
-            total_rolls,
-            joint_rolls,
-            simulation_count: self.simulation_count,
-            ftd_range: (ftd_min, ftd_max),
-            std_range: (std_min, std_max),
-            sim_duration: self.sim_duration,
-        }
     }
 
-}
+    /// Counts of both results together, as if all their trajectories had
+    /// been simulated in one run. Durations add up, and the generations are
+    /// reset since the merged result belongs to no single simulation.
+    /// Merging is associative, and an empty result is its identity.
+    /// Releases the GIL while adding up the counts.
+    fn merge(
+        &self,
+        py: Python<'_>,
+        other: &SimulationResult,
+    ) -> PyResult<SimulationResult> {
 
+        py.detach(|| self.merged(other)).map_err(PyValueError::new_err)
 
-#[pyclass]
-#[derive(Clone)]
-struct SimulationThread {
-    model: GenshinImpactGachaModel,
-    pulls: i32,
-    sim_length: i32,
-    running: Arc<Mutex<bool>>,
-    simulation_result: Arc<Mutex<SimulationResult>>,
-}
+    }
 
+    fn __add__(
+        &self,
+        py: Python<'_>,
+        other: &SimulationResult,
+    ) -> PyResult<SimulationResult> {
 
-#[pymethods]
-impl SimulationThread {
+        self.merge(py, other)
 
-    #[new]
-    #[pyo3(signature = (model, pulls, sim_length))]
-    fn new(
-        model: GenshinImpactGachaModel,
-        pulls: i32,
-        sim_length: i32,
-    ) -> Self {
-        
-        Self {
-            model,
-            pulls,
-            sim_length,
-            running: Arc::new(Mutex::new(false)),
-            simulation_result: Arc::new(Mutex::new(SimulationResult::new())),
-        }
+    }
+
+    /// Counts indexed by number of featured 5-stars, starting at `ftd_range[0]`.
+    #[getter]
+    fn featured_rolls<'py>(
+        slf: &Bound<'py, Self>,
+    ) -> PyResult<Bound<'py, PyArray1<f64>>> {
+
+        histogram::view_1d(slf.as_any(), &slf.borrow().featured_rolls)
 
     }
 
-    fn run(
-        &mut self
-    ) {
+    /// Counts indexed by number of standard 5-stars, starting at `std_range[0]`.
+    #[getter]
+    fn standard_rolls<'py>(
+        slf: &Bound<'py, Self>,
+    ) -> PyResult<Bound<'py, PyArray1<f64>>> {
 
-        // Simulation thread
-        thread::spawn({
-            let running = Arc::clone(&self.running);
-            let sim_result = Arc::clone(&self.simulation_result);
-            let mut model = self.model.clone();
-            let seed = self.model.seed;
-            let pulls = self.pulls;
-            let sim_length = self.sim_length;
+        histogram::view_1d(slf.as_any(), &slf.borrow().standard_rolls)
 
-            move || {
-                *running.lock().unwrap() = true;
-                let mut sim_count = 0;
+    }
 
-                let start_time = Instant::now();
-                fastrand::seed(seed);
+    /// Counts indexed by total number of 5-stars, starting at `tot_range[0]`.
+    #[getter]
+    fn total_rolls<'py>(
+        slf: &Bound<'py, Self>,
+    ) -> PyResult<Bound<'py, PyArray1<f64>>> {
 
-                while *running.lock().unwrap() && sim_count < sim_length {
+        histogram::view_1d(slf.as_any(), &slf.borrow().total_rolls)
 
-                    let (featured, standard) = model.batch_pull_count(pulls);
-                    sim_result.lock().unwrap().update(featured, standard);
+    }
 
-                    sim_count += 1;
-                }
+    /// Featured x standard counts over `ftd_range` x `std_range`.
+    #[getter]
+    fn joint_rolls<'py>(
+        slf: &Bound<'py, Self>,
+    ) -> PyResult<Bound<'py, PyArray2<f64>>> {
 
-                let elapsed = start_time.elapsed();
-                sim_result.lock().unwrap().sim_duration = elapsed;
+        let this = slf.borrow();
+        histogram::view_2d(slf.as_any(), &this.joint_rolls, this.joint_shape())
 
-                *running.lock().unwrap() = false;
-            }
-        });
+    }
+
+    /// Half-width of the 95% confidence interval of each bin of `featured_rolls`.
+    #[getter]
+    fn featured_error<'py>(
+        &self,
+        py: Python<'py>,
+    ) -> Bound<'py, PyArray1<f64>> {
+
+        PyArray1::from_vec(py, self.half_widths(&self.featured_rolls, &self.featured_squares))
 
     }
 
-    fn stop(
-        &mut self
-    ) {
+    /// Half-width of the 95% confidence interval of each bin of `standard_rolls`.
+    #[getter]
+    fn standard_error<'py>(
+        &self,
+        py: Python<'py>,
+    ) -> Bound<'py, PyArray1<f64>> {
 
-        *self.running.lock().unwrap() = false;
+        PyArray1::from_vec(py, self.half_widths(&self.standard_rolls, &self.standard_squares))
 
     }
 
-    fn is_running(
-        &self
-    ) -> bool {
+    /// Half-width of the 95% Wilson interval of each bin of `total_rolls`.
+    /// Totals are always sampled, so this holds for every estimator.
+    #[getter]
+    fn total_error<'py>(
+        &self,
+        py: Python<'py>,
+    ) -> Bound<'py, PyArray1<f64>> {
 
-        *self.running.lock().unwrap()
+        PyArray1::from_vec(py, histogram::wilson_half_widths(&self.total_rolls, self.simulation_count))
 
     }
 
-    fn get_current_results(
-        &self
-    ) -> SimulationResult {
+    /// Half-width of the 95% confidence interval of each bin of `joint_rolls`.
+    #[getter]
+    fn joint_error<'py>(
+        &self,
+        py: Python<'py>,
+    ) -> Bound<'py, PyArray2<f64>> {
+
+        Array2::from_shape_vec(
+            self.joint_shape(),
+            self.half_widths(&self.joint_rolls, &self.joint_squares),
+        )
+            .expect("histogram shape matches its storage")
+            .into_pyarray(py)
+
+    }
+
+    /// Largest confidence half-width over every marginal and joint bin
+    /// with an estimated chance of at least `floor`.
+    #[pyo3(signature = (floor=0.0))]
+    fn max_error(
+        &self,
+        floor: f64,
+    ) -> f64 {
+
+        let bins = [
+            (&self.featured_rolls, self.half_widths(&self.featured_rolls, &self.featured_squares)),
+            (&self.standard_rolls, self.half_widths(&self.standard_rolls, &self.standard_squares)),
+            (&self.total_rolls, histogram::wilson_half_widths(&self.total_rolls, self.simulation_count)),
+            (&self.joint_rolls, self.half_widths(&self.joint_rolls, &self.joint_squares)),
+        ];
+
+        bins.iter()
+            .map(|(counts, errors)| histogram::max_error(self.simulation_count, counts, errors, floor))
+            .fold(0.0, f64::max)
+
+    }
+
+}
+
+
+impl SimulationResult {
+
+    fn from_histogram(
+        histogram: &Histogram,
+        sim_duration: Duration,
+        generation: u64,
+        base_generation: u64,
+    ) -> SimulationResult {
+
+        let ftd_range = histogram::nonzero_range(&histogram.featured);
+        let std_range = histogram::nonzero_range(&histogram.standard);
+        let tot_range = histogram::nonzero_range(&histogram.total);
+
+        SimulationResult {
+            featured_rolls: to_f64(histogram::crop(&histogram.featured, ftd_range)),
+            standard_rolls: to_f64(histogram::crop(&histogram.standard, std_range)),
+            total_rolls: to_f64(histogram::crop(&histogram.total, tot_range)),
+            joint_rolls: to_f64(histogram::crop_2d(&histogram.joint, histogram.cols, ftd_range, std_range)),
+            featured_squares: Vec::new(),
+            standard_squares: Vec::new(),
+            joint_squares: Vec::new(),
+            simulation_count: histogram.count,
+            ftd_range,
+            std_range,
+            tot_range,
+            sim_duration,
+            generation,
+            base_generation,
+            rao_blackwell: false,
+        }
+
+    }
+
+    /// Rao-Blackwellized counterpart of `from_histogram`, for histograms that
+    /// only tally the total number of 5-stars. Every trajectory with `k`
+    /// 5-stars is spread over the joint bins `(f, k - f)` by the exact chance
+    /// of `f` of them being featured, starting from `model`'s guarantee and
+    /// Capturing Radiance state.
+    fn from_totals(
+        histogram: &Histogram,
+        model: &GenshinImpactGachaModel,
+        sim_duration: Duration,
+        generation: u64,
+        base_generation: u64,
+    ) -> SimulationResult {
+
+        let tot_range = histogram::nonzero_range(&histogram.total);
+        let size = tot_range.1 + 1;
+        let split = exact::featured_split(model, size - 1);
+
+        let mut featured = vec![0.0; size];
+        let mut standard = vec![0.0; size];
+        let mut joint = vec![0.0; size * size];
+        let mut featured_squares = vec![0.0; size];
+        let mut standard_squares = vec![0.0; size];
+        let mut joint_squares = vec![0.0; size * size];
+
+        for (total, &count) in histogram.total[..size.min(histogram.total.len())].iter().enumerate() {
+            if count == 0 {
+                continue;
+            }
+            let count = count as f64;
+            for (ftd, &p) in split[total].iter().enumerate() {
+                let std = total - ftd;
+                featured[ftd] += count * p;
+                standard[std] += count * p;
+                joint[ftd * size + std] = count * p;
+                featured_squares[ftd] += count * p * p;
+                standard_squares[std] += count * p * p;
+                joint_squares[ftd * size + std] = count * p * p;
+            }
+        }
+
+        let ftd_range = histogram::nonzero_range(&featured);
+        let std_range = histogram::nonzero_range(&standard);
+
+        SimulationResult {
+            featured_rolls: histogram::crop(&featured, ftd_range),
+            standard_rolls: histogram::crop(&standard, std_range),
+            total_rolls: to_f64(histogram::crop(&histogram.total, tot_range)),
+            joint_rolls: histogram::crop_2d(&joint, size, ftd_range, std_range),
+            featured_squares: histogram::crop(&featured_squares, ftd_range),
+            standard_squares: histogram::crop(&standard_squares, std_range),
+            joint_squares: histogram::crop_2d(&joint_squares, size, ftd_range, std_range),
+            simulation_count: histogram.count,
+            ftd_range,
+            std_range,
+            tot_range,
+            sim_duration,
+            generation,
+            base_generation,
+            rao_blackwell: true,
+        }
+
+    }
+
+    /// Inverse of `from_histogram` and `from_totals`.
+    fn to_histogram(
+        &self,
+    ) -> Histogram {
+
+        let mut hist = Histogram::default();
+
+        // Only the totals were sampled, and they are whole numbers.
+        if self.rao_blackwell {
+            for (i, &count) in self.total_rolls.iter().enumerate() {
+                if count > 0.0 {
+                    hist.add(self.tot_range.0 + i, 0, count as u64);
+                }
+            }
+            return hist;
+        }
+
+        let cols = self.standard_rolls.len();
+        for (i, &count) in self.joint_rolls.iter().enumerate() {
+            if count > 0.0 {
+                hist.add(self.ftd_range.0 + i / cols, self.std_range.0 + i % cols, count as u64);
+            }
+        }
+        hist
+
+    }
+
+    /// Confidence half-widths of `counts`: Wilson intervals for sampled bins,
+    /// normal intervals from the sums of squared weights otherwise.
+    fn half_widths(
+        &self,
+        counts: &[f64],
+        squares: &[f64],
+    ) -> Vec<f64> {
+
+        if self.rao_blackwell {
+            histogram::normal_half_widths(counts, squares, self.simulation_count)
+        } else {
+            histogram::wilson_half_widths(counts, self.simulation_count)
+        }
+
+    }
+
+    fn joint_shape(
+        &self,
+    ) -> (usize, usize) {
+
+        (self.featured_rolls.len(), self.standard_rolls.len())
+
+    }
+
+    fn merged(
+        &self,
+        other: &SimulationResult,
+    ) -> Result<SimulationResult, String> {
+
+        let mut result = if other.simulation_count == 0 {
+            self.clone()
+        } else if self.simulation_count == 0 {
+            other.clone()
+        } else if self.rao_blackwell != other.rao_blackwell {
+            return Err("cannot merge a Rao-Blackwellized result with a sampled one".to_string());
+        } else {
+            self.merged_counts(other)
+        };
+
+        result.sim_duration = self.sim_duration + other.sim_duration;
+        result.generation = 0;
+        result.base_generation = 0;
+
+        Ok(result)
+
+    }
+
+    /// Sum of the counts of two non-empty results with the same estimator,
+    /// over the union of their ranges.
+    fn merged_counts(
+        &self,
+        other: &SimulationResult,
+    ) -> SimulationResult {
+
+        let union = |a: (usize, usize), b: (usize, usize)| (a.0.min(b.0), a.1.max(b.1));
+        let ftd_range = union(self.ftd_range, other.ftd_range);
+        let std_range = union(self.std_range, other.std_range);
+        let tot_range = union(self.tot_range, other.tot_range);
+
+        let merge_1d = |a: &[f64], a_range, b: &[f64], b_range, range: (usize, usize)| {
+            let mut out = vec![0.0; range.1 - range.0 + 1];
+            histogram::add_cropped(&mut out, range, a, a_range);
+            histogram::add_cropped(&mut out, range, b, b_range);
+            out
+        };
+        let merge_2d = |a: &[f64], b: &[f64]| {
+            let mut out = vec![0.0; (ftd_range.1 - ftd_range.0 + 1) * (std_range.1 - std_range.0 + 1)];
+            histogram::add_cropped_2d(&mut out, ftd_range, std_range, a, self.ftd_range, self.std_range);
+            histogram::add_cropped_2d(&mut out, ftd_range, std_range, b, other.ftd_range, other.std_range);
+            out
+        };
+
+        let (featured_squares, standard_squares, joint_squares) = if self.rao_blackwell {
+            (
+                merge_1d(&self.featured_squares, self.ftd_range, &other.featured_squares, other.ftd_range, ftd_range),
+                merge_1d(&self.standard_squares, self.std_range, &other.standard_squares, other.std_range, std_range),
+                merge_2d(&self.joint_squares, &other.joint_squares),
+            )
+        } else {
+            (Vec::new(), Vec::new(), Vec::new())
+        };
+
+        SimulationResult {
+            featured_rolls: merge_1d(&self.featured_rolls, self.ftd_range, &other.featured_rolls, other.ftd_range, ftd_range),
+            standard_rolls: merge_1d(&self.standard_rolls, self.std_range, &other.standard_rolls, other.std_range, std_range),
+            total_rolls: merge_1d(&self.total_rolls, self.tot_range, &other.total_rolls, other.tot_range, tot_range),
+            joint_rolls: merge_2d(&self.joint_rolls, &other.joint_rolls),
+            featured_squares,
+            standard_squares,
+            joint_squares,
+            simulation_count: self.simulation_count + other.simulation_count,
+            ftd_range,
+            std_range,
+            tot_range,
+            sim_duration: Duration::ZERO,
+            generation: 0,
+            base_generation: 0,
+            rao_blackwell: self.rao_blackwell,
+        }
+
+    }
+
+    fn to_record(
+        &self,
+    ) -> codec::Record {
+
+        codec::Record {
+            rao_blackwell: self.rao_blackwell,
+            simulation_count: self.simulation_count,
+            sim_duration: self.sim_duration,
+            ftd_range: self.ftd_range,
+            std_range: self.std_range,
+            tot_range: self.tot_range,
+            featured: self.featured_rolls.clone(),
+            standard: self.standard_rolls.clone(),
+            total: self.total_rolls.clone(),
+            joint: self.joint_rolls.clone(),
+            featured_squares: self.featured_squares.clone(),
+            standard_squares: self.standard_squares.clone(),
+            joint_squares: self.joint_squares.clone(),
+        }
+
+    }
+
+    fn from_record(
+        record: codec::Record,
+    ) -> SimulationResult {
+
+        SimulationResult {
+            featured_rolls: record.featured,
+            standard_rolls: record.standard,
+            total_rolls: record.total,
+            joint_rolls: record.joint,
+            featured_squares: record.featured_squares,
+            standard_squares: record.standard_squares,
+            joint_squares: record.joint_squares,
+            simulation_count: record.simulation_count,
+            ftd_range: record.ftd_range,
+            std_range: record.std_range,
+            tot_range: record.tot_range,
+            sim_duration: record.sim_duration,
+            generation: 0,
+            base_generation: 0,
+            rao_blackwell: record.rao_blackwell,
+        }
+
+    }
+
+}
+
+
+fn to_f64(
+    values: Vec<u64>,
+) -> Vec<f64> {
+
+    values.into_iter().map(|v| v as f64).collect()
+
+}
+
+
+/// Running totals shared between the workers and readers of a `SimulationThread`.
+///
+/// Every publish bumps `generation`. Counts published since `delta_base`
+/// are also kept in `delta`, so a reader that is already at `delta_base`
+/// only needs to receive those.
+#[derive(Default)]
+struct SharedResult {
+    histogram: Histogram,
+    sim_duration: Duration,
+    generation: u64,
+    delta: Histogram,
+    delta_base: u64,
+    /// One histogram per sweep checkpoint, in ascending order.
+    checkpoints: Vec<Histogram>,
+    /// Stop once every bin with a chance of at least `floor` is known to
+    /// within this Wilson half-width. `None` runs all trajectories.
+    tolerance: Option<f64>,
+    floor: f64,
+    /// Time spent on the trajectories a resumed simulation started with.
+    resumed_duration: Duration,
+    /// Model whose featured split is integrated out of Rao-Blackwellized
+    /// runs, whose histograms only tally totals. `None` for sampled runs.
+    rao_blackwell: Option<GenshinImpactGachaModel>,
+    /// `exact::featured_split` of `rao_blackwell`, kept for the convergence
+    /// check and extended as the totals grow.
+    featured_split: Vec<Vec<f64>>,
+}
+
+
+impl SharedResult {
+
+    fn publish(
+        &mut self,
+        local: &Histogram,
+        local_checkpoints: &[Histogram],
+        sim_duration: Duration,
+    ) {
+
+        self.histogram.merge(local);
+        self.delta.merge(local);
+        self.checkpoints.resize_with(local_checkpoints.len(), Histogram::default);
+        for (shared, local) in self.checkpoints.iter_mut().zip(local_checkpoints) {
+            shared.merge(local);
+        }
+        self.sim_duration = self.resumed_duration + sim_duration;
+        self.generation += 1;
+
+    }
+
+    /// Bytes allocated for all histograms held here.
+    fn memory(
+        &self,
+    ) -> usize {
+
+        self.histogram.memory()
+            + self.delta.memory()
+            + self.checkpoints.iter().map(Histogram::memory).sum::<usize>()
+
+    }
+
+    /// Whether the target precision, if any, has been reached.
+    fn converged(
+        &mut self,
+    ) -> bool {
+
+        match self.tolerance {
+            Some(tolerance) => self.max_error(tolerance) <= tolerance,
+            None => false,
+        }
+
+    }
+
+    /// `SimulationResult::max_error` of `snapshot()`, computed straight from
+    /// the counts. Runs on every publish with the lock held, so it builds no
+    /// result and allocates nothing for sampled runs. Returns early with a
+    /// lower bound once that exceeds `bound`.
+    fn max_error(
+        &mut self,
+        bound: f64,
+    ) -> f64 {
+
+        let histogram = &self.histogram;
+        let n = histogram.count;
+        if n == 0 {
+            return f64::INFINITY;
+        }
+
+        // The totals are sampled either way.
+        let tot_range = histogram::nonzero_range(&histogram.total);
+        let mut error = histogram::max_wilson_error(n, &histogram.total, tot_range, self.floor);
+        if error > bound {
+            return error;
+        }
+
+        let Some(model) = &self.rao_blackwell else {
+            let ftd_range = histogram::nonzero_range(&histogram.featured);
+            let std_range = histogram::nonzero_range(&histogram.standard);
+            error = error
+                .max(histogram::max_wilson_error(n, &histogram.featured, ftd_range, self.floor))
+                .max(histogram::max_wilson_error(n, &histogram.standard, std_range, self.floor));
+            for row in ftd_range.0..=ftd_range.1 {
+                let start = row * histogram.cols;
+                let cols = (start + std_range.0, start + std_range.1);
+                error = error.max(histogram::max_wilson_error(n, &histogram.joint, cols, self.floor));
+            }
+            return error;
+        };
+
+        // As in `SimulationResult::from_totals`, without the joint matrix:
+        // every joint bin is weighted by a single total.
+        let size = tot_range.1 + 1;
+        if self.featured_split.len() < size {
+            self.featured_split = exact::featured_split(model, size - 1);
+        }
+        let min_count = self.floor * n as f64;
+        let mut featured = vec![(0.0, 0.0); size];
+        let mut standard = vec![(0.0, 0.0); size];
+        for (total, &count) in histogram.total[..size.min(histogram.total.len())].iter().enumerate() {
+            if count == 0 {
+                continue;
+            }
+            let count = count as f64;
+            for (ftd, &p) in self.featured_split[total].iter().enumerate() {
+                let (sum, squares) = (count * p, count * p * p);
+                if sum >= min_count {
+                    error = error.max(histogram::normal_half_width(sum, squares, n));
+                }
+                featured[ftd].0 += sum;
+                featured[ftd].1 += squares;
+                standard[total - ftd].0 += sum;
+                standard[total - ftd].1 += squares;
+            }
+        }
+        for &(sum, squares) in featured.iter().chain(&standard) {
+            if sum >= min_count {
+                error = error.max(histogram::normal_half_width(sum, squares, n));
+            }
+        }
+
+        error
+
+    }
+
+    fn snapshot(
+        &self,
+    ) -> SimulationResult {
+
+        self.result(&self.histogram, 0)
+
+    }
+
+    /// Result of `histogram`, one of the histograms held here, relative to `base_generation`.
+    fn result(
+        &self,
+        histogram: &Histogram,
+        base_generation: u64,
+    ) -> SimulationResult {
+
+        match &self.rao_blackwell {
+            Some(model) => SimulationResult::from_totals(
+                histogram, model, self.sim_duration, self.generation, base_generation,
+            ),
+            None => SimulationResult::from_histogram(
+                histogram, self.sim_duration, self.generation, base_generation,
+            ),
+        }
+
+    }
+
+    /// Changes since `generation`, or `None` if there are none.
+    ///
+    /// Readers at `delta_base` get just the delta; anyone else gets a full
+    /// snapshot. Either way the delta restarts from the current generation,
+    /// which suits the usual case of a single reader polling in a loop.
+    fn changes_since(
+        &mut self,
+        generation: u64,
+    ) -> Option<SimulationResult> {
+
+        if generation == self.generation {
+            return None;
+        }
+
+        let result = if generation == self.delta_base {
+            self.result(&self.delta, self.delta_base)
+        } else {
+            self.snapshot()
+        };
+
+        self.delta.clear();
+        self.delta_base = self.generation;
+
+        Some(result)
+
+    }
+
+}
+
+
+/// Live counters of a `SimulationThread`. Workers and readers update them
+/// without taking the shared result lock, so they can be read at any time.
+#[derive(Default)]
+struct Metrics {
+    /// Trajectories finished by each worker, updated every `CLOCK_CHECK_INTERVAL`.
+    worker_progress: Vec<AtomicU64>,
+    /// Time from `run` to the last publish.
+    elapsed_ns: AtomicU64,
+    /// Time workers and readers spent waiting for the shared result lock.
+    lock_wait_ns: AtomicU64,
+    /// Periodic publishes put off because a reader held the lock.
+    publish_retries: AtomicU64,
+    /// Results built for readers, and the time spent building them.
+    snapshots: AtomicU64,
+    snapshot_ns: AtomicU64,
+    /// Largest number of bytes the shared histograms have held.
+    peak_memory: AtomicUsize,
+}
+
+
+impl Metrics {
+
+    fn new(
+        workers: usize,
+    ) -> Self {
+
+        Self {
+            worker_progress: (0..workers).map(|_| AtomicU64::new(0)).collect(),
+            ..Self::default()
+        }
+
+    }
+
+    fn add_time(
+        counter: &AtomicU64,
+        duration: Duration,
+    ) {
+
+        counter.fetch_add(duration.as_nanos() as u64, Ordering::Relaxed);
+
+    }
+
+    /// Called by a worker right after publishing to `shared`.
+    fn record_publish(
+        &self,
+        shared: &SharedResult,
+        start_time: Instant,
+    ) {
+
+        self.elapsed_ns.fetch_max(start_time.elapsed().as_nanos() as u64, Ordering::Relaxed);
+        self.peak_memory.fetch_max(shared.memory(), Ordering::Relaxed);
+
+    }
+
+}
+
+
+/// Point-in-time copy of the counters of a `SimulationThread`.
+#[pyclass]
+#[derive(Clone)]
+struct SimulationMetrics {
+    /// Trajectories finished so far by this run, not counting resumed ones.
+    #[pyo3(get)]
+    trajectories: u64,
+    #[pyo3(get)]
+    elapsed: Duration,
+    #[pyo3(get)]
+    trajectories_per_sec: f64,
+    #[pyo3(get)]
+    pulls_per_sec: f64,
+    #[pyo3(get)]
+    lock_wait: Duration,
+    #[pyo3(get)]
+    publish_retries: u64,
+    #[pyo3(get)]
+    snapshots: u64,
+    #[pyo3(get)]
+    snapshot_time: Duration,
+    #[pyo3(get)]
+    worker_progress: Vec<u64>,
+    /// Bytes.
+    #[pyo3(get)]
+    peak_memory: usize,
+}
+
+
+#[pymethods]
+impl SimulationMetrics {
+
+    /// Average time to build one snapshot, or zero if none were built.
+    #[getter]
+    fn avg_snapshot_time(
+        &self,
+    ) -> Duration {
+
+        match self.snapshots {
+            0 => Duration::ZERO,
+            n => self.snapshot_time / n as u32,
+        }
+
+    }
+
+}
+
+
+#[pyclass]
+#[derive(Clone)]
+struct SimulationThread {
+    model: GenshinImpactGachaModel,
+    pulls: i32,
+    sim_length: u64,
+    workers: usize,
+    /// Pull counts to also record results at, in ascending order.
+    checkpoints: Vec<i32>,
+    /// Number of trajectories in the result this simulation resumed from.
+    resumed_count: u64,
+    /// Index of the first trajectory, which selects its random stream.
+    first_trajectory: u64,
+    /// Only sample 5-star totals, and integrate the featured split out.
+    rao_blackwell: bool,
+    /// Pair up trajectories with mirrored pity draws.
+    antithetic: bool,
+    running: Arc<AtomicBool>,
+    /// Set by `stop` or on convergence. Workers finish their current
+    /// trajectory, publish and exit; the last one clears `running`.
+    stop_requested: Arc<AtomicBool>,
+    simulation_result: Arc<Mutex<SharedResult>>,
+    metrics: Arc<Metrics>,
+    /// When `run` was called.
+    start_time: Option<Instant>,
+}
+
+
+#[pymethods]
+impl SimulationThread {
+
+    #[new]
+    #[pyo3(signature = (model, pulls, sim_length, workers=None, checkpoints=None, tolerance=None, floor=0.001, resume_from=None, first_trajectory=0, rao_blackwell=false, antithetic=false))]
+    fn new(
+        model: GenshinImpactGachaModel,
+        pulls: i32,
+        sim_length: u64,
+        workers: Option<usize>,
+        checkpoints: Option<Vec<i32>>,
+        tolerance: Option<f64>,
+        floor: f64,
+        resume_from: Option<SimulationResult>,
+        first_trajectory: u64,
+        rao_blackwell: bool,
+        antithetic: bool,
+    ) -> PyResult<Self> {
+
+        // No point in spawning more workers than there are trajectories.
+        let workers = workers
+            .unwrap_or_else(default_workers)
+            .clamp(1, sim_length.clamp(1, usize::MAX as u64) as usize);
+
+        let mut checkpoints = checkpoints.unwrap_or_default();
+        if let Some(&c) = checkpoints.iter().find(|&&c| c < 0 || c > pulls) {
+            return Err(PyValueError::new_err(format!(
+                "checkpoint {c} is outside of 0..={pulls} pulls"
+            )));
+        }
+        checkpoints.sort_unstable();
+        checkpoints.dedup();
+
+        if tolerance.is_some_and(|t| !(t > 0.0)) {
+            return Err(PyValueError::new_err("tolerance must be positive"));
+        }
+
+        if resume_from.as_ref().is_some_and(|r| r.rao_blackwell != rao_blackwell) {
+            return Err(PyValueError::new_err(
+                "resume_from must come from a simulation with the same rao_blackwell setting"
+            ));
+        }
+
+        let mut shared = SharedResult {
+            checkpoints: vec![Histogram::default(); checkpoints.len()],
+            tolerance,
+            floor,
+            rao_blackwell: rao_blackwell.then(|| model.clone()),
+            ..SharedResult::default()
+        };
+
+        // Start from the earlier counts. They also go into the delta, so
+        // that a reader's first delta is complete, as `base_generation` 0 says.
+        let resumed_count = resume_from.as_ref().map_or(0, |r| r.simulation_count);
+        if let Some(result) = &resume_from {
+            shared.histogram = result.to_histogram();
+            shared.delta = shared.histogram.clone();
+            shared.sim_duration = result.sim_duration;
+            shared.resumed_duration = result.sim_duration;
+            shared.generation = 1;
+        }
+
+        Ok(Self {
+            model,
+            pulls,
+            sim_length,
+            workers,
+            checkpoints,
+            resumed_count,
+            first_trajectory,
+            rao_blackwell,
+            antithetic,
+            running: Arc::new(AtomicBool::new(false)),
+            stop_requested: Arc::new(AtomicBool::new(false)),
+            simulation_result: Arc::new(Mutex::new(shared)),
+            metrics: Arc::new(Metrics::new(workers)),
+            start_time: None,
+        })
+
+    }
+
+    fn run(
+        &mut self
+    ) {
+
+        self.running.store(true, Ordering::Release);
+        self.stop_requested.store(false, Ordering::Release);
+
+        let start_time = Instant::now();
+        self.start_time = Some(start_time);
+        let active_workers = Arc::new(AtomicUsize::new(self.workers));
+
+        // A resumed run must not replay the trajectories it resumed from,
+        // so it draws from a different set of streams.
+        let base_seed = match self.resumed_count {
+            0 => self.model.seed,
+            count => stream_seed(self.model.seed, u64::MAX - count),
+        };
+
+        let per_worker = self.sim_length / self.workers as u64;
+        let extra = self.sim_length % self.workers as u64;
+
+        for worker in 0..self.workers {
+
+            // Split the trajectories as evenly as possible into contiguous
+            // ranges, one per worker.
+            let worker = worker as u64;
+            let share = per_worker + (worker < extra) as u64;
+            let first = self.first_trajectory + worker * per_worker + worker.min(extra);
+
+            // Simulation thread
+            thread::spawn({
+                let running = Arc::clone(&self.running);
+                let stop_requested = Arc::clone(&self.stop_requested);
+                let sim_result = Arc::clone(&self.simulation_result);
+                let metrics = Arc::clone(&self.metrics);
+                let active_workers = Arc::clone(&active_workers);
+                let initial_model = self.model.clone();
+                let mut model = self.model.clone();
+                let pulls = self.pulls;
+                let checkpoints = self.checkpoints.clone();
+                let split = !self.rao_blackwell;
+                let antithetic = self.antithetic;
+
+                move || {
+                    // Trajectories are tallied locally and only published to
+                    // the shared result every `PUBLISH_INTERVAL`. Publishing
+                    // never waits: if a reader holds the lock, the worker
+                    // keeps simulating and tries again on the next check.
+                    let mut local_result = Histogram::default();
+                    let mut local_checkpoints = vec![Histogram::default(); checkpoints.len()];
+                    let mut checkpoint_counts = vec![(0, 0); checkpoints.len()];
+                    let mut last_publish = Instant::now();
+                    let mut sim_count = 0;
+
+                    while sim_count < share && !stop_requested.load(Ordering::Relaxed) {
+
+                        // Every trajectory starts from the configured pity,
+                        // guarantee and Capturing Radiance state, and draws
+                        // from its own stream. Which worker runs it does not
+                        // matter, so a seed gives the same histograms on any
+                        // number of workers. Antithetic pairs share the stream
+                        // of their even trajectory, the odd one mirrored.
+                        let trajectory = first + sim_count;
+                        model.restore_state(&initial_model);
+                        model.antithetic = antithetic && trajectory % 2 == 1;
+                        model.reseed(stream_seed(base_seed, trajectory - model.antithetic as u64));
+
+                        // Without `split`, the featured count is the total.
+                        let (featured, standard) = model.count_pulls_fast_with_checkpoints(
+                            pulls,
+                            &checkpoints,
+                            &mut checkpoint_counts,
+                            split,
+                        );
+                        local_result.update(featured as usize, standard as usize);
+                        for (hist, &(f, s)) in local_checkpoints.iter_mut().zip(&checkpoint_counts) {
+                            hist.update(f as usize, s as usize);
+                        }
+
+                        sim_count += 1;
+
+                        if sim_count % CLOCK_CHECK_INTERVAL == 0 {
+                            metrics.worker_progress[worker as usize].store(sim_count, Ordering::Relaxed);
+
+                            if last_publish.elapsed() >= PUBLISH_INTERVAL {
+                                if let Ok(mut sr_lock) = sim_result.try_lock() {
+                                    sr_lock.publish(&local_result, &local_checkpoints, start_time.elapsed());
+                                    metrics.record_publish(&sr_lock, start_time);
+                                    if sr_lock.converged() {
+                                        stop_requested.store(true, Ordering::Relaxed);
+                                    }
+                                    drop(sr_lock);
+
+                                    local_result.clear();
+                                    local_checkpoints.iter_mut().for_each(Histogram::clear);
+                                    last_publish = Instant::now();
+                                } else {
+                                    metrics.publish_retries.fetch_add(1, Ordering::Relaxed);
+                                }
+                            }
+                        }
+                    }
+
+                    metrics.worker_progress[worker as usize].store(sim_count, Ordering::Relaxed);
+
+                    let waiting = Instant::now();
+                    let mut sr_lock = sim_result.lock().unwrap();
+                    Metrics::add_time(&metrics.lock_wait_ns, waiting.elapsed());
+                    sr_lock.publish(&local_result, &local_checkpoints, start_time.elapsed());
+                    metrics.record_publish(&sr_lock, start_time);
+
+                    // The last worker to finish marks the simulation as done.
+                    if active_workers.fetch_sub(1, Ordering::AcqRel) == 1 {
+                        running.store(false, Ordering::Release);
+                    }
+                }
+            });
+
+        }
+
+    }
+
+    fn stop(
+        &mut self
+    ) {
+
+        self.stop_requested.store(true, Ordering::Release);
+
+    }
+
+    fn is_running(
+        &self
+    ) -> bool {
+
+        self.running.load(Ordering::Acquire)
+
+    }
+
+    fn get_current_results(
+        &self,
+        py: Python<'_>,
+    ) -> SimulationResult {
+
+        // Workers never block on this lock, so building the snapshot
+        // straight from the shared result does not stall them.
+        py.detach(|| self.read_shared(|shared| shared.snapshot()))
+
+    }
+
+    /// Return only what changed since the result with the given
+    /// `generation`, or `None` if nothing has. See `SharedResult::changes_since`.
+    #[pyo3(signature = (generation))]
+    fn get_results_since(
+        &self,
+        py: Python<'_>,
+        generation: u64,
+    ) -> Option<SimulationResult> {
+
+        py.detach(|| self.read_shared(|shared| shared.changes_since(generation)))
+
+    }
+
+    /// Current results at each checkpoint, in ascending order of pulls.
+    fn get_sweep_results(
+        &self,
+        py: Python<'_>,
+    ) -> Vec<SimulationResult> {
+
+        py.detach(|| self.read_shared(|shared| {
+            shared.checkpoints
+                .iter()
+                .map(|hist| shared.result(hist, 0))
+                .collect()
+        }))
+
+    }
+
+    /// Current joint counts at every checkpoint as one
+    /// `checkpoint x featured x standard` array, indexed from 0 on every axis.
+    fn get_sweep_tensor<'py>(
+        &self,
+        py: Python<'py>,
+    ) -> Bound<'py, PyArray3<f64>> {
+
+        let (shape, values) = py.detach(|| {
+            let results: Vec<_> = self.read_shared(|shared| {
+                shared.checkpoints
+                    .iter()
+                    .map(|hist| shared.result(hist, 0))
+                    .collect()
+            });
+            let rows = results.iter().map(|r| r.ftd_range.1 + 1).max().unwrap_or(0);
+            let cols = results.iter().map(|r| r.std_range.1 + 1).max().unwrap_or(0);
+
+            let mut values = vec![0.0; results.len() * rows * cols];
+            for (i, result) in results.iter().enumerate() {
+                let width = result.standard_rolls.len();
+                for (row, counts) in result.joint_rolls.chunks_exact(width).enumerate() {
+                    let offset = (i * rows + result.ftd_range.0 + row) * cols + result.std_range.0;
+                    values[offset..offset + width].copy_from_slice(counts);
+                }
+            }
+
+            ((results.len(), rows, cols), values)
+        });
+
+        Array3::from_shape_vec(shape, values)
+            .expect("sweep shape matches its storage")
+            .into_pyarray(py)
+
+    }
+
+    /// Current throughput and contention counters. Cheap enough to call on
+    /// every UI update, since it never takes the shared result lock.
+    fn get_metrics(
+        &self,
+    ) -> SimulationMetrics {
+
+        let metrics = &self.metrics;
+        let worker_progress: Vec<u64> = metrics.worker_progress
+            .iter()
+            .map(|progress| progress.load(Ordering::Relaxed))
+            .collect();
+        let trajectories = worker_progress.iter().sum();
+
+        // Once the workers are done, stop the clock at their last publish.
+        let elapsed = match self.start_time {
+            Some(start) if self.is_running() => start.elapsed(),
+            _ => Duration::from_nanos(metrics.elapsed_ns.load(Ordering::Relaxed)),
+        };
+        let seconds = elapsed.as_secs_f64();
+        let trajectories_per_sec = if seconds > 0.0 { trajectories as f64 / seconds } else { 0.0 };
+
+        SimulationMetrics {
+            trajectories,
+            elapsed,
+            trajectories_per_sec,
+            pulls_per_sec: trajectories_per_sec * self.pulls as f64,
+            lock_wait: Duration::from_nanos(metrics.lock_wait_ns.load(Ordering::Relaxed)),
+            publish_retries: metrics.publish_retries.load(Ordering::Relaxed),
+            snapshots: metrics.snapshots.load(Ordering::Relaxed),
+            snapshot_time: Duration::from_nanos(metrics.snapshot_ns.load(Ordering::Relaxed)),
+            worker_progress,
+            peak_memory: metrics.peak_memory.load(Ordering::Relaxed),
+        }
+
+    }
+
+}
+
+
+impl SimulationThread {
+
+    /// Run `build` on the shared result for a reader, counting the wait
+    /// for the lock and the time spent building as one snapshot.
+    fn read_shared<T>(
+        &self,
+        build: impl FnOnce(&mut SharedResult) -> T,
+    ) -> T {
+
+        let waiting = Instant::now();
+        let mut shared = self.simulation_result.lock().unwrap();
+        let building = Instant::now();
+        let value = build(&mut shared);
+        drop(shared);
+
+        Metrics::add_time(&self.metrics.lock_wait_ns, building - waiting);
+        Metrics::add_time(&self.metrics.snapshot_ns, building.elapsed());
+        self.metrics.snapshots.fetch_add(1, Ordering::Relaxed);
 
-        let sr_lock = self.simulation_result.lock().unwrap();
-        let data = sr_lock.clone();
-        drop(sr_lock);
-        data.fill_range()
+        value
 
     }
 
@@ -531,5 +1936,8 @@ fn gachamodel(m: &Bound<'_, PyModule>) -> PyResult<()> {
     m.add_class::<CapturingRadianceModel>()?;
     m.add_class::<SimulationThread>()?;
     m.add_class::<SimulationResult>()?;
+    m.add_class::<SimulationMetrics>()?;
+    m.add_class::<exact::ExactSolver>()?;
+    m.add_class::<exact::ExactResult>()?;
     Ok(())
 }
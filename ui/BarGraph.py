@@ -14,10 +14,22 @@ from PyQt6.QtCore import (
     QRectF,
 )
 
+import time
+
+import numpy as np
+
 from core.text import TEXT
 
 
 class BarGraph(QChartView):
+    """
+    Bar chart of a distribution, updated in bulk.
+
+    Bars at either end whose values are below `trim_below` are left out.
+    Animations are turned off while updating and drawing a frame takes
+    longer than `frame_budget` seconds, and back on once it takes less
+    than half of that.
+    """
 
     def __init__(
             self,
@@ -29,8 +41,9 @@ class BarGraph(QChartView):
             y_label: str = "",
             y_range: tuple[float, float] = (0, 125),
             y_tick_count: int = 6,
+            trim_below: float | None = None,
+            frame_budget: float | None = None,
             ) -> None:
-
         super().__init__(parent)
         self.setRenderHint(QPainter.RenderHint.Antialiasing)
         self.setContentsMargins(0, 0, 0, 0)
@@ -87,6 +100,11 @@ class BarGraph(QChartView):
 
         self.setChart(chart)
 
+        self._categories: list[str] = []
+        self._trim_below = trim_below
+        self._frame_budget = frame_budget
+        self._paint_cost = 0.0
+
     def wheelEvent(self, event) -> None:
         # Disable mouse wheel scrolling because it moves
         # the graph up and down for some reason.
@@ -99,11 +117,31 @@ class BarGraph(QChartView):
 
         self.chart().setAnimationDuration(duration)
 
+    def paintEvent(self, event) -> None:
+
+        start = time.perf_counter()
+        super().paintEvent(event)
+        self._paint_cost = time.perf_counter() - start
+
     def clear(self) -> None:
 
         self._bar_set.remove(0, self._bar_set.count())
         self._x_axis.clear()
         self._x_axis.append([TEXT.BLANK])
+        self._categories = []
+
+    def _trim(
+            self,
+            keys: list,
+            values: list[float],
+            ) -> tuple[list, list[float]]:
+        """Drop the bars at either end whose values are below `trim_below`."""
+
+        above = np.flatnonzero(np.asarray(values) >= self._trim_below)
+        if len(above) == 0:
+            return keys, values
+        lo, hi = above[0], above[-1] + 1
+        return keys[lo:hi], values[lo:hi]
 
     def update_data(
             self,
@@ -113,22 +151,39 @@ class BarGraph(QChartView):
         # Note: data must come already sorted in the correct order.
         # Let the Rust backend handle the sorting.
 
-        has_more_data = len(data) > self._bar_set.count()
-
-        # If there are more data points than current bars,
-        # add more bars.
-        while self._bar_set.count() < len(data):
-            self._bar_set.append(0)
-
-        for i, value in enumerate(data.values()):
-            self._bar_set.replace(i, value)
-
-        if has_more_data:
-            old_x_values = self._x_axis.categories()
-            new_x_values = data.keys()
-
-            for i, new_x in enumerate(new_x_values):
-                if i < len(old_x_values):
-                    self._x_axis.replace(old_x_values[i], str(new_x))
-                else:
-                    self._x_axis.append(str(new_x))
+        start = time.perf_counter()
+
+        keys = list(data.keys())
+        values = list(data.values())
+        if self._trim_below is not None:
+            keys, values = self._trim(keys, values)
+
+        categories = [str(k) for k in keys]
+        animated = self.chart().animationOptions() != QChart.AnimationOption.NoAnimation
+
+        if animated and len(values) == self._bar_set.count():
+            # Replace values one by one, so that the bars animate
+            # from their old heights instead of from zero
+            for i, value in enumerate(values):
+                if self._bar_set.at(i) != value:
+                    self._bar_set.replace(i, value)
+        else:
+            self._bar_set.remove(0, self._bar_set.count())
+            self._bar_set.append(values)
+
+        if categories != self._categories:
+            self._x_axis.setCategories(categories or [TEXT.BLANK])
+            self._categories = categories
+
+        if self._frame_budget is not None:
+            self._adapt_animations(time.perf_counter() - start + self._paint_cost)
+
+    def _adapt_animations(self, cost: float) -> None:
+        """Turn animations off while frames go over budget, and back on once they are well under it."""
+
+        chart = self.chart()
+        animated = chart.animationOptions() != QChart.AnimationOption.NoAnimation
+        if animated and cost > self._frame_budget:
+            chart.setAnimationOptions(QChart.AnimationOption.NoAnimation)
+        elif not animated and cost < self._frame_budget / 2:
+            chart.setAnimationOptions(QChart.AnimationOption.SeriesAnimations)
@@ -1,32 +1,147 @@
 from PyQt6.QtWidgets import (
-    QTableWidget,
+    QTableView,
     QHeaderView,
-    QTableWidgetItem,
 )
 from PyQt6.QtCore import (
     Qt,
+    QAbstractTableModel,
+    QModelIndex,
+)
+from PyQt6.QtGui import (
+    QColor,
+    QFont,
 )
-from PyQt6.QtGui import QColor
 
 import numpy as np
 
 import math
 
 
-class Heatmap(QTableWidget):
+class HeatmapModel(QAbstractTableModel):
+    """
+    Table model backed directly by a 2D NumPy array of probabilities.
+
+    Cell colours come from a lookup table indexed by the intensity that
+    `cmap_intensity` computes for the whole array at once, so nothing is
+    allocated per cell. Updates with the same labels only emit `dataChanged`
+    for the smallest block that covers every changed cell.
+    """
+
+    # Decimals of the percentages shown in each cell
+    DECIMALS = 4
+
+    def __init__(self, parent=None):
+
+        super().__init__(parent)
+
+        self._data = np.zeros((0, 0))
+        self._intensity = np.zeros((0, 0), dtype=np.uint8)
+        self._x_labels: list[str] = []
+        self._y_labels: list[str] = []
+
+        self._colors = [QColor(0, k, k) for k in range(256)]
+        self._font = QFont()
+        self._font.setPointSize(12)
+        self._alignment = Qt.AlignmentFlag.AlignHCenter | Qt.AlignmentFlag.AlignVCenter
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+
+        return 0 if parent.isValid() else self._data.shape[0]
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+
+        return 0 if parent.isValid() else self._data.shape[1]
+
+    def data(
+            self,
+            index: QModelIndex,
+            role: int = Qt.ItemDataRole.DisplayRole,
+            ):
+
+        if not index.isValid():
+            return None
+
+        match role:
+            case Qt.ItemDataRole.DisplayRole:
+                value = self._data[index.row(), index.column()]
+                return f"{value*100:>8.{self.DECIMALS}f}" if value > 0 else ""
+            case Qt.ItemDataRole.BackgroundRole:
+                return self._colors[self._intensity[index.row(), index.column()]]
+            case Qt.ItemDataRole.FontRole:
+                return self._font
+            case Qt.ItemDataRole.TextAlignmentRole:
+                return self._alignment
+        return None
+
+    def headerData(
+            self,
+            section: int,
+            orientation: Qt.Orientation,
+            role: int = Qt.ItemDataRole.DisplayRole,
+            ):
+
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        labels = self._x_labels if orientation == Qt.Orientation.Horizontal else self._y_labels
+        return labels[section] if section < len(labels) else None
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+
+        # Cells are not selectable
+        return Qt.ItemFlag.ItemIsEnabled
+
+    def set_data(
+            self,
+            x_labels: list[str],
+            y_labels: list[str],
+            data: np.ndarray,
+            ) -> None:
+
+        data = np.asarray(data, dtype=float)
+        intensity = cmap_intensity(data)
+
+        if x_labels != self._x_labels or y_labels != self._y_labels or data.shape != self._data.shape:
+            self.beginResetModel()
+            self._x_labels, self._y_labels = x_labels, y_labels
+            self._data, self._intensity = data, intensity
+            self.endResetModel()
+            return
+
+        # Only cells whose text or colour changed need repainting
+        shown = np.round(data * 100, self.DECIMALS) != np.round(self._data * 100, self.DECIMALS)
+        changed = shown | (intensity != self._intensity)
+        self._data, self._intensity = data, intensity
+
+        rows = np.flatnonzero(changed.any(axis=1))
+        if len(rows) == 0:
+            return
+        cols = np.flatnonzero(changed.any(axis=0))
+        self.dataChanged.emit(
+            self.index(int(rows[0]), int(cols[0])),
+            self.index(int(rows[-1]), int(cols[-1])),
+            [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.BackgroundRole],
+        )
+
+    def clear(self) -> None:
+
+        self.set_data([], [], np.zeros((0, 0)))
+
+
+class Heatmap(QTableView):
 
     def __init__(self, parent=None):
 
         super(Heatmap, self).__init__(parent)
-        self.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
         self.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         self.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
 
+        self._model = HeatmapModel(self)
+        self.setModel(self._model)
+
     def clear_heatmap(self):
 
-        self.clear()
-        self.setRowCount(0)
-        self.setColumnCount(0)
+        self._model.clear()
 
     def set_heatmap_data(
             self,
@@ -35,31 +150,11 @@ class Heatmap(QTableWidget):
             data: np.ndarray,
             ) -> None:
 
-        r = len(y_labels)
-        c = len(x_labels)
-
-        self.setRowCount(r)
-        self.setColumnCount(c)
-
-        self.setHorizontalHeaderLabels([str(x) for x in x_labels])
-        self.setVerticalHeaderLabels([str(y) for y in y_labels])
-
-        for x in range(c):
-            for y in range(r):
-                value = data[y, x]
-                text = f"{value*100:>8.4f}" if value > 0 else ""
-                item = QTableWidgetItem(text)
-                # Make the text larger
-                font = item.font()
-                font.setPointSize(12)
-                item.setFont(font)
-                # Make item unselectable
-                item.setFlags(Qt.ItemFlag.ItemIsEnabled)
-                item.setTextAlignment(Qt.AlignmentFlag.AlignHCenter | Qt.AlignmentFlag.AlignVCenter)
-                # Color code based on probability
-                color = QColor(*cmap(value))
-                item.setBackground(color)
-                self.setItem(y, x, item)
+        self._model.set_data(
+            [str(x) for x in x_labels],
+            [str(y) for y in y_labels],
+            data,
+        )
 
 
 def cmap(
@@ -90,3 +185,31 @@ def cmap(
     k = int(min_intensity + (max_intensity - min_intensity) * x)
 
     return (0, k, k)
+
+
+def cmap_intensity(
+        p: np.ndarray,
+        normalization_method: str = 'quadratic',
+        cutoff: float = 0.0,
+        cutoff_intensity: int = 30,
+        min_intensity: int = 40,
+        max_intensity: int = 215,
+        ) -> np.ndarray:
+    """Vectorized `cmap`. Returns the intensity `k` of the colour `(0, k, k)` of every probability in `p`."""
+
+    p = np.clip(np.asarray(p, dtype=float), 0.0, 1.0)
+
+    match normalization_method:
+        case 'linear':
+            x = p
+        case 'sqrt':
+            x = np.sqrt(p)
+        case 'quadratic':
+            x = np.sqrt(1 - (p - 1) ** 2)
+        case 'log':
+            x = np.log10(9 * p + 1)
+        case _:
+            raise ValueError(f"Unknown norm type: {normalization_method}")
+    k = (min_intensity + (max_intensity - min_intensity) * x).astype(np.uint8)
+
+    return np.where(p <= cutoff, cutoff_intensity, k).astype(np.uint8)
@@ -10,6 +10,7 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import (
     Qt,
+    QTimer,
 )
 from PyQt6.QtGui import (
     QIcon,
@@ -17,9 +18,7 @@ from PyQt6.QtGui import (
 
 from .CountSpinbox import CountSpinbox
 from .ErrorDialog import ErrorDialog
-from .SimulationDialog import SimulationWindow
 from .FrameBox import FrameBox
-from .BarGraph import BarGraph
 from .utils import (
     set_titlebar_darkmode,
     left_aligned_layout,
@@ -28,6 +27,7 @@ from .utils import (
 from core.config import CONFIG
 from core.text import TEXT
 from core.assets import ASSETS
+from core.startup import STARTUP
 
 import json
 
@@ -38,7 +38,17 @@ class MainWindow(QMainWindow):
 
         super().__init__()
         self.initUI()
+        # Let the window paint before doing anything it can go without
+        QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        """Build the pity chart and load the last save, once the window is shown."""
+
+        self.init_pity_chart()
+        STARTUP.mark("pity chart")
         self.load_from_last_save()
+        STARTUP.mark("last-save load")
+        STARTUP.report()
 
     def initUI(self):
         """Initialize the main window."""
@@ -186,9 +196,27 @@ class MainWindow(QMainWindow):
         self.total_fates.setFont(total_fates_font)
         groupbox_layout.addLayout(container, 4, 1)
 
-        # Pity Chart
+        # Pity Chart, filled in by `init_pity_chart`
         self.pity_breakpoints = list(range(72, 91, 3))
         self.pity_count_per_breakpoint = [0 for _ in self.pity_breakpoints]
+        self.pity_chart_layout = QVBoxLayout()
+        layout.addLayout(self.pity_chart_layout, 1)
+
+        self.simulate_button = QPushButton(TEXT.SIMULATE)
+        self.simulate_button.clicked.connect(self.simulate)
+
+        layout.addWidget(self.simulate_button)
+
+        # Set tab order for spinboxes
+
+        self.setTabOrder(self.primogems, self.fates)
+        self.setTabOrder(self.fates, self.starglitter)
+        self.setTabOrder(self.starglitter, self.crystal)
+
+    def init_pity_chart(self):
+        """Create the pity chart. Deferred, as it pulls in QtCharts."""
+
+        from .BarGraph import BarGraph
 
         max_int_ceil = int(max(self.pity_count_per_breakpoint)) + 2
         min_int_floor = max(int(min(self.pity_count_per_breakpoint)) - 1, 0)
@@ -202,20 +230,8 @@ class MainWindow(QMainWindow):
             y_range=(min_int_floor, max_int_ceil),
             y_tick_count=max_int_ceil - min_int_floor + 1,
         )
-        layout.addWidget(self.bar_graph)
-
-        layout.addStretch(1)
-
-        self.simulate_button = QPushButton(TEXT.SIMULATE)
-        self.simulate_button.clicked.connect(self.simulate)
-
-        layout.addWidget(self.simulate_button)
-
-        # Set tab order for spinboxes
-
-        self.setTabOrder(self.primogems, self.fates)
-        self.setTabOrder(self.fates, self.starglitter)
-        self.setTabOrder(self.starglitter, self.crystal)
+        self.pity_chart_layout.addWidget(self.bar_graph)
+        self.pity_chart_layout.addStretch(1)
 
     def validate_data(self, raw_data: dict) -> dict:
         """Validate the data structure."""
@@ -370,5 +386,8 @@ class MainWindow(QMainWindow):
     def simulate(self):
         """Simulate pulls based on the available fates."""
 
+        # Imported on first use, as it pulls in NumPy and the simulation backend
+        from .SimulationDialog import SimulationWindow
+
         dialog = SimulationWindow(pulls=self.total_pulls)
         dialog.show()
@@ -0,0 +1,310 @@
+from PyQt6.QtWidgets import (
+    QWidget,
+    QToolTip,
+)
+from PyQt6.QtCore import (
+    Qt,
+    QPointF,
+    QRectF,
+)
+from PyQt6.QtGui import (
+    QImage,
+    QPainter,
+    qRgb,
+)
+
+import numpy as np
+
+import math
+
+from core.text import TEXT
+from .Heatmap import cmap_intensity
+
+
+def _tick_step(
+        cell_size: float,
+        min_spacing: float,
+        ) -> int:
+    """Smallest step of 1, 2 or 5 times a power of ten whose ticks are `min_spacing` pixels apart."""
+
+    cells = max(min_spacing / cell_size, 1)
+    power = 10 ** math.floor(math.log10(cells))
+    for step in (1, 2, 5, 10):
+        if step * power >= cells:
+            return step * power
+    return 10 * power
+
+
+def _block_max(
+        a: np.ndarray,
+        by: int,
+        bx: int,
+        ) -> np.ndarray:
+    """Largest value of each `by` by `bx` block of `a`. The last blocks may be partial."""
+
+    # One strided pass per offset within a block, which is much faster
+    # than reducing a reshaped view over its two block axes
+    if bx > 1:
+        out = a[:, ::bx].copy()
+        for i in range(1, bx):
+            part = a[:, i::bx]
+            np.maximum(out[:, :part.shape[1]], part, out=out[:, :part.shape[1]])
+        a = out
+    if by > 1:
+        out = a[::by].copy()
+        for i in range(1, by):
+            part = a[i::by]
+            np.maximum(out[:len(part)], part, out=out[:len(part)])
+        a = out
+    return a
+
+
+class RasterHeatmap(QWidget):
+    """
+    Heatmap of a joint distribution drawn as an image, for tables too large
+    to show one cell per pair. Rows are featured and columns standard 5 stars.
+
+    When the visible cells outnumber the pixels, they are binned into blocks
+    that each show their largest probability, so the cost of a frame depends
+    on the size of the widget rather than of the table. The wheel zooms in
+    around the cursor, which refines the blocks, dragging pans, and a double
+    click shows the whole table again.
+    """
+
+    MARGIN_LEFT = 40
+    MARGIN_BOTTOM = 20
+    ZOOM_STEP = 0.8
+
+    def __init__(self, parent=None):
+
+        super().__init__(parent)
+        self.setMouseTracking(True)
+
+        self._data = np.zeros((0, 0))
+        self._x_labels: list[int] = []
+        self._y_labels: list[int] = []
+
+        # Visible rows `[r0, r1)` and columns `[c0, c1)`
+        self._view = (0, 0, 0, 0)
+        self._zoomed = False
+        self._drag: tuple[QPointF, tuple[int, int, int, int]] | None = None
+
+        # Image of the visible cells and the block size it was binned with,
+        # rebuilt only when the data, the view or the size change
+        self._image: QImage | None = None
+        self._blocks = (1, 1)
+        self._color_table = [qRgb(0, k, k) for k in range(256)]
+
+    def clear_heatmap(self) -> None:
+
+        self.set_heatmap_data([], [], np.zeros((0, 0)))
+
+    def set_heatmap_data(
+            self,
+            x_labels: list[int],
+            y_labels: list[int],
+            data: np.ndarray,
+            ) -> None:
+
+        self._data = np.asarray(data, dtype=float)
+        self._x_labels = list(x_labels)
+        self._y_labels = list(y_labels)
+
+        rows, cols = self._data.shape
+        if self._zoomed:
+            # Keep looking at the same cells while the support grows
+            r0, r1, c0, c1 = self._view
+            self._view = (min(r0, rows), min(r1, rows), min(c0, cols), min(c1, cols))
+        if not self._zoomed or self._view[0] == self._view[1] or self._view[2] == self._view[3]:
+            self._view = (0, rows, 0, cols)
+            self._zoomed = False
+
+        self._image = None
+        self.update()
+
+    def _plot_rect(self) -> QRectF:
+
+        return QRectF(
+            self.MARGIN_LEFT, 0,
+            max(self.width() - self.MARGIN_LEFT, 1),
+            max(self.height() - self.MARGIN_BOTTOM, 1),
+        )
+
+    def _render(self) -> None:
+        """Bin the visible cells to at most one block per pixel and turn them into an image."""
+
+        r0, r1, c0, c1 = self._view
+        rect = self._plot_rect()
+        visible = self._data[r0:r1, c0:c1]
+
+        by = max(math.ceil(visible.shape[0] / rect.height()), 1)
+        bx = max(math.ceil(visible.shape[1] / rect.width()), 1)
+        visible = _block_max(visible, by, bx)
+
+        # Rows of an 8-bit image must be padded to a multiple of 4 bytes
+        h, w = visible.shape
+        stride = -(-w // 4) * 4
+        pixels = np.zeros((h, stride), dtype=np.uint8)
+        pixels[:, :w] = cmap_intensity(visible)
+
+        image = QImage(pixels.tobytes(), w, h, stride, QImage.Format.Format_Indexed8)
+        image.setColorTable(self._color_table)
+        # Detach from the temporary buffer
+        self._image = image.copy()
+        self._blocks = (by, bx)
+
+    def paintEvent(self, event) -> None:
+
+        r0, r1, c0, c1 = self._view
+        if r1 <= r0 or c1 <= c0:
+            return
+
+        if self._image is None:
+            self._render()
+
+        painter = QPainter(self)
+
+        rect = self._plot_rect()
+        cell_w = rect.width() / (c1 - c0)
+        cell_h = rect.height() / (r1 - r0)
+        by, bx = self._blocks
+
+        # Partial blocks at the edges are drawn whole and clipped
+        painter.save()
+        painter.setClipRect(rect)
+        painter.drawImage(
+            QRectF(rect.left(), rect.top(), self._image.width() * bx * cell_w, self._image.height() * by * cell_h),
+            self._image,
+        )
+        painter.restore()
+
+        # Tick labels at the centres of the cells they name
+        painter.setPen(self.palette().text().color())
+        metrics = painter.fontMetrics()
+
+        step = _tick_step(cell_w, metrics.horizontalAdvance("0000") * 2)
+        for c in range(-(-c0 // step) * step, c1, step):
+            x = rect.left() + (c - c0 + 0.5) * cell_w
+            text = str(self._x_labels[c])
+            painter.drawText(QPointF(x - metrics.horizontalAdvance(text) / 2, rect.bottom() + metrics.ascent() + 2), text)
+
+        step = _tick_step(cell_h, metrics.height() * 1.5)
+        for r in range(-(-r0 // step) * step, r1, step):
+            y = rect.top() + (r - r0 + 0.5) * cell_h
+            text = str(self._y_labels[r])
+            painter.drawText(QPointF(rect.left() - metrics.horizontalAdvance(text) - 4, y + metrics.ascent() / 2), text)
+
+    def resizeEvent(self, event) -> None:
+
+        self._image = None
+        super().resizeEvent(event)
+
+    def _cell_at(self, pos: QPointF) -> tuple[float, float] | None:
+        """Fractional (row, column) of the table under `pos`, if it is over the plot."""
+
+        rect = self._plot_rect()
+        if not rect.contains(pos):
+            return None
+        r0, r1, c0, c1 = self._view
+        return (
+            r0 + (pos.y() - rect.top()) / rect.height() * (r1 - r0),
+            c0 + (pos.x() - rect.left()) / rect.width() * (c1 - c0),
+        )
+
+    def _set_view(
+            self,
+            r0: float,
+            r1: float,
+            c0: float,
+            c1: float,
+            ) -> None:
+        """Show rows `[r0, r1)` and columns `[c0, c1)`, shifted back inside the table if needed."""
+
+        rows, cols = self._data.shape
+
+        def clamp(lo: float, hi: float, size: int) -> tuple[int, int]:
+            span = min(max(round(hi - lo), 1), size)
+            lo = min(max(round(lo), 0), size - span)
+            return lo, lo + span
+
+        view = (*clamp(r0, r1, rows), *clamp(c0, c1, cols))
+        if view != self._view:
+            self._view = view
+            self._zoomed = view != (0, rows, 0, cols)
+            self._image = None
+            self.update()
+
+    def wheelEvent(self, event) -> None:
+
+        cell = self._cell_at(event.position())
+        if cell is None:
+            return event.ignore()
+
+        zoom_in = event.angleDelta().y() > 0
+
+        def zoom(lo: int, hi: int, at: float) -> tuple[float, float]:
+            # Change by at least one cell, so that small spans do not get stuck
+            span = hi - lo
+            if zoom_in:
+                new = min(span * self.ZOOM_STEP, span - 1)
+            else:
+                new = max(span / self.ZOOM_STEP, span + 1)
+            new = max(new, 1)
+            lo = at - (at - lo) * new / span
+            return lo, lo + new
+
+        r, c = cell
+        r0, r1, c0, c1 = self._view
+        self._set_view(*zoom(r0, r1, r), *zoom(c0, c1, c))
+        event.accept()
+
+    def mousePressEvent(self, event) -> None:
+
+        if event.button() == Qt.MouseButton.LeftButton:
+            self._drag = (event.position(), self._view)
+
+    def mouseReleaseEvent(self, event) -> None:
+
+        self._drag = None
+
+    def mouseDoubleClickEvent(self, event) -> None:
+
+        rows, cols = self._data.shape
+        self._set_view(0, rows, 0, cols)
+
+    def mouseMoveEvent(self, event) -> None:
+
+        if self._drag is not None:
+            start, (r0, r1, c0, c1) = self._drag
+            rect = self._plot_rect()
+            dr = (event.position().y() - start.y()) / rect.height() * (r1 - r0)
+            dc = (event.position().x() - start.x()) / rect.width() * (c1 - c0)
+            self._set_view(r0 - dr, r1 - dr, c0 - dc, c1 - dc)
+            return
+
+        cell = self._cell_at(event.position())
+        if cell is None or self._image is None:
+            QToolTip.hideText()
+            return
+
+        # Describe the whole block under the cursor
+        by, bx = self._blocks
+        r0, _, c0, _ = self._view
+        rows, cols = self._data.shape
+        top = r0 + (int(cell[0]) - r0) // by * by
+        left = c0 + (int(cell[1]) - c0) // bx * bx
+        bottom, right = min(top + by, rows) - 1, min(left + bx, cols) - 1
+
+        def span(labels: list[int], lo: int, hi: int) -> str:
+            return str(labels[lo]) if lo == hi else f"{labels[lo]} – {labels[hi]}"
+
+        tooltip = TEXT.HEATMAP_CELL_TOOLTIP if (bottom, right) == (top, left) else TEXT.HEATMAP_BLOCK_TOOLTIP
+        QToolTip.showText(
+            event.globalPosition().toPoint(),
+            tooltip.format(
+                featured=span(self._y_labels, top, bottom),
+                standard=span(self._x_labels, left, right),
+                probability=self._data[top:bottom + 1, left:right + 1].max() * 100,
+            ),
+            self,
+        )
@@ -1,3 +1,5 @@
+import time
+
 from PyQt6.QtWidgets import (
     QMainWindow,
     QVBoxLayout,
@@ -7,6 +9,7 @@ from PyQt6.QtWidgets import (
     QLabel,
     QProgressBar,
     QTabWidget,
+    QStackedWidget,
     QWidget,
 )
 from PyQt6.QtGui import (
@@ -20,17 +23,13 @@ from PyQt6.QtCore import (
 from core.config import CONFIG
 from core.assets import ASSETS
 from core.text import TEXT
-from core.utils import (
-    norm_dict,
-    convert_dict,
-    array_2d_from_dict,
-    joint_pmf_variant,
-)
-from gachamodel import (
+from core.cache import ResultCache, cache_key
+from core.results import ResultAccumulator
+from core.distribution import Distribution, JointDistribution
+from core.backend import (
     GenshinImpactGachaModel,
     CapturingRadianceModel,
     SimulationThread,
-    SimulationResult,
 )
 from .utils import (
     set_titlebar_darkmode,
@@ -43,12 +42,16 @@ from .BooleanComboBox import BooleanComboBox
 from .FrameBox import FrameBox
 from .BarGraph import BarGraph
 from .Heatmap import Heatmap
+from .RasterHeatmap import RasterHeatmap
 from .HorizontalDivider import HorizontalDivider
 from .VerticalDivider import VerticalDivider
 
 
 class SimulationWindow(QMainWindow):
 
+    # Shared by every window, so results outlive the window that computed them
+    cache = ResultCache()
+
     def __init__(self, parent=None, pulls=600):
 
         super().__init__(parent)
@@ -71,11 +74,24 @@ class SimulationWindow(QMainWindow):
 
         self.model: GenshinImpactGachaModel = None
         self.sim_thread: SimulationThread = None
-        self.sim_result: SimulationResult = None
+        # Set between asking the workers to stop and their last publish
+        self.stopping = False
+        self.sim_result: ResultAccumulator = None
+        # Featured, standard and total distributions of the latest results
+        self.marginals: tuple[Distribution, Distribution, Distribution] = None
+        self.joint: JointDistribution = None
 
         # UI update timer
         self.update_timer = QTimer(self)
         self.update_timer.timeout.connect(self.update_ui_from_simulation)
+        # Interval picked by the user, which the timer may stretch, and the
+        # smoothed time each update takes
+        self.update_rate = 0
+        self.update_cost = 0.0
+
+        # Views that have not been redrawn since the results last changed
+        self.charts_dirty = False
+        self.joint_dirty = False
 
         self.joint_table = None
 
@@ -153,6 +169,11 @@ class SimulationWindow(QMainWindow):
         sim_settings_layout.addWidget(QLabel(TEXT.ANIMATION_INTERVAL), 2, 0)
         sim_settings_layout.addWidget(self.animation_interval, 2, 1)
 
+        # Target Precision, stops the simulation early once reached
+        self.target_precision = Dropdown(options=TEXT.TARGET_PRECISION_OPTIONS, current_index=0, width=120)
+        sim_settings_layout.addWidget(QLabel(TEXT.TARGET_PRECISION), 3, 0)
+        sim_settings_layout.addWidget(self.target_precision, 3, 1)
+
         sim_settings_groupbox.setLayout(sim_settings_layout)
         top_section_layout.addWidget(sim_settings_groupbox)
 
@@ -207,12 +228,14 @@ class SimulationWindow(QMainWindow):
         self.tab_widget = QTabWidget()
 
         # Create tabs
-        marginal_pmf_tab = QWidget()
-        joint_pmf_tab = QWidget()
+        self.marginal_pmf_tab = marginal_pmf_tab = QWidget()
+        self.joint_pmf_tab = joint_pmf_tab = QWidget()
 
         # Add tabs to tab widget
         self.tab_widget.addTab(marginal_pmf_tab, TEXT.MARGINAL_PMF)
         self.tab_widget.addTab(joint_pmf_tab, TEXT.JOINT_PMF)
+        # Hidden tabs are not redrawn, so catch up when one is shown
+        self.tab_widget.currentChanged.connect(lambda _: self.refresh_views())
 
         # Set up Marginal PMF tab with charts
         marginal_pmf_layout = QVBoxLayout()
@@ -231,6 +254,8 @@ class SimulationWindow(QMainWindow):
             x_label=TEXT.FEATURED_5_STAR,
             y_label=TEXT.PROBABILITY,
             geometry=CONFIG.CHART.GEOMETRY,
+            trim_below=CONFIG.CHART_TRIM_BELOW,
+            frame_budget=CONFIG.CHART_FRAME_BUDGET,
         )
         marginal_pmf_layout.addWidget(self._featured_chart)
 
@@ -241,6 +266,8 @@ class SimulationWindow(QMainWindow):
             x_label=TEXT.STANDARD_5_STAR,
             y_label=TEXT.PROBABILITY,
             geometry=CONFIG.CHART.GEOMETRY,
+            trim_below=CONFIG.CHART_TRIM_BELOW,
+            frame_budget=CONFIG.CHART_FRAME_BUDGET,
         )
         marginal_pmf_layout.addWidget(self._standard_chart)
 
@@ -251,6 +278,8 @@ class SimulationWindow(QMainWindow):
             x_label=TEXT.TOTAL_5_STAR,
             y_label=TEXT.PROBABILITY,
             geometry=CONFIG.CHART.GEOMETRY,
+            trim_below=CONFIG.CHART_TRIM_BELOW,
+            frame_budget=CONFIG.CHART_FRAME_BUDGET,
         )
         marginal_pmf_layout.addWidget(self._combined_chart)
 
@@ -274,8 +303,14 @@ class SimulationWindow(QMainWindow):
 
         joint_layout.addWidget(HorizontalDivider())
 
+        # One cell per pair while they are large enough to read,
+        # otherwise an image that can be zoomed into
         self.joint_table = Heatmap()
-        joint_layout.addWidget(self.joint_table)
+        self.joint_raster = RasterHeatmap()
+        self.joint_stack = QStackedWidget()
+        self.joint_stack.addWidget(self.joint_table)
+        self.joint_stack.addWidget(self.joint_raster)
+        joint_layout.addWidget(self.joint_stack)
 
         joint_pmf_tab.setLayout(joint_layout)
 
@@ -295,6 +330,7 @@ class SimulationWindow(QMainWindow):
         sim_length = self.sim_length.value()
         seed = self.seed.value()
         update_rate = self.animation_interval.value()
+        tolerance = CONFIG.TARGET_PRECISIONS[self.target_precision.currentIndex()]
 
         # Set the animation speed
         self._featured_chart.setAnimationDuration(update_rate)
@@ -309,6 +345,7 @@ class SimulationWindow(QMainWindow):
         self.seed.setEnabled(False)
         self.sim_length.setEnabled(False)
         self.animation_interval.setEnabled(False)
+        self.target_precision.setEnabled(False)
 
         # Disable the run and reset buttons, enable the stop button
         self.run_button.setEnabled(False)
@@ -325,25 +362,63 @@ class SimulationWindow(QMainWindow):
 
         self.info_box.setText(TEXT.SIMULATION_RUNNING)
 
+        # Reuse any earlier run of the same configuration, and only
+        # simulate the trajectories it is missing
+        self.cache_key = cache_key(self.model, pulls)
+        cached = self.cache.get(self.cache_key)
+        remaining = sim_length
+        if cached is not None:
+            remaining = max(sim_length - cached.simulation_count, 0)
+            if tolerance is not None and cached.max_error(CONFIG.PRECISION_FLOOR) <= tolerance:
+                remaining = 0
+
         # Start the simulation thread (no sleep, runs at max speed)
-        self.sim_thread = SimulationThread(self.model, pulls, sim_length)
+        self.sim_thread = SimulationThread(
+            self.model,
+            pulls,
+            remaining,
+            tolerance=tolerance,
+            floor=CONFIG.PRECISION_FLOOR,
+            resume_from=cached,
+        )
+        self.sim_result = ResultAccumulator()
+        self.stopping = False
         self.sim_thread.run()
 
         # Start the UI update timer
+        self.update_rate = update_rate
+        self.update_cost = 0.0
         self.update_timer.setInterval(update_rate)
         self.update_timer.start()
 
     def stop_simulation_thread(self):
+        """Ask the workers to stop. The run finishes once they have published their last results."""
 
-        sim_duration = self.sim_result.sim_duration.total_seconds()
-        self.display_elapsed_time(sim_duration)
-
-        self.update_timer.stop()
+        self.stopping = True
+        self.stop_button.setEnabled(False)
+        self.info_box.setText(TEXT.SIMULATION_STOPPING)
 
-        # Stop the simulation thread if it's running
         if self.sim_thread and self.sim_thread.is_running():
             self.sim_thread.stop()
 
+    def finish_simulation(self):
+        """Final refresh once the workers are done, whether they finished or were stopped."""
+
+        self.update_timer.stop()
+
+        # One last full refresh with everything the workers published
+        self.apply_results()
+        self.refresh_views(full=True)
+
+        error = getattr(self.sim_thread, "error", None)
+        if error is not None:
+            self.info_box.setText(TEXT.SIMULATION_FAILED.format(error))
+        else:
+            self.display_elapsed_time(self.sim_result.sim_duration.total_seconds())
+
+        # Keep the results, even partial ones, so the next run can extend them
+        self.cache.put(self.cache_key, self.sim_thread.get_current_results())
+
         self.reset_button.setEnabled(True)
         self.run_button.setEnabled(True)
         self.stop_button.setEnabled(False)
@@ -358,7 +433,20 @@ class SimulationWindow(QMainWindow):
         if m > 0:
             fmt += f"{int(m)}m "
         fmt += f"{int(s)}.{ms:03d}s"
-        self.info_box.setText(TEXT.SIMULATION_COMPLETED.format(fmt))
+        self.info_box.setText(f"{TEXT.SIMULATION_COMPLETED.format(fmt)}\n{self.metrics_text()}")
+
+    def metrics_text(self) -> str:
+        """Throughput and contention counters of the current run, for the info box"""
+
+        metrics = self.sim_thread.get_metrics()
+        return TEXT.SIMULATION_METRICS.format(
+            trajectories_per_sec=metrics.trajectories_per_sec,
+            pulls_per_sec=metrics.pulls_per_sec,
+            lock_wait_ms=metrics.lock_wait.total_seconds() * 1000,
+            snapshots=metrics.snapshots,
+            snapshot_us=metrics.avg_snapshot_time.total_seconds() * 1e6,
+            memory_kib=metrics.peak_memory / 1024,
+        )
 
     def reset_simulation(self):
 
@@ -375,6 +463,7 @@ class SimulationWindow(QMainWindow):
         self.seed.setEnabled(True)
         self.sim_length.setEnabled(True)
         self.animation_interval.setEnabled(True)
+        self.target_precision.setEnabled(True)
 
         # Reset info box
         self.info_box.setText(TEXT.BLANK)
@@ -385,74 +474,111 @@ class SimulationWindow(QMainWindow):
         self._combined_chart.clear()
 
         # Reset joint table
-        self.joint_table.clear()
-        self.joint_table.setRowCount(0)
-        self.joint_table.setColumnCount(0)
+        self.joint_table.clear_heatmap()
+        self.joint_raster.clear_heatmap()
+        self.joint_stack.setCurrentWidget(self.joint_table)
 
     def update_ui_from_simulation(self):
 
-        # Get current results from simulation thread
-        self.sim_result = self.sim_thread.get_current_results()
+        # The simulation is complete once all trajectories are done, or
+        # earlier if the target precision was reached or it was stopped.
+        # Only then have the workers published their last results.
+        if not self.sim_thread.is_running():
+            self.finish_simulation()
+            return
 
-        # Update progress bar
-        self.progress_bar.setValue(self.sim_result.simulation_count)
+        start = time.perf_counter()
 
-        # Check if simulation is complete
-        if self.sim_result.simulation_count >= self.sim_length.value():
-            self.stop_simulation_thread()
+        if not self.stopping:
+            self.info_box.setText(f"{TEXT.SIMULATION_RUNNING}\n{self.metrics_text()}")
+        self.apply_results()
+        self.refresh_views()
 
-        self.update_charts()
-        self.update_joint_table()
+        # Widgets repaint once control returns to the event loop, so time
+        # the update up to the next turn of the loop to include painting
+        QTimer.singleShot(0, lambda: self.adapt_update_rate(time.perf_counter() - start))
 
-    def update_charts(self):
+    def adapt_update_rate(self, cost: float):
+        """Stretch the update interval so that updates stay within their share of the GUI thread."""
+
+        self.update_cost = 0.8 * self.update_cost + 0.2 * cost
+        interval = max(self.update_rate, int(self.update_cost / CONFIG.UI_CPU_BUDGET * 1000))
+        if interval != self.update_timer.interval():
+            self.update_timer.setInterval(interval)
 
-        if not self.sim_result:
+    def apply_results(self):
+        """Fetch what changed since the last update, and mark the views that need redrawing."""
+
+        # Skip redrawing entirely if the workers have not published anything
+        if not self.sim_result.poll(self.sim_thread):
             return
 
+        # Update progress bar
+        self.progress_bar.setValue(self.sim_result.simulation_count)
+
+        # Build the distributions once per snapshot, so that switching
+        # views does not recompute them
         total = self.sim_result.simulation_count
-        featured_rolls = self.sim_result.featured_rolls
-        standard_rolls = self.sim_result.standard_rolls
-        total_rolls = self.sim_result.total_rolls
+        self.marginals = (
+            Distribution(self.sim_result.featured_rolls, self.sim_result.ftd_range, total),
+            Distribution(self.sim_result.standard_rolls, self.sim_result.std_range, total),
+            Distribution(self.sim_result.total_rolls, self.sim_result.tot_range, total),
+        )
+        self.joint = JointDistribution(self.sim_result.joint_rolls, total)
 
-        mode = TEXT.CHART_VIEW_OPTIONS[self.chart_view_dropdown.currentIndex()]
+        self.charts_dirty = True
+        self.joint_dirty = True
 
-        # Featured Chart
-        featured_converted = convert_dict(featured_rolls, mode)
-        self._featured_chart.update_data(norm_dict(featured_converted, total=total))
+    def refresh_views(self, full: bool = False):
+        """Redraw the views that are out of date, only those on screen unless `full`."""
 
-        # Standard Chart
-        standard_converted = convert_dict(standard_rolls, mode)
-        self._standard_chart.update_data(norm_dict(standard_converted, total=total))
+        visible = full or (self.isVisible() and not self.isMinimized())
+        current = self.tab_widget.currentWidget()
 
-        # Combined Chart
-        combined_converted = convert_dict(total_rolls, mode)
-        self._combined_chart.update_data(norm_dict(combined_converted, total=total))
+        if self.charts_dirty and visible and (full or current is self.marginal_pmf_tab):
+            self.update_charts()
+        if self.joint_dirty and visible and (full or current is self.joint_pmf_tab):
+            self.update_joint_table()
+
+    def update_charts(self):
+
+        if not self.marginals:
+            return
+        self.charts_dirty = False
+
+        mode = TEXT.CHART_VIEW_OPTIONS[self.chart_view_dropdown.currentIndex()]
+        featured, standard, combined = self.marginals
+
+        self._featured_chart.update_data(featured.view(mode))
+        self._standard_chart.update_data(standard.view(mode))
+        self._combined_chart.update_data(combined.view(mode))
 
     def update_joint_table(self):
         """Update the joint probability table as a 2D heatmap."""
 
-        joint = self.sim_result.joint_rolls
-
-        if not joint:
+        if not self.joint or not self.sim_result.simulation_count:
             return
+        self.joint_dirty = False
 
-        # Get sorted unique values for featured and standard
-        featured_keys = self.sim_result.featured_rolls.keys()
-        standard_keys = self.sim_result.standard_rolls.keys()
-        total = self.sim_result.simulation_count
+        # Values covered by the rows (featured) and columns (standard)
+        ftd_min, ftd_max = self.sim_result.ftd_range
+        std_min, std_max = self.sim_result.std_range
+        featured_keys = list(range(ftd_min, ftd_max + 1))
+        standard_keys = list(range(std_min, std_max + 1))
 
         opx = TEXT.JOINT_VIEW_STANDARD_OPTIONS[self.joint_view_standard_options.currentIndex()]
         opy = TEXT.JOINT_VIEW_FEATURED_OPTIONS[self.joint_view_featured_options.currentIndex()]
 
-        joint_pmf = array_2d_from_dict(
-            data=joint,
-            x_labels=standard_keys,
-            y_labels=featured_keys,
-        )
-        joint_pmf = joint_pmf_variant(joint_pmf, opx, opy)
+        if max(len(featured_keys), len(standard_keys)) > CONFIG.HEATMAP_TABLE_LIMIT:
+            heatmap, unused = self.joint_raster, self.joint_table
+        else:
+            heatmap, unused = self.joint_table, self.joint_raster
 
-        self.joint_table.set_heatmap_data(
+        heatmap.set_heatmap_data(
             x_labels=standard_keys,
             y_labels=featured_keys,
-            data=joint_pmf / total,
+            data=self.joint.view(opx, opy),
         )
+        if self.joint_stack.currentWidget() is not heatmap:
+            unused.clear_heatmap()
+            self.joint_stack.setCurrentWidget(heatmap)